@@ -16,7 +16,10 @@ import sys
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from map_generator import MapGenerator
+from map_generator import MapGenerator, RENDERERS
+from raster_renderer import render_scene_file
+from osm_data import OSMDataFetcher
+from overpass_scheduler import OverpassError
 from color_palettes import COLOR_PALETTES, list_palettes
 
 app = Flask(__name__)
@@ -28,9 +31,49 @@ UPLOAD_FOLDER = tempfile.mkdtemp()
 OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), 'output', 'web')
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+# Image formats /api/export can write, with either backend
+EXPORT_FORMATS = ('png', 'jpg', 'jpeg', 'webp')
+
 # In-memory storage for imported palettes (temporary session storage)
 imported_palettes = {}
 
+# Shared OSM fetcher so every request reuses the same response cache
+# (or a local store imported with src/local_store.py, via GEN_MAPS_LOCAL_STORE)
+if os.environ.get('GEN_MAPS_LOCAL_STORE'):
+    from local_store import LocalOSMStore
+    osm_fetcher = OSMDataFetcher(backend=LocalOSMStore(os.environ['GEN_MAPS_LOCAL_STORE']))
+else:
+    osm_fetcher = OSMDataFetcher()
+
+def parse_bool(value):
+    """
+    Read a boolean request field sent as a JSON boolean, a number or a
+    string such as "true"/"false" (bool("false") would be True)
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'on')
+    return bool(value)
+
+def start_cache_refresher(use_reloader=False):
+    """
+    Keep frequently requested areas current in the background
+    (GEN_MAPS_REFRESH_INTERVAL=0 disables it)
+
+    Call it from the process that serves requests. Under the reloader the
+    first process only watches files and restarts a serving child (with
+    WERKZEUG_RUN_MAIN set), so starting in both would run two refreshers
+    on the same SQLite cache.
+    """
+    if use_reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return None
+    refresh_interval = int(os.environ.get('GEN_MAPS_REFRESH_INTERVAL', 3600))
+    if osm_fetcher.cache is None or refresh_interval <= 0:
+        return None
+    from cache_refresher import CacheRefresher
+    refresher = CacheRefresher(osm_fetcher, interval=refresh_interval)
+    refresher.start()
+    return refresher
+
 @app.route('/')
 def index():
     """Serve the main web application"""
@@ -113,10 +156,14 @@ def generate_map():
         palette = data.get('palette', 'classic')
         seed = data.get('seed')
         radius = float(data.get('radius', 1.0))
-        gradients = data.get('gradients', False)
+        gradients = parse_bool(data.get('gradients', False))
         frame_color = data.get('frameColor', '#333')
         frame_width = int(data.get('frameWidth', 0))
         color_variation = float(data.get('colorVariation', 0.3))
+        dissolve = parse_bool(data.get('dissolve', False))
+        renderer = data.get('renderer', 'svg')
+        if renderer not in RENDERERS:
+            return jsonify({'error': f"Unknown renderer '{renderer}', expected one of: {', '.join(RENDERERS)}"}), 400
         
         # Generate unique filename
         file_id = str(uuid.uuid4())
@@ -160,14 +207,19 @@ def generate_map():
             use_gradients=gradients,
             frame_color=frame_color,
             frame_width=frame_width,
-            color_variation=color_variation
+            color_variation=color_variation,
+            osm_fetcher=osm_fetcher,
+            dissolve=dissolve,
+            renderer=renderer
         )
         
-        # Generate map
+        # Generate map, keeping the scene drawn in the HTML so /api/export
+        # can draw exactly the same shapes without a browser
         generator.generate_custom_map(
             location=(lat, lon),
             radius_km=radius,
-            output_file=output_file
+            output_file=output_file,
+            scene_file=os.path.join(OUTPUT_FOLDER, f'map_{file_id}.scene.json.gz')
         )
         
         # Verify file was created
@@ -181,6 +233,9 @@ def generate_map():
             'message': 'Map generated successfully'
         })
         
+    except OverpassError as e:
+        # Overpass stayed busy through every retry; the client may try again later
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -207,6 +262,8 @@ def export_image():
         width = int(data.get('width', 1200))
         height = int(data.get('height', 1200))
         quality = float(data.get('quality', 0.9))
+        if format_type not in EXPORT_FORMATS:
+            return jsonify({'error': f"Unknown format '{format_type}', expected one of: {', '.join(EXPORT_FORMATS)}"}), 400
         
         # Get the HTML file
         html_file = os.path.join(OUTPUT_FOLDER, f'map_{file_id}.html')
@@ -216,7 +273,22 @@ def export_image():
         # Generate output image path - use same file_id as input
         image_file = os.path.join(OUTPUT_FOLDER, f'map_{file_id}.{format_type}')
         
-        # Use existing screenshot functionality
+        # Draw the image directly from the scene saved with the map
+        scene_file = os.path.join(OUTPUT_FOLDER, f'map_{file_id}.scene.json.gz')
+        if data.get('backend', 'raster') == 'raster' and os.path.exists(scene_file):
+            try:
+                render_scene_file(scene_file, image_file, width, height, quality)
+            except ImportError as e:
+                # Without Pillow the browser screenshot below still works
+                print(f"Raster export unavailable ({e}), using the browser")
+            else:
+                return jsonify({
+                    'success': True,
+                    'file_path': f'/api/download/map_{file_id}.{format_type}',
+                    'message': f'Image exported successfully as {format_type.upper()}'
+                })
+        
+        # Screenshot the HTML in a browser otherwise
         try:
             from playwright.sync_api import sync_playwright
             import time
@@ -483,4 +555,5 @@ if __name__ == '__main__':
     print("  GET  /api/search           - Search places")
     print("")
     
+    start_cache_refresher(use_reloader=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare image export time of the SVG and canvas renderers
+
+Generates the same map (same seed) once per renderer and times how long
+headless Chromium takes to load each HTML file and take the screenshot,
+the two steps of --export-image, without its fixed waits.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from map_generator import MapGenerator, RENDERERS
+from osm_data import OSMDataFetcher
+
+
+def time_export(browser, html_file, image_size):
+    """
+    Return (load_seconds, screenshot_seconds) of one export
+    """
+    page = browser.new_page(viewport={"width": image_size, "height": image_size})
+    try:
+        start_time = time.perf_counter()
+        page.goto(f"file://{os.path.abspath(html_file)}")
+        page.wait_for_load_state("networkidle")
+        loaded_time = time.perf_counter()
+        page.screenshot(path=os.path.join(tempfile.gettempdir(), "renderer_benchmark.png"))
+        return loaded_time - start_time, time.perf_counter() - loaded_time
+    finally:
+        page.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare image export time of the SVG and canvas renderers",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Usage examples:
+  python benchmark_renderers.py --coords 40.4168 -3.7038 --radius 5
+  python benchmark_renderers.py --coords 40.4168 -3.7038 --radius 10 --local-store spain.sqlite --repeat 5
+  python benchmark_renderers.py --coords 40.4168 -3.7038 --radius 5 --palette neon_city
+  python benchmark_renderers.py --coords 40.4168 -3.7038 --radius 5 --palette neon_city --no-glow
+        """
+    )
+    parser.add_argument('--coords', '-c', type=float, nargs=2, metavar=('LAT', 'LON'), required=True, help='Map center')
+    parser.add_argument('--radius', '-r', type=float, default=5.0, help='Radius in km (default: 5.0)')
+    parser.add_argument('--seed', '-s', type=int, default=42, help='Seed shared by both maps (default: 42)')
+    parser.add_argument('--palette', '-p', type=str, default='classic', help='Palette of both maps; neon_city and cyberpunk add the glow (default: classic)')
+    parser.add_argument('--no-glow', action='store_true', help='Turn off the palette glow, to time what it costs')
+    parser.add_argument('--local-store', type=str, help='Read OSM data from a local store instead of Overpass')
+    parser.add_argument('--image-size', type=int, default=1200, help='Viewport and image size in pixels (default: 1200)')
+    parser.add_argument('--repeat', type=int, default=3, help='Exports timed per renderer (default: 3)')
+    parser.add_argument('--browser-path', type=str, help='Chromium executable to use instead of the one installed by Playwright')
+    args = parser.parse_args()
+
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        print("Error: Playwright is not installed. Install it with 'pip install playwright'")
+        sys.exit(1)
+
+    if args.local_store:
+        from local_store import LocalOSMStore
+        osm_fetcher = OSMDataFetcher(backend=LocalOSMStore(args.local_store))
+    else:
+        osm_fetcher = OSMDataFetcher()
+
+    output_dir = tempfile.mkdtemp(prefix="renderer_benchmark_")
+    html_files = {}
+    for renderer in RENDERERS:
+        html_files[renderer] = os.path.join(output_dir, f"map_{renderer}.html")
+        generator = MapGenerator(palette_name=args.palette, seed=args.seed, osm_fetcher=osm_fetcher, renderer=renderer,
+                                 glow=False if args.no_glow else None)
+        generator.generate_custom_map(tuple(args.coords), args.radius, output_file=html_files[renderer])
+
+    results = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True, executable_path=args.browser_path)
+        for renderer in RENDERERS:
+            # The first export warms up the browser and the CDN cache
+            time_export(browser, html_files[renderer], args.image_size)
+            results[renderer] = [time_export(browser, html_files[renderer], args.image_size) for _ in range(args.repeat)]
+        browser.close()
+
+    print(f"\nExport time, median of {args.repeat} ({args.radius} km, {args.palette}{', no glow' if args.no_glow else ''}, {args.image_size}px):")
+    print(f"  {'renderer':<10}{'HTML MB':>10}{'load s':>10}{'shot s':>10}{'total s':>10}")
+    for renderer, timings in results.items():
+        load = statistics.median(timing[0] for timing in timings)
+        shot = statistics.median(timing[1] for timing in timings)
+        size = os.path.getsize(html_files[renderer]) / 1e6
+        print(f"  {renderer:<10}{size:>10.1f}{load:>10.2f}{shot:>10.2f}{load + shot:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an Overpass API server
+
+Answers /api/interpreter queries with a synthetic grid of buildings and
+parks inside every bbox or around: filter of the query, and mimics the
+server's slot limits: /api/status reports free slots, queries beyond the
+limit get HTTP 429 and a share of queries can be made to fail with 504, or
+to time out the way Overpass does: HTTP 200 with part of the elements and
+a runtime error remark.
+
+The synthetic world can be edited with POST /stub/edit, e.g.
+{"modify": {"123": {"building": "school"}}, "delete": [456]}, and diff
+queries (newer:"timestamp" with "out ids") answer with those edits.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+GRID_STEP = 0.0005  # Degrees between synthetic buildings
+
+
+def synthetic_elements(south, west, north, east):
+    """
+    Return Overpass "out geom" ways for a regular building grid in a bbox
+    """
+    elements = []
+    for i in range(math.floor(south / GRID_STEP), math.ceil(north / GRID_STEP)):
+        for j in range(math.floor(west / GRID_STEP), math.ceil(east / GRID_STEP)):
+            lat, lon = i * GRID_STEP, j * GRID_STEP
+            if not (south <= lat + GRID_STEP / 2 <= north and west <= lon + GRID_STEP / 2 <= east):
+                continue
+            size = GRID_STEP * 0.8
+            ring = [(lat, lon), (lat + size, lon), (lat + size, lon + size), (lat, lon + size), (lat, lon)]
+            tags = {'building': 'residential' if (i + j) % 3 == 0 else 'yes', 'name': f"Block {i},{j}"}
+            if (i + j) % 7 == 0:
+                tags = {'landuse': 'grass'}
+            elements.append({
+                'type': 'way',
+                'id': (i % 100000) * 100000 + (j % 100000),
+                'tags': tags,
+                'geometry': [{'lat': point_lat, 'lon': point_lon} for point_lat, point_lon in ring]
+            })
+    return elements
+
+
+def timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def query_tag_filter(query):
+    """
+    Return (key, allowed values or None) of the first ["key"] or ["key"~"^(a|b)$"] filter
+    """
+    match = re.search(r'\["(\w+)"(?:~"\^\(([^)]*)\)\$")?\]', query)
+    if match is None:
+        return None, None
+    values = set(match.group(2).replace('\\', '').split('|')) if match.group(2) else None
+    return match.group(1), values
+
+
+def query_bboxes(query):
+    """
+    Extract every (s,w,n,e) and (around:r,lat,lon) filter of a query as a bbox
+    """
+    bboxes = [tuple(map(float, bbox)) for bbox in re.findall(r'\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)', query)]
+    for radius, lat, lon in re.findall(r'\(around:([\d.]+),([-\d.]+),([-\d.]+)\)', query):
+        delta = float(radius) / 111000.0
+        bboxes.append((float(lat) - delta, float(lon) - delta, float(lat) + delta, float(lon) + delta))
+    return bboxes
+
+
+class OverpassStubServer(ThreadingHTTPServer):
+    def __init__(self, address, slots=2, delay=0.0, fail_rate=0.0, timeout_rate=0.0):
+        super().__init__(address, OverpassStubHandler)
+        self.slots = slots
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.timeout_rate = timeout_rate
+        self.running = 0
+        self.lock = threading.Lock()
+        self.stats = {'queries': 0, 'rejected': 0, 'failed': 0, 'timed_out': 0}
+        # Element id -> (edit timestamp, new tags or None when deleted)
+        self.edits = {}
+
+    def current_elements(self, query):
+        """
+        Return {id: (element, edit timestamp or None)} matching a query's filters
+        """
+        key, values = query_tag_filter(query)
+        elements = {}
+        for bbox in query_bboxes(query):
+            for element in synthetic_elements(*bbox):
+                edited_at, tags = self.edits.get(element['id'], (None, element['tags']))
+                if tags is None:
+                    continue
+                element['tags'] = tags
+                if key is not None and (key not in tags or (values is not None and tags[key] not in values)):
+                    continue
+                elements[element['id']] = (element, edited_at)
+        return elements
+
+
+class OverpassStubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if not self.path.startswith('/api/status'):
+            self.send_error(404)
+            return
+        server = self.server
+        with server.lock:
+            free_slots = max(0, server.slots - server.running)
+        lines = ["Connected as: 1", f"Rate limit: {server.slots}"]
+        if free_slots:
+            lines.append(f"{free_slots} slots available now.")
+        else:
+            next_slot = timestamp(time.time() + server.delay)
+            lines.append(f"Slot available after: {next_slot}, in {math.ceil(server.delay)} seconds.")
+        self._send(200, 'text/plain', "\n".join(lines).encode())
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        if self.path.startswith('/stub/edit'):
+            self._edit(json.loads(body or '{}'))
+            return
+        if not self.path.startswith('/api/interpreter'):
+            self.send_error(404)
+            return
+        query = parse_qs(body).get('data', [body])[0]
+
+        with server.lock:
+            server.stats['queries'] += 1
+            if server.running >= server.slots:
+                server.stats['rejected'] += 1
+                rejected = True
+            else:
+                server.running += 1
+                rejected = False
+        if rejected:
+            self._send(429, 'text/plain', b"Too Many Requests")
+            return
+
+        try:
+            time.sleep(server.delay)
+            if random.random() < server.fail_rate:
+                with server.lock:
+                    server.stats['failed'] += 1
+                self._send(504, 'text/plain', b"Gateway Timeout")
+                return
+            with server.lock:
+                current = server.current_elements(query)
+            newer = re.search(r'newer:"([^"]+)"', query)
+            if newer:
+                # Diff query: ids of everything still there, then what changed since
+                output = [{'type': 'way', 'id': element_id} for element_id in current]
+                output.extend(
+                    element for element, edited_at in current.values()
+                    if edited_at is not None and edited_at > newer.group(1)
+                )
+            else:
+                output = [element for element, _ in current.values()]
+            payload = {
+                'version': 0.6,
+                'osm3s': {'timestamp_osm_base': timestamp(math.floor(time.time()))},
+                'elements': output
+            }
+            if random.random() < server.timeout_rate:
+                with server.lock:
+                    server.stats['timed_out'] += 1
+                # Overpass stops writing elements and reports the error at the end
+                payload['elements'] = output[:len(output) // 2]
+                payload['remark'] = 'runtime error: Query timed out in "query" at line 3 after 60 seconds.'
+            self._send(200, 'application/json', json.dumps(payload).encode())
+        finally:
+            with server.lock:
+                server.running -= 1
+
+    def _edit(self, edits):
+        # Edits are stamped with the next second, so they are always newer
+        # than the snapshot of any response already sent
+        edited_at = timestamp(math.floor(time.time()) + 1)
+        with self.server.lock:
+            for element_id, tags in edits.get('modify', {}).items():
+                self.server.edits[int(element_id)] = (edited_at, tags)
+            for element_id in edits.get('delete', []):
+                self.server.edits[int(element_id)] = (edited_at, None)
+        self._send(200, 'application/json', json.dumps({'edited_at': edited_at}).encode())
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the Overpass API",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Usage examples:
+  python overpass_stub.py --port 8765
+  python overpass_stub.py --slots 1 --delay 2 --fail-rate 0.2
+  python overpass_stub.py --timeout-rate 0.5
+  GEN_MAPS_OVERPASS_URLS=http://127.0.0.1:8765/api/interpreter python ../src/main.py --coords 40.4168 -3.7038
+        """
+    )
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--slots', type=int, default=2, help='Concurrent queries before answering 429 (default: 2)')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds each query takes (default: 0)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of queries answered with 504 (default: 0)')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of queries answered with partial elements and a timeout remark (default: 0)')
+    args = parser.parse_args()
+
+    server = OverpassStubServer(('127.0.0.1', args.port), args.slots, args.delay, args.fail_rate, args.timeout_rate)
+    print(f"Overpass stand-in listening on http://127.0.0.1:{args.port}/api/interpreter")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Prefetch OSM data for a list of locations into the local cache
+
+Locations come from a CSV file (columns name, lat, lon, radius, or an
+address column instead of lat/lon) or a GeoJSON FeatureCollection of
+points (optional name and radius properties). Each area is fetched with
+the map generator's render plan, so later maps of those places are served
+from the cache.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from map_generator import MapGenerator
+from osm_data import OSMDataFetcher
+
+
+def read_locations(path, default_radius):
+    """
+    Return a list of location dicts (name, lat, lon or address, radius)
+    """
+    if path.lower().endswith(('.geojson', '.json')):
+        return read_geojson(path, default_radius)
+    return read_csv(path, default_radius)
+
+
+def read_csv(path, default_radius):
+    locations = []
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+            # A malformed number only skips its own row, like failed fetches
+            try:
+                location = {'radius': float(row.get('radius') or default_radius)}
+                if row.get('lat') and row.get('lon'):
+                    location['lat'] = float(row['lat'])
+                    location['lon'] = float(row['lon'])
+                elif row.get('address'):
+                    location['address'] = row['address']
+                else:
+                    print(f"Skipping line {reader.line_num} without coordinates or address: {row}")
+                    continue
+            except ValueError as e:
+                print(f"Skipping line {reader.line_num} with an invalid number ({e}): {row}")
+                continue
+            location['name'] = row.get('name') or row.get('address') or f"{location['lat']}, {location['lon']}"
+            locations.append(location)
+    return locations
+
+
+def read_geojson(path, default_radius):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    features = data.get('features', [data] if data.get('type') == 'Feature' else [])
+
+    locations = []
+    for number, feature in enumerate(features, 1):
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        if geometry.get('type') != 'Point':
+            print(f"Skipping feature {number}, not a point: {properties}")
+            continue
+        # Like malformed CSV rows, a bad point or radius only skips its own feature
+        try:
+            lon, lat = geometry.get('coordinates')[:2]
+            location = {
+                'lat': float(lat),
+                'lon': float(lon),
+                'radius': float(properties.get('radius') or properties.get('radius_km') or default_radius)
+            }
+        except (TypeError, ValueError) as e:
+            print(f"Skipping feature {number} with invalid coordinates or radius ({e}): {properties}")
+            continue
+        location['name'] = properties.get('name') or f"{location['lat']}, {location['lon']}"
+        locations.append(location)
+    return locations
+
+
+def warm_location(fetcher, render_plan, location):
+    """
+    Fetch one location into the cache and return its feature count
+    """
+    if 'address' in location:
+        location['lat'], location['lon'] = fetcher.get_coordinates_from_address(location['address'])
+    # The square bbox covers the tiles of circular frames too
+    data = fetcher.fetch_osm_data(location['lat'], location['lon'], location['radius'], render_plan=render_plan)
+    return sum(len(elements) for elements in data.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prefetch OSM data for a list of locations into the cache",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Usage examples:
+  python warm_cache.py locations.csv
+  python warm_cache.py popular_spots.geojson --radius 1.5 --workers 4
+
+CSV format (radius is optional, address can replace lat/lon):
+  name,lat,lon,radius
+  madrid,40.4168,-3.7038,1.5
+        """
+    )
+    parser.add_argument('input', type=str, help='CSV or GeoJSON file with locations')
+    parser.add_argument('--radius', '-r', type=float, default=1.0, help='Radius in km for locations without one (default: 1.0)')
+    parser.add_argument('--workers', '-w', type=int, default=2, help='Locations fetched at the same time (default: 2)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: {args.input} not found")
+        sys.exit(1)
+
+    locations = read_locations(args.input, args.radius)
+    if not locations:
+        print("No locations to warm")
+        return
+
+    fetcher = OSMDataFetcher()
+    render_plan = MapGenerator(osm_fetcher=fetcher).get_render_plan()
+
+    print(f"Warming cache for {len(locations)} locations with {args.workers} workers...")
+    start_time = time.time()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(warm_location, fetcher, render_plan, location): location
+            for location in locations
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            location = futures[future]
+            try:
+                status = f"✓ {future.result()} features"
+            except Exception as e:
+                failed += 1
+                status = f"✗ {e}"
+            print(f"[{done}/{len(locations)}] {location['name']} ({location['radius']} km): {status}")
+
+    print(f"\n✓ Warmed {len(locations) - failed}/{len(locations)} locations in {time.time() - start_time:.1f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Background refresh of frequently used OSM cache tiles
+
+Tiles that were used recently and are about to expire are brought up to
+date with Overpass diff queries (elements changed since the tile's
+snapshot), so popular areas stay current without being downloaded again.
+"""
+
+import threading
+import time
+
+from osm_cache import OSMCache
+from tiles import quadkey_to_tile
+
+DEFAULT_INTERVAL = 3600  # Seconds between refresh passes
+DEFAULT_HOT_WINDOW = 7 * 24 * 3600  # Only tiles used in the last week are refreshed
+MAX_TILES_PER_QUERY = 256
+
+
+class CacheRefresher:
+    def __init__(self, fetcher, interval=DEFAULT_INTERVAL, hot_window=DEFAULT_HOT_WINDOW, max_tiles=2000):
+        self.fetcher = fetcher
+        self.interval = interval
+        self.hot_window = hot_window
+        self.max_tiles = max_tiles
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start refreshing in a daemon thread every interval seconds
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="osm-cache-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self, refresh_all=False):
+        """
+        Refresh hot tiles expiring before the next pass (every tile with a
+        snapshot if refresh_all) and return (tiles, changed_elements)
+        """
+        cache = self.fetcher.cache
+        now = time.time()
+        if refresh_all:
+            keys = cache.list_refreshable(limit=self.max_tiles)
+        else:
+            # Tiles expiring before the next pass are refreshed now, so hot
+            # areas never actually expire
+            keys = cache.list_refreshable(
+                accessed_since=now - self.hot_window,
+                expires_before=now + 2 * self.interval,
+                limit=self.max_tiles
+            )
+
+        groups = {}
+        for key in keys:
+            parsed = OSMCache.parse_tile_key(key)
+            if parsed is None:
+                continue
+            quadkey, signature = parsed
+            x, y, _ = quadkey_to_tile(quadkey)
+            groups.setdefault(signature, []).append((x, y))
+
+        refreshed = 0
+        changed = 0
+        for signature, tiles in groups.items():
+            for start in range(0, len(tiles), MAX_TILES_PER_QUERY):
+                batch = tiles[start:start + MAX_TILES_PER_QUERY]
+                try:
+                    changed += self.fetcher.refresh_tiles(signature, batch)
+                    refreshed += len(batch)
+                except Exception as e:
+                    print(f"Cache refresh failed for {signature}: {str(e)}")
+        return refreshed, changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            refreshed, changed = self.run_once()
+            if refreshed:
+                print(f"Refreshed {refreshed} cached tile layers ({changed} changed elements)")
@@ -0,0 +1,215 @@
+"""
+Clipping of feature collections to the requested area of interest
+"""
+
+import math
+import numpy as np
+from geometry import FeatureCollection, GeometryLayer, LINEAR_LAYERS, OSM_TYPES
+
+# The circle is clipped as a regular polygon; with 64 sides the edge strays
+# at most 0.12% of the radius from the true circle
+CIRCLE_SEGMENTS = 64
+
+
+class LocalFrame:
+    """
+    Equirectangular kilometre frame around a center, matching calculate_bbox
+    """
+
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+        self.km_per_lat = 111.0
+        self.km_per_lon = 111.0 * math.cos(math.radians(lat))
+
+    def forward(self, coords):
+        """
+        Convert (N, 2) lat/lon to (N, 2) x/y kilometres
+        """
+        return np.column_stack([
+            (coords[:, 1] - self.lon) * self.km_per_lon,
+            (coords[:, 0] - self.lat) * self.km_per_lat
+        ])
+
+    def inverse(self, xy):
+        """
+        Convert (N, 2) x/y kilometres back to lat/lon tuples
+        """
+        lats = xy[:, 1] / self.km_per_lat + self.lat
+        lons = xy[:, 0] / self.km_per_lon + self.lon
+        return list(zip(lats.tolist(), lons.tolist()))
+
+
+def clip_to_circle(features, lat, lon, radius_km, segments=CIRCLE_SEGMENTS):
+    """
+    Clip every layer to the disk of radius_km around (lat, lon)
+    """
+    angles = np.linspace(0, 2 * math.pi, segments, endpoint=False)
+    clip = np.column_stack([radius_km * np.cos(angles), radius_km * np.sin(angles)])
+    return _clip_collection(features, LocalFrame(lat, lon), clip)
+
+
+def clip_to_bbox(features, bbox):
+    """
+    Clip every layer to a (south, west, north, east) bounding box
+    """
+    south, west, north, east = bbox
+    frame = LocalFrame((south + north) / 2, (west + east) / 2)
+    corners = np.array([[south, west], [south, east], [north, east], [north, west]])
+    return _clip_collection(features, frame, frame.forward(corners))
+
+
+def _clip_collection(features, frame, clip):
+    return FeatureCollection({
+        name: _clip_layer(layer, frame, clip, name in LINEAR_LAYERS)
+        for name, layer in features.layers.items()
+    })
+
+
+def _clip_layer(layer, frame, clip, linear):
+    """
+    Keep features inside the clip polygon, drop those outside and cut the rest
+    """
+    if len(layer) == 0:
+        return layer
+
+    xy = frame.forward(layer.coords.astype(np.float64))
+    inside = np.ones(len(xy), dtype=bool)
+    for start, end in zip(clip, np.roll(clip, -1, axis=0)):
+        inside &= _edge_side(xy, start, end) >= 0
+
+    # For a convex clip area a feature with every vertex inside is fully inside
+    starts = layer.ring_offsets[layer.feature_offsets[:-1]]
+    all_inside = np.logical_and.reduceat(inside, starts)
+    any_inside = np.logical_or.reduceat(inside, starts)
+
+    # Features without vertices inside can still cover the area, so only
+    # drop them when their bounds miss the clip polygon's bounds
+    min_x = np.minimum.reduceat(xy[:, 0], starts)
+    min_y = np.minimum.reduceat(xy[:, 1], starts)
+    max_x = np.maximum.reduceat(xy[:, 0], starts)
+    max_y = np.maximum.reduceat(xy[:, 1], starts)
+    overlaps = (
+        (max_x >= clip[:, 0].min()) & (min_x <= clip[:, 0].max()) &
+        (max_y >= clip[:, 1].min()) & (min_y <= clip[:, 1].max())
+    )
+    needs_clip = ~all_inside & (any_inside | overlaps)
+
+    ring_offsets = layer.ring_offsets
+    feature_offsets = layer.feature_offsets
+    clipped_elements = []
+    for index in np.flatnonzero(needs_clip):
+        rings = [xy[ring_offsets[ring]:ring_offsets[ring + 1]] for ring in range(feature_offsets[index], feature_offsets[index + 1])]
+        base = {
+            'id': int(layer.osm_ids[index]),
+            'osm_type': OSM_TYPES[layer.osm_types[index]],
+            'subtype': layer.subtypes[layer.subtype_codes[index]]
+        }
+        if layer.parts[index]:
+            base['part'] = int(layer.parts[index])
+
+        if linear:
+            for part in clip_line(rings[0], clip):
+                clipped_elements.append(dict(base, coordinates=frame.inverse(part)))
+            continue
+
+        outer = clip_ring(rings[0], clip)
+        if len(outer) < 4:
+            continue
+        element_data = dict(base, coordinates=frame.inverse(outer))
+        holes = [hole for hole in (clip_ring(ring, clip) for ring in rings[1:]) if len(hole) >= 4]
+        if holes:
+            element_data['holes'] = [frame.inverse(hole) for hole in holes]
+        clipped_elements.append(element_data)
+
+    clipped = GeometryLayer.from_elements(clipped_elements, dtype=layer.coords.dtype)
+    return GeometryLayer.concat([layer.select(all_inside), clipped])
+
+
+def _edge_side(points, start, end):
+    """
+    Cross product sign of points against an edge; >= 0 is inside a CCW polygon
+    """
+    return (end[0] - start[0]) * (points[:, 1] - start[1]) - (end[1] - start[1]) * (points[:, 0] - start[0])
+
+
+def clip_ring(ring, clip):
+    """
+    Sutherland-Hodgman clipping of a closed ring against a convex CCW polygon
+    """
+    points = ring[:-1] if len(ring) > 1 and np.array_equal(ring[0], ring[-1]) else ring
+
+    for start, end in zip(clip, np.roll(clip, -1, axis=0)):
+        if len(points) == 0:
+            break
+        previous = np.roll(points, 1, axis=0)
+        side = _edge_side(points, start, end)
+        previous_side = np.roll(side, 1)
+        current_inside = side >= 0
+        crosses = current_inside != (previous_side >= 0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = previous_side / (previous_side - side)
+            # t is only meaningful where the edge is crossed; other rows are masked out below
+            intersections = previous + t[:, None] * (points - previous)
+
+        # Each vertex emits its entry/exit intersection first, then itself if inside
+        candidates = np.stack([intersections, points], axis=1)
+        emit = np.column_stack([crosses, current_inside])
+        points = candidates[emit]
+
+    if len(points) < 3:
+        return np.zeros((0, 2))
+    return np.vstack([points, points[:1]])
+
+
+def clip_line(line, clip):
+    """
+    Cyrus-Beck clipping of a polyline against a convex CCW polygon
+
+    Returns the list of visible pieces, each an (N, 2) array.
+    """
+    if len(line) < 2:
+        return []
+
+    origins = line[:-1]
+    directions = line[1:] - line[:-1]
+    t_enter = np.zeros(len(origins))
+    t_exit = np.ones(len(origins))
+
+    for start, end in zip(clip, np.roll(clip, -1, axis=0)):
+        numerator = _edge_side(origins, start, end)
+        denominator = (end[0] - start[0]) * directions[:, 1] - (end[1] - start[1]) * directions[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = -numerator / denominator
+        entering = denominator > 0
+        leaving = denominator < 0
+        t_enter = np.where(entering, np.maximum(t_enter, t), t_enter)
+        t_exit = np.where(leaving, np.minimum(t_exit, t), t_exit)
+        # Segments parallel to an edge and outside it are invisible
+        parallel_outside = (denominator == 0) & (numerator < 0)
+        t_exit = np.where(parallel_outside, -1.0, t_exit)
+
+    pieces = []
+    current = []
+    for index in range(len(origins)):
+        if t_enter[index] >= t_exit[index]:
+            if len(current) >= 2:
+                pieces.append(np.array(current))
+            current = []
+            continue
+        start_point = origins[index] + t_enter[index] * directions[index]
+        end_point = origins[index] + t_exit[index] * directions[index]
+        if current and t_enter[index] == 0:
+            current.append(end_point)
+        else:
+            if len(current) >= 2:
+                pieces.append(np.array(current))
+            current = [start_point, end_point]
+        if t_exit[index] < 1:
+            pieces.append(np.array(current))
+            current = []
+
+    if len(current) >= 2:
+        pieces.append(np.array(current))
+    return pieces
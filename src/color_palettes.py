@@ -599,4 +599,15 @@ def list_palettes():
     """
     Returns list of available palettes
     """
-    return list(COLOR_PALETTES.keys())
\ No newline at end of file
+    return list(COLOR_PALETTES.keys())
+
+def get_styled_tag_keys():
+    """
+    Returns the OSM tag keys palettes assign colors to
+    """
+    return sorted({
+        element_type
+        for palette in COLOR_PALETTES.values()
+        for element_type, colors in palette.items()
+        if isinstance(colors, dict)
+    })
@@ -0,0 +1,102 @@
+"""
+Culling of features too small to see at the rendered zoom
+
+Polygons whose projected footprint is below a pixel threshold are removed
+and replaced by one square per small grid cell with their combined area,
+so dense areas keep their texture with a fraction of the shapes. Lines
+below the threshold are simply dropped.
+"""
+
+import math
+import numpy as np
+from geometry import FeatureCollection, GeometryLayer, LINEAR_LAYERS, EARTH_RADIUS
+from tiles import TILE_SIZE, pixels_to_lat_lon
+
+DEFAULT_MIN_FEATURE_PX = 1.0
+AGGREGATE_CELL_PX = 4  # Side of the grid cells sub-pixel polygons are merged into
+
+
+def cull_collection(features, zoom, min_feature_px=DEFAULT_MIN_FEATURE_PX, cell_px=AGGREGATE_CELL_PX):
+    """
+    Cull every layer of a collection for display at a zoom
+
+    Returns (collection, culled_count, aggregate_count).
+    """
+    layers = {}
+    culled = aggregated = 0
+    for name, layer in features.layers.items():
+        layers[name], layer_culled, layer_aggregated = cull_layer(
+            layer, zoom, min_feature_px, cell_px, aggregate=name not in LINEAR_LAYERS
+        )
+        culled += layer_culled
+        aggregated += layer_aggregated
+    return FeatureCollection(layers), culled, aggregated
+
+
+def cull_layer(layer, zoom, min_feature_px=DEFAULT_MIN_FEATURE_PX, cell_px=AGGREGATE_CELL_PX, aggregate=True):
+    """
+    Drop features whose pixel bounding box is smaller than min_feature_px
+    on both sides, merging dropped polygons into per-cell aggregate squares
+
+    Returns (layer, culled_count, aggregate_count).
+    """
+    if len(layer) == 0 or min_feature_px <= 0:
+        return layer, 0, 0
+
+    pixels = layer.pixels(zoom)
+    starts = layer.ring_offsets[layer.feature_offsets[:-1]]
+    minimum = np.minimum.reduceat(pixels, starts, axis=0)
+    maximum = np.maximum.reduceat(pixels, starts, axis=0)
+    footprint = (maximum - minimum).max(axis=1)
+    small = footprint < min_feature_px
+    if not small.any():
+        return layer, 0, 0
+
+    kept = layer.select(~small)
+    if not aggregate:
+        return kept, int(small.sum()), 0
+
+    aggregates = _aggregate_cells(layer, small, (minimum + maximum)[small] / 2, zoom, cell_px)
+    return GeometryLayer.concat([kept, aggregates]), int(small.sum()), len(aggregates)
+
+
+def _aggregate_cells(layer, small, centers, zoom, cell_px):
+    """
+    One square per grid cell with the combined pixel area of its small
+    polygons, centred on their area-weighted centre, coloured as the most
+    common subtype of the cell
+    """
+    # Convert m² to px² with the ground resolution at each feature's latitude
+    lats = layer.coords[layer.ring_offsets[layer.feature_offsets[:-1]][small], 0].astype(np.float64)
+    metres_per_px = 2 * math.pi * EARTH_RADIUS * np.cos(np.radians(lats)) / (TILE_SIZE * 2 ** zoom)
+    areas = layer.outline_areas_m2()[small] / metres_per_px ** 2
+
+    cells, cell_index = np.unique(np.floor(centers / cell_px).astype(np.int64), axis=0, return_inverse=True)
+    cell_index = cell_index.reshape(-1)
+    cell_count = len(cells)
+    cell_areas = np.bincount(cell_index, weights=areas, minlength=cell_count)
+    # Cells of zero-area slivers fall back to the plain mean centre
+    weights = np.where(cell_areas[cell_index] > 0, areas, 1.0)
+    weight_sums = np.bincount(cell_index, weights=weights, minlength=cell_count)
+    center_x = np.bincount(cell_index, weights=weights * centers[:, 0], minlength=cell_count) / weight_sums
+    center_y = np.bincount(cell_index, weights=weights * centers[:, 1], minlength=cell_count) / weight_sums
+
+    subtype_count = len(layer.subtypes)
+    votes = np.bincount(
+        cell_index * subtype_count + layer.subtype_codes[small], minlength=cell_count * subtype_count
+    ).reshape(cell_count, subtype_count)
+    dominant = votes.argmax(axis=1)
+
+    # Squares never outgrow their cell; invisible ones are not drawn at all
+    half_sides = np.minimum(np.sqrt(cell_areas), cell_px) / 2
+    visible = half_sides >= 0.25
+    elements = []
+    for x, y, half, code in zip(center_x[visible], center_y[visible], half_sides[visible], dominant[visible]):
+        square = np.array([
+            [x - half, y - half], [x + half, y - half], [x + half, y + half], [x - half, y + half], [x - half, y - half]
+        ])
+        elements.append({
+            'coordinates': [tuple(coord) for coord in pixels_to_lat_lon(square, zoom).tolist()],
+            'subtype': layer.subtypes[code]
+        })
+    return GeometryLayer.from_elements(elements, dtype=layer.coords.dtype)
@@ -0,0 +1,127 @@
+"""
+Dissolving of touching polygons drawn with the same style
+
+Terraced buildings share walls and get nearly the same color, yet each one
+is a separate path in the HTML. Shapes whose colors match (within a small
+tolerance) and that touch at the rendered zoom are unioned into single
+polygons, so a block of houses becomes one path. Merged shapes lose their
+per-feature popups.
+"""
+
+import numpy as np
+from tiles import lat_lon_to_pixels, pixels_to_lat_lon
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+DEFAULT_GAP_PX = 1.0  # Shapes closer than this many pixels count as touching
+COLOR_TOLERANCE = 24  # Per RGB channel; colors this close are merged into one
+
+
+def dissolve_shapes(shapes, zoom, gap_px=DEFAULT_GAP_PX, color_tolerance=COLOR_TOLERANCE):
+    """
+    Union touching shapes of the same style
+
+    shapes are dicts with 'rings' (outline first, then holes, as [lat, lon]
+    lists), 'color' and 'popup'. Returns a new list in drawing order: each
+    merged shape takes the place of its first member and the color of that
+    member, shapes that touch nothing are returned unchanged.
+    """
+    if shapely is None:
+        raise ImportError("shapely is required to dissolve shapes. Install it with 'pip install shapely'")
+
+    groups = {}
+    for index, shape in enumerate(shapes):
+        groups.setdefault(_style_key(shape['color'], color_tolerance), []).append(index)
+
+    # Merged shapes replace their first member; other members are dropped
+    replaced = {}
+    for indices in groups.values():
+        if len(indices) < 2:
+            continue
+        for members in _touching_components([shapes[index] for index in indices], zoom, gap_px):
+            member_indices = [indices[member] for member in members]
+            first = shapes[member_indices[0]]
+            merged = _union([shapes[index] for index in member_indices], zoom, gap_px)
+            replaced[member_indices[0]] = [{'rings': rings, 'color': first['color'], 'popup': None} for rings in merged]
+            for index in member_indices[1:]:
+                replaced[index] = []
+
+    dissolved = []
+    for index, shape in enumerate(shapes):
+        dissolved.extend(replaced.get(index, [shape]))
+    return dissolved
+
+
+def _style_key(color, color_tolerance):
+    """
+    Group key of a color: hex colors are snapped to a grid of color_tolerance
+    per channel, anything else (named colors, gradients) must match exactly
+    """
+    if color_tolerance > 0 and color.startswith('#') and len(color) == 7:
+        try:
+            return tuple(int(color[i:i + 2], 16) // color_tolerance for i in (1, 3, 5))
+        except ValueError:
+            pass
+    return color
+
+
+def _to_polygon(rings, zoom):
+    pixel_rings = [lat_lon_to_pixels(np.asarray(ring, dtype=np.float64), zoom) for ring in rings]
+    return shapely.Polygon(pixel_rings[0], pixel_rings[1:])
+
+
+def _touching_components(shapes, zoom, gap_px):
+    """
+    Lists of indices of shapes touching each other (directly or through
+    other members); shapes touching nothing are not returned
+    """
+    polygons = shapely.make_valid(np.array([_to_polygon(shape['rings'], zoom) for shape in shapes]))
+    tree = shapely.STRtree(polygons)
+    left, right = tree.query(polygons, predicate='dwithin', distance=gap_px)
+
+    # Union-find over the touching pairs
+    parents = list(range(len(shapes)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        if a != b:
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    components = {}
+    for index in range(len(shapes)):
+        components.setdefault(find(index), []).append(index)
+    return [members for members in components.values() if len(members) > 1]
+
+
+def _union(shapes, zoom, gap_px):
+    """
+    Union of touching shapes as a list of ring lists
+
+    Shapes are grown by half the gap before the union and shrunk back after
+    it, which closes the slivers left between shared walls that were
+    simplified differently.
+    """
+    half_gap = gap_px / 2
+    polygons = shapely.make_valid(np.array([_to_polygon(shape['rings'], zoom) for shape in shapes]))
+    grown = shapely.buffer(polygons, half_gap, join_style='mitre')
+    merged = shapely.union_all(grown).buffer(-half_gap, join_style='mitre')
+    # The union leaves collinear vertices along former shared walls
+    merged = merged.simplify(half_gap / 2, preserve_topology=True)
+
+    parts = []
+    for polygon in getattr(merged, 'geoms', [merged]):
+        if polygon.geom_type != 'Polygon' or polygon.is_empty:
+            continue
+        rings = [polygon.exterior] + list(polygon.interiors)
+        parts.append([pixels_to_lat_lon(np.asarray(ring.coords), zoom).tolist() for ring in rings])
+    return parts
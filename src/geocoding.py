@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Cached, rate-limited geocoding of addresses with Nominatim
+"""
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+from geopy.geocoders import Nominatim
+from osm_cache import DEFAULT_CACHE_DIR
+from rate_limit import TokenBucket
+
+GEOCODE_TTL = 90 * 24 * 3600  # Addresses rarely move, keep them for 90 days
+
+# Nominatim's usage policy allows at most one request per second per client,
+# so every Geocoder in the process shares the same bucket
+_nominatim_bucket = TokenBucket(rate=1.0, capacity=1)
+
+
+def normalize_address(address):
+    """
+    Normalize an address so trivial spelling differences share a cache entry
+    """
+    address = unicodedata.normalize('NFKC', address).casefold()
+    address = re.sub(r'\s*,\s*', ', ', address)
+    address = re.sub(r'\s+', ' ', address)
+    return address.strip(' ,.;')
+
+
+class GeocodeCache:
+    def __init__(self, cache_dir=None, ttl=GEOCODE_TTL):
+        cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, 'geocode_cache.sqlite'), timeout=30, check_same_thread=False
+        )
+        # lat/lon are NULL for addresses Nominatim could not find
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                address TEXT PRIMARY KEY,
+                lat REAL,
+                lon REAL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, address):
+        """
+        Return (found, (lat, lon)) for a cached address, or None if not cached
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lon, created_at FROM geocodes WHERE address = ?", (address,)
+            ).fetchone()
+        if row is None or row[2] + self.ttl < time.time():
+            return None
+        if row[0] is None:
+            return False, None
+        return True, (row[0], row[1])
+
+    def put(self, address, coordinates):
+        """
+        Store coordinates for an address (None records a failed lookup)
+        """
+        lat, lon = coordinates if coordinates else (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocodes (address, lat, lon, created_at) VALUES (?, ?, ?, ?)",
+                (address, lat, lon, time.time())
+            )
+            self._conn.commit()
+
+
+class Geocoder:
+    def __init__(self, cache=None, use_cache=True, user_agent="map_generator"):
+        self.geolocator = Nominatim(user_agent=user_agent)
+        if cache is None and use_cache:
+            cache = GeocodeCache()
+        self.cache = cache
+
+    def geocode(self, address):
+        """
+        Convert an address to GPS coordinates, using the cache when possible
+        """
+        key = normalize_address(address)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                found, coordinates = cached
+                if not found:
+                    raise ValueError(f"Could not find address: {address}")
+                return coordinates
+
+        try:
+            _nominatim_bucket.acquire()
+            location = self.geolocator.geocode(address)
+        except Exception as e:
+            raise ValueError(f"Error searching for address: {str(e)}")
+
+        coordinates = (location.latitude, location.longitude) if location else None
+        if self.cache is not None:
+            self.cache.put(key, coordinates)
+        if coordinates is None:
+            raise ValueError(f"Could not find address: {address}")
+        return coordinates
+
+    def geocode_batch(self, addresses, verbose=True):
+        """
+        Geocode many addresses at Nominatim's 1 request/second pace
+
+        Returns a dict of address -> (lat, lon), or None when not found.
+        """
+        results = {}
+        for i, address in enumerate(addresses, 1):
+            try:
+                results[address] = self.geocode(address)
+                status = f"{results[address][0]:.6f}, {results[address][1]:.6f}"
+            except ValueError as e:
+                results[address] = None
+                status = str(e)
+            if verbose:
+                print(f"[{i}/{len(addresses)}] {address}: {status}")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Geocode a list of addresses into the local geocode cache",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Usage examples:
+  python geocoding.py addresses.txt
+  python geocoding.py addresses.txt --output coordinates.csv
+        """
+    )
+    parser.add_argument('input', type=str, help='Text file with one address per line')
+    parser.add_argument('--output', '-o', type=str, help='Write address,lat,lon rows to this CSV file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: {args.input} not found")
+        sys.exit(1)
+
+    with open(args.input, encoding='utf-8') as f:
+        addresses = [line.strip() for line in f if line.strip()]
+
+    results = Geocoder().geocode_batch(addresses)
+    found = sum(1 for coordinates in results.values() if coordinates)
+    print(f"\n✓ Geocoded {found}/{len(addresses)} addresses")
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['address', 'lat', 'lon'])
+            for address, coordinates in results.items():
+                writer.writerow([address] + list(coordinates or ['', '']))
+        print(f"Results saved as: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+One Leaflet GeoJSON layer for many styled polygons
+
+folium.Polygon writes a JS variable, an options object and a popup for
+every feature. StyledGeoJson writes a whole layer as one compact
+FeatureCollection: features carry indices into shared color and popup
+tables, one style function turns them into path options and popups are
+bound as the features are created.
+"""
+
+import html
+import json
+from branca.element import MacroElement
+from jinja2 import Template
+
+
+class StyledGeoJson(MacroElement):
+    """
+    Filled, strokeless polygons from resolved shapes (dicts with 'rings'
+    as [lat, lon] lists, outline first, and 'color' and 'popup')
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_colors = {{ this.colors }};
+            var {{ this.get_name() }}_popups = {{ this.popups }};
+            var {{ this.get_name() }} = L.geoJSON({{ this.data }}, {
+                style: function(feature) {
+                    var color = {{ this.get_name() }}_colors[feature.properties.c];
+                    return {color: color, fillColor: color, fill: true, fillOpacity: 1.0, stroke: false, fillRule: "evenodd"};
+                },
+                onEachFeature: function(feature, layer) {
+                    if (feature.properties.p !== undefined) {
+                        layer.bindPopup({{ this.get_name() }}_popups[feature.properties.p], {maxWidth: "100%"});
+                    }
+                }
+            }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, shapes):
+        super().__init__()
+        self._name = 'StyledGeoJson'
+
+        colors = {}
+        popups = {}
+        features = []
+        for shape in shapes:
+            properties = {'c': colors.setdefault(shape['color'], len(colors))}
+            if shape.get('popup'):
+                # Popups are set as HTML, so their text is escaped here
+                properties['p'] = popups.setdefault(html.escape(shape['popup']), len(popups))
+            features.append({
+                'type': 'Feature',
+                'properties': properties,
+                'geometry': {
+                    'type': 'Polygon',
+                    # GeoJSON positions are [lon, lat]
+                    'coordinates': [[[lon, lat] for lat, lon in ring] for ring in shape['rings']]
+                }
+            })
+
+        self.colors = self._to_js(list(colors))
+        self.popups = self._to_js(list(popups))
+        self.data = self._to_js({'type': 'FeatureCollection', 'features': features})
+
+    def _to_js(self, value):
+        # Compact JSON that cannot close the surrounding <script> element
+        return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
@@ -0,0 +1,310 @@
+"""
+Columnar NumPy containers for processed OpenStreetMap geometry
+"""
+
+import numpy as np
+from tiles import lat_lon_to_mercator, mercator_to_pixels
+
+LAYERS = ['highways', 'landuse', 'natural', 'buildings', 'railways']
+OSM_TYPES = ['way', 'relation']
+# Layers drawn as lines rather than filled polygons
+LINEAR_LAYERS = ('highways', 'railways')
+EARTH_RADIUS = 6371008.8  # Mean Earth radius in metres
+
+
+def concat_ranges(starts, ends):
+    """
+    Concatenate np.arange(start, end) for every start/end pair without a Python loop
+    """
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+class GeometryLayer:
+    """
+    Features of one layer stored as flat arrays
+
+    coords          (N, 2) lat/lon of every vertex
+    ring_offsets    (R + 1) start of each ring in coords
+    feature_offsets (F + 1) start of each feature in rings; the first ring
+                    of a feature is its outline, the others are holes
+    subtype_codes   (F) index of each feature's subtype in subtypes
+    osm_ids         (F) OSM id of each feature
+    osm_types       (F) index of each feature's OSM type in OSM_TYPES
+    parts           (F) polygon index within a multipolygon relation, 0
+                    for everything else (all zero when not given)
+    """
+
+    def __init__(self, coords, ring_offsets, feature_offsets, subtype_codes, subtypes, osm_ids, osm_types, parts=None):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.feature_offsets = feature_offsets
+        self.subtype_codes = subtype_codes
+        self.subtypes = subtypes
+        self.osm_ids = osm_ids
+        self.osm_types = osm_types
+        self.parts = np.zeros(len(osm_ids), dtype=np.int32) if parts is None else parts
+        # Derived arrays computed on demand; layers are never modified in place
+        self._cache = {}
+
+    @classmethod
+    def from_elements(cls, elements, dtype=np.float64):
+        """
+        Build a layer from a processed_data list of element dicts
+        """
+        coords = []
+        ring_offsets = [0]
+        feature_offsets = [0]
+        subtype_codes = []
+        subtypes = {}
+        osm_ids = []
+        osm_types = []
+        parts = []
+
+        for element in elements:
+            if not element['coordinates']:
+                continue
+            for ring in [element['coordinates']] + element.get('holes', []):
+                coords.extend(ring)
+                ring_offsets.append(len(coords))
+            feature_offsets.append(len(ring_offsets) - 1)
+            # Intern subtypes so each feature only stores a small integer
+            subtype = element.get('subtype', 'unknown')
+            subtype_codes.append(subtypes.setdefault(subtype, len(subtypes)))
+            osm_ids.append(element.get('id') or 0)
+            osm_types.append(OSM_TYPES.index(element.get('osm_type', 'way')))
+            parts.append(element.get('part', 0))
+
+        return cls(
+            np.array(coords, dtype=dtype).reshape(-1, 2),
+            np.array(ring_offsets, dtype=np.int64),
+            np.array(feature_offsets, dtype=np.int64),
+            np.array(subtype_codes, dtype=np.int32),
+            list(subtypes),
+            np.array(osm_ids, dtype=np.int64),
+            np.array(osm_types, dtype=np.uint8),
+            np.array(parts, dtype=np.int32)
+        )
+
+    def __len__(self):
+        return len(self.feature_offsets) - 1
+
+    @classmethod
+    def concat(cls, layers):
+        """
+        Join several layers into one, merging their subtype tables
+        """
+        subtypes = {}
+        coords, ring_lengths, rings_per_feature = [], [], []
+        subtype_codes, osm_ids, osm_types, parts = [], [], [], []
+
+        for layer in layers:
+            remap = np.array([subtypes.setdefault(subtype, len(subtypes)) for subtype in layer.subtypes], dtype=np.int32)
+            coords.append(layer.coords)
+            ring_lengths.append(layer.ring_lengths())
+            rings_per_feature.append(np.diff(layer.feature_offsets))
+            subtype_codes.append(remap[layer.subtype_codes] if len(remap) else layer.subtype_codes)
+            osm_ids.append(layer.osm_ids)
+            osm_types.append(layer.osm_types)
+            parts.append(layer.parts)
+
+        joined = cls(
+            np.concatenate(coords).reshape(-1, 2),
+            np.concatenate([[0], np.cumsum(np.concatenate(ring_lengths))]).astype(np.int64),
+            np.concatenate([[0], np.cumsum(np.concatenate(rings_per_feature))]).astype(np.int64),
+            np.concatenate(subtype_codes).astype(np.int32),
+            list(subtypes),
+            np.concatenate(osm_ids).astype(np.int64),
+            np.concatenate(osm_types).astype(np.uint8),
+            np.concatenate(parts).astype(np.int32)
+        )
+        # Keep a projection some inputs already have; the others are projected now
+        if any('mercator' in layer._cache for layer in layers):
+            joined._cache['mercator'] = np.concatenate([layer.mercator() for layer in layers]).reshape(-1, 2)
+        return joined
+
+    def select(self, mask):
+        """
+        Return a new layer with only the features where mask is true
+        """
+        indices = np.flatnonzero(mask)
+        ring_indices = concat_ranges(self.feature_offsets[indices], self.feature_offsets[indices + 1])
+        vertex_indices = concat_ranges(self.ring_offsets[ring_indices], self.ring_offsets[ring_indices + 1])
+        ring_lengths = self.ring_lengths()[ring_indices]
+        rings_per_feature = np.diff(self.feature_offsets)[indices]
+
+        selected = GeometryLayer(
+            self.coords[vertex_indices],
+            np.concatenate([[0], np.cumsum(ring_lengths)]).astype(np.int64),
+            np.concatenate([[0], np.cumsum(rings_per_feature)]).astype(np.int64),
+            self.subtype_codes[indices],
+            self.subtypes,
+            self.osm_ids[indices],
+            self.osm_types[indices],
+            self.parts[indices]
+        )
+        if 'mercator' in self._cache:
+            selected._cache['mercator'] = self._cache['mercator'][vertex_indices]
+        return selected
+
+    def mercator(self):
+        """
+        (N, 2) Web Mercator x/y metres of every vertex, cached per layer
+
+        Layers derived with select, concat or simplification inherit the
+        projected vertices, so the dataset is projected only once.
+        """
+        if 'mercator' not in self._cache:
+            self._cache['mercator'] = lat_lon_to_mercator(self.coords)
+        return self._cache['mercator']
+
+    def pixels(self, zoom):
+        """
+        (N, 2) Web Mercator x/y pixels of every vertex at a zoom, cached per layer
+        """
+        key = ('pixels', zoom)
+        if key not in self._cache:
+            self._cache[key] = mercator_to_pixels(self.mercator(), zoom)
+        return self._cache[key]
+
+    def feature_bounds(self):
+        """
+        (min_lat, min_lon, max_lat, max_lon) arrays of every feature
+        """
+        if len(self) == 0:
+            empty = np.zeros(0)
+            return empty, empty, empty, empty
+        # Vertices of a feature are contiguous, so reduce over each feature's range
+        starts = self.ring_offsets[self.feature_offsets[:-1]]
+        minimum = np.minimum.reduceat(self.coords, starts, axis=0)
+        maximum = np.maximum.reduceat(self.coords, starts, axis=0)
+        return minimum[:, 0], minimum[:, 1], maximum[:, 0], maximum[:, 1]
+
+    def ring_lengths(self):
+        """
+        Number of vertices of every ring
+        """
+        return np.diff(self.ring_offsets)
+
+    def outline_lengths(self):
+        """
+        Number of vertices of every feature's outline ring
+        """
+        return self.ring_lengths()[self.feature_offsets[:-1]]
+
+    def ring_areas_m2(self):
+        """
+        Area of every ring in square metres, cached per layer
+
+        Uses the Lambert cylindrical equal-area projection, so areas are
+        comparable at any latitude.
+        """
+        if 'ring_areas_m2' not in self._cache:
+            x = EARTH_RADIUS * np.radians(self.coords[:, 1].astype(np.float64))
+            y = EARTH_RADIUS * np.sin(np.radians(self.coords[:, 0].astype(np.float64)))
+            self._cache['ring_areas_m2'] = self._shoelace(x, y)
+        return self._cache['ring_areas_m2']
+
+    def outline_areas_m2(self):
+        """
+        Area of every feature's outline ring in square metres
+        """
+        return self.ring_areas_m2()[self.feature_offsets[:-1]]
+
+    def _shoelace(self, x, y):
+        """
+        Shoelace area of every ring from flat vertex coordinate arrays
+        """
+        areas = np.zeros(len(self.ring_offsets) - 1)
+        if len(x) == 0:
+            return areas
+
+        non_empty = self.ring_offsets[1:] > self.ring_offsets[:-1]
+        starts = self.ring_offsets[:-1][non_empty]
+        ends = self.ring_offsets[1:][non_empty]
+
+        # Measure from each ring's first vertex to keep precision with large coordinates
+        first = np.repeat(starts, ends - starts)
+        x = x - x[first]
+        y = y - y[first]
+
+        # Next vertex of each vertex, wrapping to the start of its ring
+        following = np.arange(1, len(x) + 1)
+        following[ends - 1] = starts
+        cross = x * y[following] - x[following] * y
+
+        areas[non_empty] = np.add.reduceat(cross, starts)
+        return np.abs(areas) / 2
+
+    def subtype_names(self):
+        """
+        Subtype string of every feature
+        """
+        return [self.subtypes[code] for code in self.subtype_codes]
+
+    def iter_features(self):
+        """
+        Yield (rings, subtype) per feature with rings as lists of [lat, lon]
+        """
+        coords = self.coords.tolist()
+        ring_offsets = self.ring_offsets.tolist()
+        feature_offsets = self.feature_offsets.tolist()
+
+        for index, code in enumerate(self.subtype_codes.tolist()):
+            rings = [
+                coords[ring_offsets[ring]:ring_offsets[ring + 1]]
+                for ring in range(feature_offsets[index], feature_offsets[index + 1])
+            ]
+            yield rings, self.subtypes[code]
+
+    def to_elements(self):
+        """
+        Convert back to a processed_data list of element dicts
+        """
+        elements = []
+        for index, (rings, subtype) in enumerate(self.iter_features()):
+            element_data = {
+                'id': int(self.osm_ids[index]),
+                'osm_type': OSM_TYPES[self.osm_types[index]],
+                'coordinates': [tuple(coord) for coord in rings[0]],
+                'subtype': subtype
+            }
+            if self.parts[index]:
+                # Parts of one relation share its id and are told apart by part
+                element_data['part'] = int(self.parts[index])
+            if len(rings) > 1:
+                element_data['holes'] = [[tuple(coord) for coord in ring] for ring in rings[1:]]
+            elements.append(element_data)
+        return elements
+
+
+class FeatureCollection:
+    """
+    Columnar feature collection with one GeometryLayer per OSM layer
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    @classmethod
+    def from_processed_data(cls, processed_data, dtype=np.float64):
+        """
+        Build a collection from the dict of lists returned by OSMDataFetcher
+        """
+        return cls({
+            layer: GeometryLayer.from_elements(processed_data.get(layer, []), dtype)
+            for layer in LAYERS
+        })
+
+    def __getitem__(self, layer):
+        return self.layers[layer]
+
+    def to_processed_data(self):
+        """
+        Convert back to the processed_data dict of lists
+        """
+        return {layer: geometry.to_elements() for layer, geometry in self.layers.items()}
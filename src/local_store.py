@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local OpenStreetMap store built from .osm.pbf extracts
+
+An extract is imported once into an SQLite database with an R-tree index,
+after which bbox queries are answered from disk in milliseconds.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from geometry import LINEAR_LAYERS
+from osm_data import CLASS_LAYERS, classify_tags, project_tags
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+BATCH_SIZE = 10000
+
+
+class LocalOSMStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS features (
+                id INTEGER PRIMARY KEY,
+                osm_type TEXT NOT NULL,
+                osm_id INTEGER NOT NULL,
+                part INTEGER NOT NULL,
+                layer TEXT NOT NULL,
+                subtype TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                geometry TEXT NOT NULL,
+                UNIQUE (osm_type, osm_id, part)
+            )
+        """)
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS features_index
+            USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+        """)
+        self._conn.commit()
+
+    def fetch(self, south, west, north, east, render_plan=None):
+        """
+        Return features intersecting a bbox in the processed_data shape
+
+        render_plan restricts the result to some feature classes and subtypes,
+        as in OSMDataFetcher.fetch_osm_data.
+        """
+        processed_data = {
+            'highways': [],
+            'landuse': [],
+            'natural': [],
+            'buildings': [],
+            'railways': []
+        }
+
+        if render_plan is None:
+            render_plan = {feature_class: None for feature_class in CLASS_LAYERS}
+        layer_subtypes = {CLASS_LAYERS[feature_class]: subtypes for feature_class, subtypes in render_plan.items()}
+
+        rows = self._conn.execute(
+            "SELECT f.osm_type, f.osm_id, f.part, f.layer, f.subtype, f.tags, f.geometry "
+            "FROM features_index i JOIN features f ON f.id = i.id "
+            "WHERE i.max_lat >= ? AND i.min_lat <= ? AND i.max_lon >= ? AND i.min_lon <= ? "
+            f"AND f.layer IN ({','.join('?' * len(layer_subtypes))})",
+            (south, north, west, east, *layer_subtypes)
+        )
+        for osm_type, osm_id, part, layer, subtype, tags, geometry in rows:
+            subtypes = layer_subtypes[layer]
+            if subtypes is not None and subtype not in subtypes:
+                continue
+            rings = json.loads(geometry)
+            element_data = {
+                'id': osm_id,
+                'osm_type': osm_type,
+                'coordinates': [tuple(coord) for coord in rings[0]],
+                'tags': json.loads(tags),
+                'subtype': subtype
+            }
+            if part:
+                element_data['part'] = part
+            if len(rings) > 1:
+                element_data['holes'] = [[tuple(coord) for coord in ring] for ring in rings[1:]]
+            processed_data[layer].append(element_data)
+
+        return processed_data
+
+    def import_pbf(self, pbf_path):
+        """
+        Load every renderable feature from a .osm.pbf extract into the store
+        """
+        if osmium is None:
+            raise ImportError("pyosmium is required to import .osm.pbf files. Install it with 'pip install osmium'")
+
+        handler = _ImportHandler(self)
+        # Node locations are kept in memory so ways and areas get their geometry
+        handler.apply_file(pbf_path, locations=True)
+        handler.flush()
+        self._conn.commit()
+        return handler.imported
+
+    def insert_features(self, rows):
+        """
+        Insert (osm_type, osm_id, part, layer, subtype, tags, rings) tuples
+
+        Features already in the store (same OSM type, id and part, e.g. from
+        an earlier import of an overlapping extract) are replaced in place.
+        """
+        for osm_type, osm_id, part, layer, subtype, tags, rings in rows:
+            # Replacing under the existing row id keeps its R-tree entry in sync
+            existing = self._conn.execute(
+                "SELECT id FROM features WHERE osm_type = ? AND osm_id = ? AND part = ?",
+                (osm_type, osm_id, part)
+            ).fetchone()
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO features (id, osm_type, osm_id, part, layer, subtype, tags, geometry) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (existing[0] if existing else None, osm_type, osm_id, part, layer, subtype,
+                 json.dumps(tags, separators=(',', ':')),
+                 json.dumps(rings, separators=(',', ':')))
+            )
+            lats = [coord[0] for coord in rings[0]]
+            lons = [coord[1] for coord in rings[0]]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO features_index (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+                (cursor.lastrowid, min(lats), max(lats), min(lons), max(lons))
+            )
+
+    def count(self):
+        """
+        Return the number of stored features per layer
+        """
+        return dict(self._conn.execute("SELECT layer, COUNT(*) FROM features GROUP BY layer").fetchall())
+
+
+if osmium is not None:
+    class _ImportHandler(osmium.SimpleHandler):
+        def __init__(self, store):
+            super().__init__()
+            self.store = store
+            self.pending = []
+            self.imported = 0
+
+        def way(self, way):
+            # Linear features come straight from ways, every other layer
+            # is imported from the areas osmium assembles
+            tags = {tag.k: tag.v for tag in way.tags}
+            classification = classify_tags(tags)
+            if classification is None or classification[0] not in LINEAR_LAYERS:
+                return
+            try:
+                coords = [(node.lat, node.lon) for node in way.nodes]
+            except osmium.InvalidLocationError:
+                return
+            if len(coords) >= 2:
+                self._add('way', way.id, 0, classification, tags, [coords])
+
+        def area(self, area):
+            # Closed ways and multipolygon relations arrive here already assembled
+            tags = {tag.k: tag.v for tag in area.tags}
+            classification = classify_tags(tags)
+            if classification is None or classification[0] in LINEAR_LAYERS:
+                return
+            osm_type = 'way' if area.from_way() else 'relation'
+            for part, outer in enumerate(area.outer_rings()):
+                rings = [[(node.lat, node.lon) for node in outer]]
+                rings.extend([(node.lat, node.lon) for node in inner] for inner in area.inner_rings(outer))
+                self._add(osm_type, area.orig_id(), part, classification, tags, rings)
+
+        def _add(self, osm_type, osm_id, part, classification, tags, rings):
+            layer, subtype = classification
+            self.pending.append((osm_type, osm_id, part, layer, subtype, project_tags(tags), rings))
+            if len(self.pending) >= BATCH_SIZE:
+                self.flush()
+
+        def flush(self):
+            self.store.insert_features(self.pending)
+            self.imported += len(self.pending)
+            self.pending = []
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import .osm.pbf extracts into a local store for offline map generation",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Usage examples:
+  python local_store.py import spain-latest.osm.pbf --db spain.sqlite
+  python local_store.py info --db spain.sqlite
+  python main.py --coords 40.4168 -3.7038 --local-store spain.sqlite
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Import a .osm.pbf extract')
+    import_parser.add_argument('pbf', type=str, help='Path to the .osm.pbf file')
+    import_parser.add_argument('--db', type=str, required=True, help='SQLite store to create or extend')
+    info_parser = subparsers.add_parser('info', help='Show feature counts of a store')
+    info_parser.add_argument('--db', type=str, required=True, help='SQLite store to inspect')
+
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        if not os.path.exists(args.pbf):
+            print(f"Error: {args.pbf} not found")
+            sys.exit(1)
+        store = LocalOSMStore(args.db)
+        print(f"Importing {args.pbf} into {args.db}...")
+        start_time = time.time()
+        try:
+            imported = store.import_pbf(args.pbf)
+        except ImportError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"✓ Imported {imported} features in {time.time() - start_time:.1f}s")
+    elif args.command == 'info':
+        store = LocalOSMStore(args.db)
+        for layer, count in sorted(store.count().items()):
+            print(f"  {layer}: {count}")
+
+
+if __name__ == "__main__":
+    main()
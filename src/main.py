@@ -6,6 +6,7 @@ Command line application for generating custom maps
 import argparse
 import sys
 from map_generator import MapGenerator
+from osm_data import OSMDataFetcher
 from color_palettes import list_palettes
 
 def main():
@@ -83,6 +84,14 @@ Usage examples:
         help='Image size in pixels (width and height, default: 1200)'
     )
     
+    parser.add_argument(
+        '--image-backend',
+        type=str,
+        choices=['raster', 'browser'],
+        default='raster',
+        help='Draw exported images directly (raster, needs Pillow) or screenshot the HTML in Chromium (browser, needs Playwright; default: raster)'
+    )
+    
     parser.add_argument(
         '--frame-color',
         type=str,
@@ -104,6 +113,52 @@ Usage examples:
         help='Color variation intensity for adjacent elements (0.0-1.0, default: 0.3)'
     )
     
+    parser.add_argument(
+        '--simplify-px',
+        type=float,
+        default=0.5,
+        help='Simplify shapes by dropping details smaller than this many pixels (default: 0.5, 0 disables)'
+    )
+    
+    parser.add_argument(
+        '--min-feature-px',
+        type=float,
+        default=1.0,
+        help='Merge shapes smaller than this many pixels into aggregates (default: 1.0, 0 disables)'
+    )
+    
+    parser.add_argument(
+        '--dissolve',
+        action='store_true',
+        help='Merge touching shapes of the same color into single shapes (smaller output, no per-building popups; requires shapely)'
+    )
+    
+    parser.add_argument(
+        '--renderer',
+        type=str,
+        choices=['svg', 'canvas'],
+        default='svg',
+        help='Leaflet renderer: svg (one element per shape) or canvas (faster for large maps, default: svg)'
+    )
+    
+    parser.add_argument(
+        '--no-glow',
+        action='store_true',
+        help='Draw the neon_city and cyberpunk palettes without the glow around each shape (faster canvas exports)'
+    )
+    
+    parser.add_argument(
+        '--local-store',
+        type=str,
+        help='Read OSM data from a local store built with local_store.py instead of Overpass'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always download fresh OpenStreetMap data instead of using the local cache'
+    )
+    
     # Informational options
     parser.add_argument(
         '--list-palettes',
@@ -132,6 +187,13 @@ Usage examples:
         sys.exit(1)
     
     try:
+        # Pick the OSM data source
+        if args.local_store:
+            from local_store import LocalOSMStore
+            osm_fetcher = OSMDataFetcher(backend=LocalOSMStore(args.local_store))
+        else:
+            osm_fetcher = OSMDataFetcher(use_cache=not args.no_cache)
+        
         # Create map generator
         generator = MapGenerator(
             palette_name=args.palette, 
@@ -139,7 +201,13 @@ Usage examples:
             use_gradients=args.gradients,
             frame_color=args.frame_color,
             frame_width=args.frame_width,
-            color_variation=args.color_variation
+            color_variation=args.color_variation,
+            osm_fetcher=osm_fetcher,
+            simplify_px=args.simplify_px,
+            min_feature_px=args.min_feature_px,
+            dissolve=args.dissolve,
+            renderer=args.renderer,
+            glow=False if args.no_glow else None
         )
         
         # Determine location
@@ -150,17 +218,22 @@ Usage examples:
             location = tuple(args.coords)
             print(f"Using coordinates: {args.coords[0]}, {args.coords[1]}")
         
-        # Generate map
+        # Generate map; the raster backend draws the image from the same scene
+        raster_image = args.export_image if args.image_backend == 'raster' else None
         generator.generate_custom_map(
             location=location,
             radius_km=args.radius,
-            output_file=args.output
+            output_file=args.output,
+            image_file=raster_image,
+            image_size=args.image_size
         )
         
         print(f"\n✓ Map generated successfully: {args.output}")
         
         # Export as image if requested
-        if args.export_image:
+        if raster_image:
+            print(f"✓ Image exported: {args.export_image}")
+        elif args.export_image:
             try:
                 from playwright.sync_api import sync_playwright
                 import os
@@ -6,55 +6,100 @@ import folium
 from folium import plugins
 from color_palettes import get_color_for_element, get_gradient_colors, get_complementary_color, get_gradient_for_element
 from osm_data import OSMDataFetcher
+from geometry import FeatureCollection, EARTH_RADIUS
+from clipping import clip_to_bbox, clip_to_circle
+from simplify import simplify_collection, DEFAULT_TOLERANCE_PX
+from culling import cull_collection, DEFAULT_MIN_FEATURE_PX
+from dissolve import dissolve_shapes
+from tiles import coordinate_decimals
+from spatial_index import GridIndex, greedy_coloring, touching_pairs
+from geojson_layer import StyledGeoJson
+from raster_renderer import RasterRenderer, save_scene
 import base64
+import zlib
 import io
 import random
 import colorsys
+import math
+
+# Area thresholds were tuned in square degrees around 40° latitude (Madrid,
+# Valencia); this keeps their meaning there while measuring in m² everywhere
+SQUARE_DEGREE_M2 = (EARTH_RADIUS * math.pi / 180) ** 2 * math.cos(math.radians(40))
+PROMINENT_BUILDING_AREA = 0.0005 * SQUARE_DEGREE_M2  # m²
+# Features whose bounds are closer than this (degrees, about a metre) are neighbors
+ADJACENCY_TOLERANCE = 0.00001
+GOLDEN_RATIO_CONJUGATE = (math.sqrt(5) - 1) / 2
+RENDERERS = ('svg', 'canvas')
+# Canvas shapes are not elements a CSS filter could reach, and a filter on
+# the canvas itself glows in the page's text color; this shadows each shape
+# in its own color while Leaflet paints it
+CANVAS_GLOW_SCRIPT = """
+<script>
+(function () {
+    var fillStroke = L.Canvas.prototype._fillStroke;
+    L.Canvas.prototype._fillStroke = function (ctx, layer) {
+        ctx.save();
+        ctx.shadowColor = layer.options.fillColor || layer.options.color;
+        ctx.shadowBlur = 5;
+        fillStroke.call(this, ctx, layer);
+        ctx.restore();
+    };
+})();
+</script>
+"""
+
 
 class MapGenerator:
-    def __init__(self, palette_name="classic", seed=None, use_gradients=False, frame_color="#333", frame_width=0, color_variation=0.3):
+    def __init__(self, palette_name="classic", seed=None, use_gradients=False, frame_color="#333", frame_width=0, color_variation=0.3, osm_fetcher=None, simplify_px=DEFAULT_TOLERANCE_PX, min_feature_px=DEFAULT_MIN_FEATURE_PX, dissolve=False, renderer="svg", glow=None):
         self.palette_name = palette_name
         self.use_gradients = use_gradients
         self.frame_color = frame_color
         self.frame_width = frame_width
         self.color_variation_intensity = color_variation
-        self.osm_fetcher = OSMDataFetcher()
+        self.osm_fetcher = osm_fetcher or OSMDataFetcher()
+        # Simplification tolerance in screen pixels at the map zoom (0 disables it)
+        self.simplify_px = simplify_px
+        # Features smaller than this many pixels are merged into aggregates (0 disables it)
+        self.min_feature_px = min_feature_px
+        # Merge touching shapes of the same style into single paths (needs shapely)
+        self.dissolve = dissolve
+        # Leaflet renderer: "svg" (one DOM node per shape) or "canvas"
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer '{renderer}', expected one of: {', '.join(RENDERERS)}")
+        self.renderer = renderer
+        # Neon glow around every shape: None follows the palette, False turns
+        # it off (the canvas shadow blurs each shape as it is painted)
+        self.glow = glow
         # Seed for reproducible generative art
-        import random
-        if seed is not None:
-            random.seed(seed)
-            self.seed = seed
-        else:
-            self.seed = random.randint(0, 999999)
-            random.seed(self.seed)
+        if seed is None:
+            seed = random.randint(0, 999999)
+        self.seed = seed
+        # Own random stream: maps generated concurrently in one process (web
+        # requests) must not draw from each other's sequence
+        self.random = random.Random(seed)
         
         # Generative parameters influenced by seed
-        self.noise_factor = random.uniform(0.3, 0.8)
-        self.color_variance = random.uniform(0.2, 0.6)
-        self.density_threshold = random.uniform(0.001, 0.005)
-        self.style_variation = random.choice(['organic', 'geometric', 'flow', 'structured'])
+        self.noise_factor = self.random.uniform(0.3, 0.8)
+        self.color_variance = self.random.uniform(0.2, 0.6)
+        self.density_threshold = self.random.uniform(0.001, 0.005) * SQUARE_DEGREE_M2  # m²
+        self.style_variation = self.random.choice(['organic', 'geometric', 'flow', 'structured'])
         
         print(f"Generative seed: {self.seed}, Style: {self.style_variation}")
     
-    def create_map(self, lat, lon, radius_km, zoom_start=None):
+    def create_map(self, lat, lon, radius_km, zoom_start=None, renderer=None):
         """
         Create a base map centered on specified coordinates with advanced styling
+
+        With the canvas renderer (renderer argument or the generator's
+        default) all shapes are painted into one <canvas> instead of one
+        SVG path each, which is much cheaper for maps with many shapes.
         """
         # Calculate appropriate zoom based on radius
         if zoom_start is None:
-            # Very high zoom levels to minimize white space and fill the frame
-            if radius_km <= 0.3:
-                zoom_start = 19
-            elif radius_km <= 0.5:
-                zoom_start = 18
-            elif radius_km <= 1:
-                zoom_start = 17
-            elif radius_km <= 2:
-                zoom_start = 16
-            elif radius_km <= 5:
-                zoom_start = 15
-            else:
-                zoom_start = 14
+            zoom_start = self.get_zoom(radius_km)
+        renderer = renderer or self.renderer
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer '{renderer}', expected one of: {', '.join(RENDERERS)}")
         
         # Create base map with custom styling
         m = folium.Map(
@@ -62,7 +107,8 @@ class MapGenerator:
             zoom_start=zoom_start,
             tiles=None,
             zoom_control=False,
-            attributionControl=False
+            attributionControl=False,
+            prefer_canvas=renderer == 'canvas'
         )
         
         # Base limpia sin tiles de fondo para mejor control visual
@@ -89,6 +135,8 @@ class MapGenerator:
         # Add custom CSS for advanced effects
         css_style = self._get_custom_css()
         m.get_root().html.add_child(folium.Element(css_style))
+        if renderer == 'canvas' and self._has_neon_glow():
+            m.get_root().html.add_child(folium.Element(CANVAS_GLOW_SCRIPT))
         
         # Add circular frame only if frame_width > 0
         if self.frame_width > 0:
@@ -97,41 +145,113 @@ class MapGenerator:
         
         return m
     
-    def add_elements_to_map(self, map_obj, osm_data):
+    def get_zoom(self, radius_km):
         """
-        Add OSM elements to map with custom colors
+        Zoom level create_map uses for a radius
         """
-        # Add landuse and natural first (background)
-        self._add_polygons(map_obj, osm_data['landuse'], 'landuse')
-        self._add_polygons(map_obj, osm_data['natural'], 'natural')
-        
-        # Add buildings
-        self._add_buildings(map_obj, osm_data['buildings'])
+        # Very high zoom levels to minimize white space and fill the frame
+        if radius_km <= 0.3:
+            return 19
+        elif radius_km <= 0.5:
+            return 18
+        elif radius_km <= 1:
+            return 17
+        elif radius_km <= 2:
+            return 16
+        elif radius_km <= 5:
+            return 15
+        else:
+            return 14
+    
+    def get_render_plan(self):
+        """
+        Feature classes drawn by add_elements_to_map, mapped to the drawn
+        subtypes (None for all), so the fetcher only downloads what is used
+        """
+        return {
+            'landuse': None,
+            'natural': None,
+            'building': None
+            # Linear elements (highway, railway) are not drawn
+        }
+    
+    def add_elements_to_map(self, map_obj, osm_data, zoom=None):
+        """
+        Add OSM elements to map with custom colors and return the scene
+        drawn, with the coordinates written to the HTML (see build_scene
+        and quantize_scene)
+        """
+        # Accept both the fetcher's dict of lists and a columnar FeatureCollection
+        if not isinstance(osm_data, FeatureCollection):
+            osm_data = FeatureCollection.from_processed_data(osm_data)
+        render_plan = self.get_render_plan()
+        scene = self.quantize_scene(self.build_scene(osm_data, zoom), zoom)
+        for shapes in scene:
+            self._add_shapes(map_obj, shapes)
         
         # Skip linear elements - only polygonal elements
-        # self._add_highways(map_obj, osm_data['highways'])
-        # self._add_railways(map_obj, osm_data['railways'])
+        if 'highway' in render_plan:
+            self._add_highways(map_obj, osm_data['highways'])
+        if 'railway' in render_plan:
+            self._add_railways(map_obj, osm_data['railways'])
+        
+        return scene
     
-    def _add_polygons(self, map_obj, elements, element_type):
+    def build_scene(self, osm_data, zoom=None):
         """
-        Add polygons (areas) to map with depth effects
+        Resolve the styles of all polygons into a scene: one list of shapes
+        per layer in drawing order, each shape a dict with 'rings' ([lat, lon]
+        lists, outline first), 'color' and 'popup'
+
+        Styles are resolved before anything is drawn, so with dissolve
+        enabled touching shapes of the same style can be merged in between
+        (zoom is the zoom the map is displayed at).
         """
-        import random
-        
-        for element in elements:
-            if len(element['coordinates']) < 3:
+        if not isinstance(osm_data, FeatureCollection):
+            osm_data = FeatureCollection.from_processed_data(osm_data)
+        render_plan = self.get_render_plan()
+        
+        # Landuse and natural first (background), then buildings
+        scene = []
+        if 'landuse' in render_plan:
+            scene.append(self._resolve_polygons(osm_data['landuse'], 'landuse'))
+        if 'natural' in render_plan:
+            scene.append(self._resolve_polygons(osm_data['natural'], 'natural'))
+        if 'building' in render_plan:
+            scene.append(self._resolve_buildings(osm_data['buildings']))
+        
+        # Layers are dissolved separately so their drawing order is kept
+        if self.dissolve and zoom is not None:
+            shape_count = sum(len(shapes) for shapes in scene)
+            scene = [dissolve_shapes(shapes, zoom) for shapes in scene]
+            print(f"Dissolved touching shapes: {shape_count} -> {sum(len(shapes) for shapes in scene)}")
+        
+        return scene
+    
+    def _resolve_polygons(self, layer, element_type):
+        """
+        Resolve the styles of polygons (areas) with depth effects into
+        shapes for _add_shapes
+        """
+        shapes = []
+        # Vertex counts and areas (m²) are computed for the whole layer at once
+        outline_lengths = layer.outline_lengths()
+        areas = layer.outline_areas_m2()
+        spatial_variation = self._spatial_variation(layer)
+        
+        for index, (rings, subtype) in enumerate(layer.iter_features()):
+            if outline_lengths[index] < 3:
                 continue
             
-            subtype = element.get('subtype', 'unknown')
             color = get_color_for_element(self.palette_name, element_type, subtype)
-            coords = element['coordinates']
+            coords = rings[0]
             
             # Use gradient only if enabled
             if self.use_gradients:
                 gradient = get_gradient_for_element(self.palette_name, element_type, subtype)
             else:
                 gradient = color
-            area = self._calculate_polygon_area(coords)
+            area = areas[index]
             
             # Generative prominence based on seed and style
             base_threshold = self.density_threshold
@@ -143,11 +263,11 @@ class MapGenerator:
             }[self.style_variation]
             
             # Add some randomness for generative variety
-            random_factor = random.uniform(0.5, 1.5)
+            random_factor = self.random.uniform(0.5, 1.5)
             is_prominent = (
                 area > (base_threshold * style_modifier * random_factor) or
                 subtype in ['forest', 'park', 'nature_reserve', 'water', 'lake'] or
-                (self.style_variation == 'organic' and random.random() < 0.3)
+                (self.style_variation == 'organic' and self.random.random() < 0.3)
             )
             
             if is_prominent and element_type in ['landuse', 'natural']:
@@ -166,28 +286,23 @@ class MapGenerator:
                 # Add gradient background using CSS
                 style_dict['fillColor'] = gradient
                 
-                folium.Polygon(
-                    locations=coords,
-                    popup=f"{element_type.title()}: {subtype.replace('_', ' ').title()}",
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    fillOpacity=1.0,
-                    weight=0,
-                    opacity=0
-                ).add_to(map_obj)
+                shapes.append({
+                    'rings': rings,
+                    'popup': f"{element_type.title()}: {subtype.replace('_', ' ').title()}",
+                    'color': color
+                })
             else:
                 # Generative color variation based on position and style
-                pos_hash = hash(str(coords[0])) % 1000 / 1000.0
+                pos_hash = self._position_hash(coords[0])
                 variation = 0.8 + (self.color_variance * pos_hash)
                 
                 if self.style_variation == 'organic':
-                    variation *= random.uniform(0.6, 1.4)
+                    variation *= self.random.uniform(0.6, 1.4)
                 elif self.style_variation == 'geometric':
                     variation = 0.9 + (0.2 * (pos_hash > 0.5))
                 
                 # Apply spatial color variation for adjacent elements
-                spatial_hash = hash(f"{coords[0][0]:.4f}{coords[0][1]:.4f}") % 1000 / 1000.0
+                spatial_hash = spatial_variation[index]
                 variation_factor = 1.0 + (spatial_hash - 0.5) * self.color_variation_intensity * 2.0
                 varied_color = self._vary_color(color, variation_factor)
                 
@@ -208,28 +323,88 @@ class MapGenerator:
                 # Force solid fill for all polygons
                 final_fill_opacity = 0.9
                 
-                folium.Polygon(
-                    locations=coords,
-                    popup=f"{element_type}: {subtype}",
-                    color=varied_color,
-                    fill=True,
-                    fillColor=varied_color,
-                    fillOpacity=1.0,
-                    weight=0,
-                    opacity=0
-                ).add_to(map_obj)
+                shapes.append({
+                    'rings': rings,
+                    'popup': f"{element_type}: {subtype}",
+                    'color': varied_color
+                })
+        
+        return shapes
+    
+    def _spatial_variation(self, layer):
+        """
+        Color variation value in [0, 1) of every feature of a layer
+
+        Touching features get different classes from a greedy coloring of
+        the layer's adjacency graph. Class values step by the golden ratio,
+        so the most common classes (0 and 1) are far apart, and the seed
+        rotates them so every artwork shades blocks differently. With
+        dissolve enabled all features share one value.
+        """
+        offset = random.Random(self.seed).random()
+        if self.dissolve:
+            # Touching features are merged anyway, so they must not be told apart
+            return [offset] * len(layer)
+        a, b = GridIndex.for_layer(layer).neighbor_pairs(ADJACENCY_TOLERANCE)
+        a, b = touching_pairs(layer, a, b, ADJACENCY_TOLERANCE)
+        classes = greedy_coloring(len(layer), a, b)
+        return ((classes * GOLDEN_RATIO_CONJUGATE + offset) % 1.0).tolist()
+    
+    def quantize_scene(self, scene, zoom):
+        """
+        Round the coordinates of a scene to the precision of a fraction of
+        a pixel at zoom; shapes that collapse under the rounding are dropped
+        (without a zoom the scene is returned unchanged)
+        """
+        if zoom is None:
+            return scene
+        decimals = coordinate_decimals(zoom)
+        quantized_scene = []
+        for shapes in scene:
+            quantized = []
+            for shape in shapes:
+                rings = self._quantize_rings(shape['rings'], decimals)
+                if rings:
+                    quantized.append(dict(shape, rings=rings))
+            quantized_scene.append(quantized)
+        return quantized_scene
     
-    def _add_buildings(self, map_obj, buildings):
+    def _quantize_rings(self, rings, decimals):
         """
-        Add buildings to map with simulated extrusion effects
+        Round ring coordinates and drop the consecutive duplicates this
+        creates; holes that collapse are dropped, an empty list is returned
+        when the outline collapses
         """
-        import random
+        quantized = []
+        for ring in rings:
+            points = []
+            for lat, lon in ring:
+                point = [round(lat, decimals), round(lon, decimals)]
+                if not points or point != points[-1]:
+                    points.append(point)
+            # A ring needs 3 distinct vertices (4 when it repeats the first one)
+            closed = len(points) > 1 and points[0] == points[-1]
+            if len(points) - closed < 3:
+                if not quantized:
+                    return []
+                continue
+            quantized.append(points)
+        return quantized
+    
+    def _resolve_buildings(self, buildings):
+        """
+        Resolve the styles of buildings with simulated extrusion effects
+        into shapes for _add_shapes
+        """
+        shapes = []
+        outline_lengths = buildings.outline_lengths()
+        areas = buildings.outline_areas_m2()
+        spatial_variation = self._spatial_variation(buildings)
         
-        for building in buildings:
-            if len(building['coordinates']) < 3:
+        for index, (rings, building_type) in enumerate(buildings.iter_features()):
+            if outline_lengths[index] < 3:
                 continue
             
-            building_type = building.get('subtype', 'yes')
             color = get_color_for_element(self.palette_name, 'building', building_type)
             
             # Use gradient only if enabled
@@ -238,16 +413,16 @@ class MapGenerator:
             else:
                 gradient = color
             
-            # Calculate approximate building area to determine importance
-            coords = building['coordinates']
-            area = self._calculate_polygon_area(coords)
+            # Approximate building area to determine importance
+            coords = rings[0]
+            area = areas[index]
             
             # Generative building prominence
-            pos_hash = hash(str(coords[0])) % 1000 / 1000.0
-            random_prominence = random.random() < (self.noise_factor * 0.3)
+            pos_hash = self._position_hash(coords[0])
+            random_prominence = self.random.random() < (self.noise_factor * 0.3)
             
             is_prominent = (
-                area > (0.0005 * random.uniform(0.5, 2.0)) or
+                area > (PROMINENT_BUILDING_AREA * self.random.uniform(0.5, 2.0)) or
                 building_type in ['cathedral', 'hospital', 'university', 'government'] or
                 (self.style_variation in ['organic', 'flow'] and random_prominence)
             )
@@ -262,19 +437,14 @@ class MapGenerator:
                     'opacity': 0.8
                 }
                 
-                folium.Polygon(
-                    locations=coords,
-                    popup=f"{building_type.replace('_', ' ').title()}",
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    fillOpacity=1.0,
-                    weight=0,
-                    opacity=0
-                ).add_to(map_obj)
+                shapes.append({
+                    'rings': rings,
+                    'popup': f"{building_type.replace('_', ' ').title()}",
+                    'color': color
+                })
             else:
                 # Generative building clustering and variation
-                pos_hash = hash(str(coords[0])) % 1000 / 1000.0
+                pos_hash = self._position_hash(coords[0])
                 cluster_factor = 1.0 + (pos_hash * self.color_variance)
                 
                 if self.style_variation == 'organic':
@@ -284,10 +454,10 @@ class MapGenerator:
                 elif self.style_variation == 'flow':
                     variation = 0.7 + (0.6 * abs(pos_hash - 0.5))
                 else:  # structured
-                    variation = 0.9 + (0.2 * random.random())
+                    variation = 0.9 + (0.2 * self.random.random())
                 
                 # Apply spatial color variation for adjacent buildings
-                spatial_hash = hash(f"{coords[0][0]:.4f}{coords[0][1]:.4f}") % 1000 / 1000.0
+                spatial_hash = spatial_variation[index]
                 variation_factor = 1.0 + (spatial_hash - 0.5) * self.color_variation_intensity * 2.0
                 varied_color = self._vary_color(color, variation_factor * cluster_factor)
                 
@@ -308,16 +478,21 @@ class MapGenerator:
                 # Force solid fill for all buildings
                 final_fill_opacity = 0.9
                 
-                folium.Polygon(
-                    locations=coords,
-                    popup=f"Building: {building_type}",
-                    color=varied_color,
-                    fill=True,
-                    fillColor=varied_color,
-                    fillOpacity=1.0,
-                    weight=0,
-                    opacity=0
-                ).add_to(map_obj)
+                shapes.append({
+                    'rings': rings,
+                    'popup': f"Building: {building_type}",
+                    'color': varied_color
+                })
+        
+        return shapes
+    
+    def _add_shapes(self, map_obj, shapes):
+        """
+        Draw resolved shapes as a single GeoJSON layer; the outline is the
+        first ring, the others are holes
+        """
+        if shapes:
+            StyledGeoJson(shapes).add_to(map_obj)
     
     def _add_highways(self, map_obj, highways):
         """
@@ -361,11 +536,11 @@ class MapGenerator:
             'path': 0.4
         }
         
-        for highway in highways:
-            if len(highway['coordinates']) < 2:
+        for rings, highway_type in highways.iter_features():
+            coords = rings[0]
+            if len(coords) < 2:
                 continue
                 
-            highway_type = highway.get('subtype', 'residential')
             color = get_color_for_element(self.palette_name, 'highway', highway_type)
             
             # Use gradient only if enabled
@@ -378,12 +553,12 @@ class MapGenerator:
             if self.style_variation == 'organic':
                 # More organic, include some secondary roads randomly
                 if highway_type not in ['motorway', 'trunk', 'primary', 'secondary'] or \
-                   (highway_type == 'secondary' and random.random() > 0.6):
+                   (highway_type == 'secondary' and self.random.random() > 0.6):
                     continue
             elif self.style_variation == 'flow':
                 # Flowing style, include residential sometimes
                 if highway_type not in ['motorway', 'trunk', 'primary'] and \
-                   not (highway_type == 'residential' and random.random() < 0.2):
+                   not (highway_type == 'residential' and self.random.random() < 0.2):
                     continue
             else:
                 # Geometric/structured: only major roads
@@ -395,11 +570,11 @@ class MapGenerator:
             opacity = opacity_map.get(highway_type, 0.7)
             
             # Generative road effects based on style
-            if self.style_variation == 'organic' and random.random() < 0.4:
+            if self.style_variation == 'organic' and self.random.random() < 0.4:
                 # Organic glow effect
                 glow_color = self._vary_color(color, 0.7)
                 folium.PolyLine(
-                    locations=highway['coordinates'],
+                    locations=coords,
                     color=glow_color,
                     weight=width + 1,
                     opacity=0.2
@@ -407,7 +582,7 @@ class MapGenerator:
             elif highway_type in ['motorway', 'trunk'] and width > 3:
                 shadow_color = '#333333' if self.palette_name not in ['dark_mode'] else '#666666'
                 folium.PolyLine(
-                    locations=highway['coordinates'],
+                    locations=coords,
                     color=shadow_color,
                     weight=width + 0.5,
                     opacity=0.3
@@ -420,13 +595,13 @@ class MapGenerator:
             
             if self.style_variation == 'flow':
                 # Flowing style with varied widths
-                flow_factor = random.uniform(0.7, 1.3)
+                flow_factor = self.random.uniform(0.7, 1.3)
                 final_width *= flow_factor
                 final_color = self._vary_color(color, flow_factor)
             elif self.style_variation == 'organic':
                 # Organic variation
-                final_opacity *= random.uniform(0.6, 1.0)
-                final_color = self._vary_color(color, random.uniform(0.8, 1.2))
+                final_opacity *= self.random.uniform(0.6, 1.0)
+                final_color = self._vary_color(color, self.random.uniform(0.8, 1.2))
             
             # Use gradient styling for roads if enabled
             if self.use_gradients and 'linear-gradient' in final_color:
@@ -439,13 +614,13 @@ class MapGenerator:
                 }
                 
                 folium.PolyLine(
-                    locations=highway['coordinates'],
+                    locations=coords,
                     popup=f"{highway_type.replace('_', ' ').title()}",
                     style_function=lambda x, style=road_style: style
                 ).add_to(map_obj)
             else:
                 folium.PolyLine(
-                    locations=highway['coordinates'],
+                    locations=coords,
                     popup=f"{highway_type.replace('_', ' ').title()}",
                     color=final_color,
                     weight=final_width,
@@ -463,16 +638,16 @@ class MapGenerator:
             'tram': {'weight': 2, 'dash': '4, 4', 'opacity': 0.8}
         }
         
-        for railway in railways:
-            if len(railway['coordinates']) < 2:
+        for rings, railway_type in railways.iter_features():
+            coords = rings[0]
+            if len(coords) < 2:
                 continue
             
-            railway_type = railway.get('subtype', 'rail')
             color = get_color_for_element(self.palette_name, 'railway', railway_type)
             style = railway_styles.get(railway_type, railway_styles['rail'])
             
             folium.PolyLine(
-                locations=railway['coordinates'],
+                locations=coords,
                 popup=f"{railway_type.replace('_', ' ').title()}",
                 color=color,
                 weight=style['weight'],
@@ -480,9 +655,72 @@ class MapGenerator:
                 dashArray=style['dash']
             ).add_to(map_obj)
     
-    def generate_custom_map(self, location, radius_km, output_file="map.html"):
+    def generate_custom_map(self, location, radius_km, output_file="map.html", image_file=None, image_size=1200, scene_file=None):
         """
         Generate a complete map with OSM data and custom colors
+
+        With image_file, the same scene is also rendered to an image of
+        image_size pixels without a browser (see render_image). With
+        scene_file, the scene drawn in the HTML is saved so images can be
+        rendered from it later (see raster_renderer.render_scene_file).
+        """
+        lat, lon, features, zoom = self.prepare_features(location, radius_km)
+        
+        # Create base map
+        map_obj = self.create_map(lat, lon, radius_km, zoom_start=zoom)
+        
+        # Add elements to map
+        print("Adding elements to map...")
+        scene = self.add_elements_to_map(map_obj, features, zoom=zoom)
+        
+        # Save map
+        map_obj.save(output_file)
+        print(f"Map saved as: {output_file}")
+        
+        if scene_file:
+            save_scene(
+                scene_file, scene, lat, lon, zoom,
+                background=self._get_background_color(),
+                frame_width=self.frame_width,
+                frame_color=self.frame_color
+            )
+            print(f"Scene saved as: {scene_file}")
+        
+        if image_file:
+            self.render_image(scene, lat, lon, zoom, image_file, image_size, image_size)
+        
+        return map_obj
+    
+    def export_image(self, location, radius_km, image_file, width=1200, height=1200, quality=0.9):
+        """
+        Render a map straight to a PNG, JPEG or WEBP image without HTML or a browser
+        """
+        lat, lon, features, zoom = self.prepare_features(location, radius_km)
+        scene = self.quantize_scene(self.build_scene(features, zoom), zoom)
+        self.render_image(scene, lat, lon, zoom, image_file, width, height, quality=quality)
+    
+    def render_image(self, scene, lat, lon, zoom, image_file, width, height, quality=0.9):
+        """
+        Draw a scene into an image as the browser would show the HTML map
+        in a viewport of width x height pixels
+
+        The faint base tiles of the HTML map are not drawn.
+        """
+        renderer = RasterRenderer(
+            width,
+            height,
+            background=self._get_background_color(),
+            frame_width=self.frame_width,
+            frame_color=self.frame_color
+        )
+        renderer.save(renderer.render(scene, lat, lon, zoom), image_file, quality=quality)
+        print(f"Image saved as: {image_file}")
+    
+    def prepare_features(self, location, radius_km):
+        """
+        Fetch, clip, cull and simplify the features of a map
+
+        Returns (lat, lon, features, zoom).
         """
         # Get coordinates if an address is provided
         if isinstance(location, str):
@@ -496,27 +734,50 @@ class MapGenerator:
         
         # Obtener datos de OSM
         print("Fetching OpenStreetMap data...")
-        osm_data = self.osm_fetcher.fetch_osm_data(lat, lon, radius_km)
-        
-        # Create base map
-        map_obj = self.create_map(lat, lon, radius_km)
-        
-        # Add elements to map
-        print("Adding elements to map...")
-        self.add_elements_to_map(map_obj, osm_data)
-        
-        # Save map
-        map_obj.save(output_file)
-        print(f"Map saved as: {output_file}")
+        # With a circular frame everything outside the radius disk is hidden
+        circular = self.frame_width > 0
+        osm_data = self.osm_fetcher.fetch_osm_data(
+            lat, lon, radius_km, render_plan=self.get_render_plan(), circular=circular
+        )
+        features = FeatureCollection.from_processed_data(osm_data)
         
-        return map_obj
+        # Cut geometry to the requested area so hidden polygons are not written to the HTML
+        if circular:
+            features = clip_to_circle(features, lat, lon, radius_km)
+        else:
+            features = clip_to_bbox(features, self.osm_fetcher.calculate_bbox(lat, lon, radius_km))
+        
+        zoom = self.get_zoom(radius_km)
+        # Shapes smaller than a pixel are merged instead of drawn one by one
+        if self.min_feature_px > 0:
+            features, culled_count, aggregate_count = cull_collection(features, zoom, self.min_feature_px)
+            if culled_count:
+                print(f"Merged {culled_count} sub-pixel features into {aggregate_count} aggregates")
+        
+        # Drop vertices closer than a fraction of a pixel at the displayed zoom
+        if self.simplify_px > 0:
+            vertex_count = sum(len(layer.coords) for layer in features.layers.values())
+            features = simplify_collection(features, zoom, self.simplify_px)
+            simplified_count = sum(len(layer.coords) for layer in features.layers.values())
+            print(f"Simplified geometry: {vertex_count} -> {simplified_count} vertices")
+        
+        return lat, lon, features, zoom
+    
+    def _has_neon_glow(self):
+        """
+        Whether shapes are drawn with a glow in their own color
+        """
+        if self.glow is not None:
+            return self.glow
+        return self.palette_name in ['neon_city', 'cyberpunk']
     
     def _get_custom_css(self):
         """
         Generate custom CSS for advanced visual effects
         """
         neon_glow = ""
-        if self.palette_name in ['neon_city', 'cyberpunk']:
+        if self._has_neon_glow():
+            # SVG paths glow in their own color; canvas shapes get CANVAS_GLOW_SCRIPT
             neon_glow = """
             .leaflet-interactive {
                 filter: drop-shadow(0 0 2px currentColor) drop-shadow(0 0 5px currentColor);
@@ -646,20 +907,12 @@ class MapGenerator:
         encoded = base64.b64encode(svg_icon.encode()).decode()
         return f"data:image/svg+xml;base64,{encoded}"
     
-    def _calculate_polygon_area(self, coordinates):
+    def _position_hash(self, point):
         """
-        Calculate approximate polygon area using polygon area formula
+        Value in [0, 1) derived from a coordinate; unlike hash() it is the
+        same in every process, so a seed always draws the same map
         """
-        if len(coordinates) < 3:
-            return 0
-        
-        area = 0
-        n = len(coordinates)
-        for i in range(n):
-            j = (i + 1) % n
-            area += coordinates[i][0] * coordinates[j][1]
-            area -= coordinates[j][0] * coordinates[i][1]
-        return abs(area) / 2
+        return zlib.crc32(str(point).encode()) % 1000 / 1000.0
     
     def _offset_coordinates(self, coordinates, offset_lat, offset_lon):
         """
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for OpenStreetMap query responses
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Default location, overridable with the GEN_MAPS_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.environ.get(
+    'GEN_MAPS_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache')
+)
+DEFAULT_TTL = 7 * 24 * 3600  # One week
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024  # 512 MB of compressed data
+# Diff refreshes miss geometry-only edits (moved nodes of an unchanged way),
+# so entries are downloaded in full again once their first download is this old
+DEFAULT_MAX_REFRESH_AGE = 30 * 24 * 3600
+
+
+class OSMCache:
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE, max_refresh_age=DEFAULT_MAX_REFRESH_AGE):
+        self.cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_refresh_age = max_refresh_age
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, 'osm_cache.sqlite')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                snapshot TEXT
+            )
+        """)
+        # Caches created before incremental refresh lack the snapshot column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if 'snapshot' not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN snapshot TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_tile_key(quadkey, query_signature):
+        """
+        Build a cache key for one grid tile and one feature class query
+        """
+        return f"tile:{quadkey}|{query_signature}"
+
+    @staticmethod
+    def parse_tile_key(key):
+        """
+        Split a tile key into (quadkey, query_signature), or None for other keys
+        """
+        if not key.startswith("tile:"):
+            return None
+        quadkey, _, query_signature = key[len("tile:"):].partition("|")
+        return quadkey, query_signature
+
+    def get(self, key):
+        """
+        Return cached data for a key, or None if missing or expired
+
+        Expired entries with an OSM snapshot timestamp are kept so they can
+        be refreshed incrementally; others are deleted.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at, snapshot FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or row[1] < now:
+                if row is not None and row[2] is None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._increment('misses')
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._increment('hits')
+            self._conn.commit()
+
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def get_snapshot(self, key):
+        """
+        Return (data, snapshot) for an entry that can be refreshed
+        incrementally, even if expired, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, snapshot FROM entries WHERE key = ? AND snapshot IS NOT NULL AND created_at >= ?",
+                (key, time.time() - self.max_refresh_age)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8')), row[1]
+
+    def put(self, key, data, ttl=None, snapshot=None):
+        """
+        Store data under a key and evict least recently used entries over the size cap
+
+        snapshot is the OSM database timestamp the data reflects, needed to
+        refresh the entry incrementally later.
+        """
+        now = time.time()
+        blob = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        expires_at = now + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, data, size, created_at, accessed_at, expires_at, hits, snapshot) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (key, blob, len(blob), now, now, expires_at, snapshot)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, key, data, snapshot, ttl=None):
+        """
+        Replace an entry's data with a refreshed version, keeping its usage stats
+        """
+        now = time.time()
+        blob = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        expires_at = now + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE entries SET data = ?, size = ?, expires_at = ?, snapshot = ? WHERE key = ?",
+                (blob, len(blob), expires_at, snapshot, key)
+            )
+            if cursor.rowcount == 0:
+                self._conn.execute(
+                    "INSERT INTO entries (key, data, size, created_at, accessed_at, expires_at, hits, snapshot) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                    (key, blob, len(blob), now, now, expires_at, snapshot)
+                )
+            self._increment('refreshes')
+            self._evict()
+            self._conn.commit()
+
+    def list_refreshable(self, accessed_since=0, expires_before=None, limit=None):
+        """
+        Return keys of entries with a snapshot, used since accessed_since and
+        expiring before expires_before (any time if None), most used first
+        """
+        query = "SELECT key FROM entries WHERE snapshot IS NOT NULL AND accessed_at >= ? AND created_at >= ?"
+        params = [accessed_since, time.time() - self.max_refresh_age]
+        if expires_before is not None:
+            query += " AND expires_at < ?"
+            params.append(expires_before)
+        query += " ORDER BY hits DESC, accessed_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params).fetchall()]
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache fits in max_size
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_size:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._increment('evictions', evicted)
+
+    def _increment(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def stats(self):
+        """
+        Return entry count, size and hit/miss counters
+        """
+        now = time.time()
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            expired = self._conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE expires_at < ?", (now,)
+            ).fetchone()[0]
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'expired': expired,
+            'size_bytes': size,
+            'max_size_bytes': self.max_size,
+            'hits': hits,
+            'misses': misses,
+            'evictions': counters.get('evictions', 0),
+            'refreshes': counters.get('refreshes', 0),
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+    def list_entries(self):
+        """
+        Return metadata for every cached entry, most recently used first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size, created_at, accessed_at, expires_at, hits "
+                "FROM entries ORDER BY accessed_at DESC"
+            ).fetchall()
+
+        return [
+            {
+                'key': key,
+                'size_bytes': size,
+                'created_at': created_at,
+                'accessed_at': accessed_at,
+                'expires_at': expires_at,
+                'hits': hits
+            }
+            for key, size, created_at, accessed_at, expires_at, hits in rows
+        ]
+
+    def purge(self, expired_only=False):
+        """
+        Remove entries (only expired ones if requested) and return how many were removed
+        """
+        with self._lock:
+            if expired_only:
+                cursor = self._conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+            else:
+                cursor = self._conn.execute("DELETE FROM entries")
+                self._conn.execute("DELETE FROM counters")
+            self._conn.commit()
+            removed = cursor.rowcount
+            if not expired_only:
+                self._conn.execute("VACUUM")
+
+        return removed
+
+
+def _format_size(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} GB"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect, refresh and purge the OpenStreetMap response cache",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Usage examples:
+  python osm_cache.py stats
+  python osm_cache.py list
+  python osm_cache.py purge --expired
+  python osm_cache.py refresh --all
+        """
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=None,
+        help=f'Cache directory (default: {os.path.normpath(DEFAULT_CACHE_DIR)})'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Show cache size and hit/miss counters')
+    subparsers.add_parser('list', help='List cached entries')
+    purge_parser = subparsers.add_parser('purge', help='Remove cached entries')
+    purge_parser.add_argument(
+        '--expired',
+        action='store_true',
+        help='Only remove expired entries'
+    )
+    refresh_parser = subparsers.add_parser('refresh', help='Update cached tiles with changes from Overpass')
+    refresh_parser.add_argument(
+        '--all',
+        action='store_true',
+        help='Refresh every tile, not only recently used ones close to expiry'
+    )
+
+    args = parser.parse_args()
+    cache = OSMCache(cache_dir=args.cache_dir)
+
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"Cache directory: {cache.cache_dir}")
+        print(f"Entries:   {stats['entries']} ({stats['expired']} expired)")
+        print(f"Size:      {_format_size(stats['size_bytes'])} / {_format_size(stats['max_size_bytes'])}")
+        print(f"Hits:      {stats['hits']}")
+        print(f"Misses:    {stats['misses']}")
+        print(f"Evictions: {stats['evictions']}")
+        print(f"Refreshes: {stats['refreshes']}")
+        print(f"Hit rate:  {stats['hit_rate']:.1%}")
+    elif args.command == 'list':
+        now = time.time()
+        for entry in cache.list_entries():
+            state = "expired" if entry['expires_at'] < now else f"ttl {int(entry['expires_at'] - now)}s"
+            print(f"{entry['key']}  {_format_size(entry['size_bytes'])}  hits={entry['hits']}  {state}")
+    elif args.command == 'purge':
+        removed = cache.purge(expired_only=args.expired)
+        print(f"Removed {removed} cached entries")
+    elif args.command == 'refresh':
+        # Imported here because osm_data itself depends on this module
+        from osm_data import OSMDataFetcher
+        from cache_refresher import CacheRefresher
+        refresher = CacheRefresher(OSMDataFetcher(cache=cache))
+        refreshed, changed = refresher.run_once(refresh_all=args.all)
+        print(f"Refreshed {refreshed} cached tile layers ({changed} changed elements)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,29 +2,106 @@
 Module for fetching OpenStreetMap data
 """
 
-import overpy
-import requests
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import math
+import requests
+import urllib3
+from osm_cache import OSMCache
+from color_palettes import get_styled_tag_keys
+from geocoding import Geocoder
+from overpass_scheduler import OverpassScheduler, OverpassError, OverpassRuntimeError
+from single_flight import SingleFlight
+from tiles import TILE_ZOOM, lat_lon_to_tile, tile_to_quadkey, tiles_for_bbox, tile_runs_to_bboxes, tile_intersects_circle
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Failures of an Overpass endpoint or of reading its streamed response: an
+# unreachable host, a connection cut mid-body, malformed JSON. Anything else
+# is a bug in processing and must not be reported as an Overpass failure
+RESPONSE_ERRORS = (OverpassError, requests.RequestException, urllib3.exceptions.HTTPError)
+if ijson is not None:
+    RESPONSE_ERRORS += (ijson.JSONError,)
+
+# Overpass endpoints tried in order; GEN_MAPS_OVERPASS_URLS (comma separated)
+# overrides them, e.g. to put a local mirror first
+DEFAULT_OVERPASS_URLS = [
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter"
+]
+
+# OSM element types fetched for each feature class (the class is also the tag key)
+FEATURE_QUERIES = {
+    'highway': ['way'],
+    'landuse': ['way', 'relation'],
+    'natural': ['way', 'relation'],
+    'building': ['way'],
+    'railway': ['way']
+}
+
+# processed_data layer holding each feature class
+CLASS_LAYERS = {
+    'highway': 'highways',
+    'landuse': 'landuse',
+    'natural': 'natural',
+    'building': 'buildings',
+    'railway': 'railways'
+}
+
+# Characters with a special meaning in POSIX extended regexes
+ERE_METACHARACTERS = frozenset('.[]()*+?{}|^$\\')
+
+# Tags kept on processed elements: the keys palettes style, everything else
+# is dropped while parsing so features stay small in memory and in the cache
+RENDER_TAGS = frozenset(get_styled_tag_keys())
+
+# Every fetcher in the process shares one scheduler, so per-endpoint slot
+# limits hold across concurrent map requests
+_overpass_scheduler = OverpassScheduler()
+
+# Bytes read ahead from a response to find its osm3s timestamp
+SNAPSHOT_HEAD_SIZE = 1024
+# Bytes kept from the end of a response to find its remark, which Overpass
+# writes after the elements (e.g. "runtime error: Query timed out ...")
+REMARK_TAIL_SIZE = 4096
+# A top-level "remark" is the last key before the document's closing brace
+REMARK_PATTERN = re.compile(rb',\s*"remark"\s*:\s*("(?:[^"\\]|\\.)*")\s*\}\s*$')
+
+# Identical queries already running in another thread (e.g. the same area
+# requested twice at once) are joined instead of being sent again
+_inflight_queries = SingleFlight()
+# Tiles (per feature class) being downloaded or refreshed by another thread
+# are waited for instead of being requested again, even when the overlapping
+# requests cover different areas and so build different queries
+_inflight_tiles = SingleFlight()
 
 class OSMDataFetcher:
-    def __init__(self):
-        self.api = overpy.Overpass()
-        self.geolocator = Nominatim(user_agent="map_generator")
+    def __init__(self, cache=None, use_cache=True, overpass_urls=None, backend=None, scheduler=None):
+        if overpass_urls is None:
+            env_urls = os.environ.get('GEN_MAPS_OVERPASS_URLS', '')
+            overpass_urls = [url.strip() for url in env_urls.split(',') if url.strip()] or DEFAULT_OVERPASS_URLS
+        self.overpass_urls = list(overpass_urls)
+        self.scheduler = scheduler or _overpass_scheduler
+        # Optional local backend (e.g. LocalOSMStore) answering bbox queries instead of Overpass
+        self.backend = backend
+        self.geocoder = Geocoder(use_cache=use_cache)
+        # Persistent response cache so repeated renders skip the network
+        if cache is None and use_cache and backend is None:
+            cache = OSMCache()
+        self.cache = cache
     
     def get_coordinates_from_address(self, address):
         """
         Convert an address to GPS coordinates
         """
-        try:
-            location = self.geolocator.geocode(address)
-            if location:
-                return location.latitude, location.longitude
-            else:
-                raise ValueError(f"Could not find address: {address}")
-        except Exception as e:
-            raise ValueError(f"Error searching for address: {str(e)}")
+        return self.geocoder.geocode(address)
     
     def calculate_bbox(self, lat, lon, radius_km):
         """
@@ -43,37 +120,372 @@ class OSMDataFetcher:
         
         return south, west, north, east
     
-    def fetch_osm_data(self, lat, lon, radius_km):
+    def fetch_osm_data(self, lat, lon, radius_km, render_plan=None, circular=False):
         """
         Fetch OpenStreetMap data for specified location and radius
+        
+        render_plan maps feature classes to the subtypes that will be drawn
+        (None for all subtypes); classes missing from it are not downloaded.
+        With circular=True only data around the radius disk is requested
+        instead of the whole square bbox.
         """
         south, west, north, east = self.calculate_bbox(lat, lon, radius_km)
+        if render_plan is None:
+            render_plan = {feature_class: None for feature_class in FEATURE_QUERIES}
+        
+        if self.backend is not None:
+            # Local stores are already indexed on disk, so no tiling or caching
+            return merge_processed_data([self.backend.fetch(south, west, north, east, render_plan)])
+        
+        if self.cache is None:
+            # Nothing to reuse without a cache, so query the exact area instead of tiles
+            # Coordinates are rounded (~0.1 m) so near-identical requests build the same query
+            if circular:
+                area_filter = f"(around:{radius_km * 1000:.0f},{lat:.6f},{lon:.6f})"
+            else:
+                area_filter = f"({south:.6f},{west:.6f},{north:.6f},{east:.6f})"
+            print("Downloading OpenStreetMap data from Overpass...")
+            return merge_processed_data(self._run_jobs([
+                partial(self._run_query, self._build_query(feature_class, subtypes, [area_filter]))
+                for feature_class, subtypes in render_plan.items()
+            ]))
         
-        # Query to fetch different types of elements
-        query = f"""
+        # Split the area into fixed grid tiles so overlapping requests share data,
+        # and cache each feature class separately so plans can reuse each other
+        tiles = tiles_for_bbox(south, west, north, east, TILE_ZOOM)
+        if circular:
+            # Corner tiles outside the disk are never shown
+            tiles = [tile for tile in tiles if tile_intersects_circle(*tile, lat, lon, radius_km, TILE_ZOOM)]
+        parts = []
+        missing = {}
+        stale = {}
+        for feature_class, subtypes in render_plan.items():
+            signature = query_signature(feature_class, subtypes)
+            for tile in tiles:
+                key = self._tile_cache_key(tile, signature)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    parts.append(self._restore_cached_data(cached))
+                    continue
+                # Expired tiles are patched with what changed since their snapshot
+                snapshot = self.cache.get_snapshot(key)
+                if snapshot is not None:
+                    stale.setdefault(signature, (feature_class, subtypes, []))[2].append((tile,) + snapshot)
+                else:
+                    missing.setdefault(signature, (feature_class, subtypes, []))[2].append(tile)
+        
+        if not missing and not stale:
+            print(f"Using cached OpenStreetMap data ({len(tiles)} tiles)")
+            return merge_processed_data(parts)
+        
+        if missing:
+            missing_count = sum(len(class_tiles) for _, _, class_tiles in missing.values())
+            print(f"Downloading {missing_count} of {len(tiles) * len(render_plan)} tile layers from Overpass...")
+        if stale:
+            stale_count = sum(len(entries) for _, _, entries in stale.values())
+            print(f"Refreshing {stale_count} expired tile layers with changes from Overpass...")
+        
+        jobs = []
+        for signature, (feature_class, subtypes, class_tiles) in missing.items():
+            jobs.append(partial(self._fetch_tiles, feature_class, subtypes, signature, class_tiles))
+        for signature, (feature_class, subtypes, entries) in stale.items():
+            refresh = partial(self._refresh_entries, feature_class, subtypes, signature, entries)
+            jobs.append(lambda refresh=refresh: refresh()[0])
+        
+        parts.extend(self._run_jobs(jobs))
+        return merge_processed_data(parts)
+    
+    def refresh_tiles(self, signature, tiles):
+        """
+        Bring cached tiles of one query signature up to date with Overpass
+        
+        Returns the number of changed elements received.
+        """
+        entries = []
+        for tile in tiles:
+            snapshot = self.cache.get_snapshot(self._tile_cache_key(tile, signature))
+            if snapshot is not None:
+                entries.append((tile,) + snapshot)
+        if not entries:
+            return 0
+        
+        feature_class, subtypes = parse_signature(signature)
+        return self._refresh_entries(feature_class, subtypes, signature, entries)[1]
+    
+    def _fetch_tiles(self, feature_class, subtypes, signature, tiles):
+        """
+        Download tiles of one feature class into the cache and return their data
+        
+        Tiles another thread is already downloading or refreshing are not
+        requested again: this call downloads the rest and then reads the
+        shared ones from the cache once the other thread has stored them.
+        """
+        keys = {self._tile_cache_key(tile, signature): tile for tile in tiles}
+        
+        def fetch(own_keys):
+            own_tiles = [keys[key] for key in own_keys]
+            query = self._build_query(feature_class, subtypes, self._tile_filters(own_tiles))
+            result, snapshot, _ = self._query_endpoints(query)
+            self._store_tiles(signature, own_tiles, result, snapshot)
+            return result
+        
+        fetched, shared_keys = _inflight_tiles.do_batch(list(keys), fetch)
+        parts = [fetched] if fetched is not None else []
+        parts.extend(self._read_shared_tiles(feature_class, subtypes, signature, shared_keys, keys))
+        return merge_processed_data(parts)
+    
+    def _read_shared_tiles(self, feature_class, subtypes, signature, shared_keys, keys):
+        """
+        Read tiles stored by another thread from the cache, downloading the
+        ones that are gone again (e.g. evicted right away)
+        """
+        parts = []
+        lost_tiles = []
+        for key in shared_keys:
+            cached = self.cache.get(key)
+            if cached is not None:
+                parts.append(self._restore_cached_data(cached))
+            else:
+                lost_tiles.append(keys[key])
+        if lost_tiles:
+            parts.append(self._fetch_tiles(feature_class, subtypes, signature, lost_tiles))
+        return parts
+    
+    def _store_tiles(self, signature, tiles, fetched, snapshot):
+        """
+        Cache the part of a fetched result that falls in each tile
+        """
+        for tile, tile_data in self._split_by_tile(fetched, tiles).items():
+            self.cache.put(self._tile_cache_key(tile, signature), tile_data, snapshot=snapshot)
+    
+    def _refresh_entries(self, feature_class, subtypes, signature, entries):
+        """
+        Patch stale (tile, data, snapshot) entries with a diff query
+        
+        Elements changed since the oldest snapshot replace their cached
+        versions by OSM id, and cached elements no longer in the area (deleted
+        or retagged) are dropped. Returns (patched_data, changed_count).
+        
+        Pruning needs the complete id list, so entries are only patched from
+        a fully read response: a truncated one (an error remark or a broken
+        stream) raises first and every entry keeps its data and snapshot.
+        """
+        keys = {self._tile_cache_key(entry[0], signature): entry for entry in entries}
+        
+        def refresh(own_keys):
+            own_entries = [keys[key] for key in own_keys]
+            since = min(snapshot for _, _, snapshot in own_entries)
+            tiles = [tile for tile, _, _ in own_entries]
+            query = self._build_diff_query(feature_class, subtypes, self._tile_filters(tiles), since)
+            # Raises on incomplete responses, before any entry is touched
+            changed, snapshot, present = self._query_endpoints(query, collect_ids=True)
+            changed_ids = {element_key(element)[:2] for elements in changed.values() for element in elements}
+            changed_by_tile = self._split_by_tile(changed, tiles)
+            
+            patched_parts = []
+            for tile, cached, _ in own_entries:
+                patched = {
+                    layer: [
+                        element for element in elements
+                        if element_key(element)[:2] in present and element_key(element)[:2] not in changed_ids
+                    ]
+                    for layer, elements in self._restore_cached_data(cached).items()
+                }
+                for layer, elements in changed_by_tile[tile].items():
+                    patched.setdefault(layer, []).extend(elements)
+                # Without a server timestamp the old one stays, so no change is skipped
+                self.cache.refresh(self._tile_cache_key(tile, signature), patched, snapshot or since)
+                patched_parts.append(patched)
+            return merge_processed_data(patched_parts), len(changed_ids)
+        
+        # Tiles already being refreshed or downloaded by another thread are shared
+        result, shared_keys = _inflight_tiles.do_batch(list(keys), refresh)
+        patched, changed_count = result if result is not None else ({}, 0)
+        tile_keys = {key: entry[0] for key, entry in keys.items()}
+        parts = [patched] + self._read_shared_tiles(feature_class, subtypes, signature, shared_keys, tile_keys)
+        return merge_processed_data(parts), changed_count
+    
+    def _run_jobs(self, jobs):
+        """
+        Run fetch jobs concurrently so a slow feature class (usually buildings)
+        does not hold up the others
+        """
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            try:
+                return list(executor.map(lambda job: job(), jobs))
+            except RESPONSE_ERRORS as e:
+                raise OverpassError(f"Error fetching OSM data: {str(e)}")
+    
+    def _tile_filters(self, tiles):
+        """
+        Bbox area filters covering a set of tiles, one per horizontal run
+        """
+        return [f"({s},{w},{n},{e})" for s, w, n, e in tile_runs_to_bboxes(tiles, TILE_ZOOM)]
+    
+    def _build_query(self, feature_class, subtypes, area_filters):
+        """
+        Build an Overpass query for one feature class over a list of area
+        filters, either bboxes "(s,w,n,e)" or circles "(around:r,lat,lon)"
+        """
+        return f"""
+        [out:json][timeout:60];
+        (
+{self._query_lines(feature_class, subtypes, area_filters)}
+        );
+        out geom qt;
+        """
+    
+    def _build_diff_query(self, feature_class, subtypes, area_filters, since):
+        """
+        Build a query listing the ids of every matching element in the area,
+        followed by the full geometry of those changed after since
+        """
+        changed_lines = "\n".join(
+            f'          {element_type}.current(newer:"{since}");'
+            for element_type in FEATURE_QUERIES[feature_class]
+        )
+        return f"""
         [out:json][timeout:60];
         (
-          way["highway"]({south},{west},{north},{east});
-          way["landuse"]({south},{west},{north},{east});
-          way["natural"]({south},{west},{north},{east});
-          way["building"]({south},{west},{north},{east});
-          way["railway"]({south},{west},{north},{east});
-          relation["landuse"]({south},{west},{north},{east});
-          relation["natural"]({south},{west},{north},{east});
+{self._query_lines(feature_class, subtypes, area_filters)}
+        )->.current;
+        .current out ids qt;
+        (
+{changed_lines}
         );
-        (._;>;);
-        out geom;
+        out geom qt;
         """
+    
+    def _query_lines(self, feature_class, subtypes, area_filters):
+        tag_filter = f'["{feature_class}"]'
+        if subtypes is not None:
+            # Only download the subtypes the renderer will actually draw
+            values = "|".join(overpass_regex_escape(subtype) for subtype in sorted(subtypes))
+            tag_filter = f'["{feature_class}"~"^({values})$"]'
         
-        try:
-            result = self.api.query(query)
-            return self.process_osm_result(result)
-        except Exception as e:
-            raise Exception(f"Error fetching OSM data: {str(e)}")
+        return "\n".join(
+            f"          {element_type}{tag_filter}{area_filter};"
+            for area_filter in area_filters
+            for element_type in FEATURE_QUERIES[feature_class]
+        )
     
-    def process_osm_result(self, result):
+    def _run_query(self, query):
         """
-        Process OSM query result and organize by types
+        Run a query, or wait for the identical one already in flight
+        """
+        def fetch():
+            return self._query_endpoints(query)[0]
+        
+        return _inflight_queries.do(query, fetch)
+    
+    def _query_endpoints(self, query, collect_ids=False):
+        """
+        Run a query against each configured endpoint until one succeeds
+        
+        Returns (processed_data, snapshot, ids): the OSM database timestamp
+        the response reflects and, with collect_ids, the set of (osm_type, id)
+        of every returned element.
+        """
+        errors = []
+        for url in self.overpass_urls:
+            try:
+                # Stream the raw response so the full element list is never held in memory
+                return self.scheduler.execute(
+                    url, query, lambda response: self._process_response(response, collect_ids)
+                )
+            except RESPONSE_ERRORS as e:
+                errors.append(f"{url}: {str(e)}")
+        
+        raise OverpassError("all Overpass endpoints failed (" + "; ".join(errors) + ")")
+    
+    def _process_response(self, response, collect_ids=False):
+        meta = {}
+        elements = self._iter_elements(response, meta)
+        ids = None
+        if collect_ids:
+            ids = set()
+            elements = _record_ids(elements, ids)
+        processed_data = self.process_osm_result(elements)
+        # Overpass reports timeouts and memory exhaustion with HTTP 200 and
+        # whatever elements it had output so far, so they must not be used
+        remark = meta.get('remark')
+        if remark and 'error' in remark.lower():
+            raise OverpassRuntimeError(remark)
+        return processed_data, meta.get('snapshot'), ids
+    
+    def _iter_elements(self, response, meta=None):
+        """
+        Yield Overpass JSON elements one by one with float coordinates
+        
+        The response's osm3s.timestamp_osm_base is stored as meta['snapshot']
+        and, once every element has been read, its top-level remark as
+        meta['remark'].
+        """
+        if meta is None:
+            meta = {}
+        
+        if ijson is None:
+            # Without ijson the body has to be decoded in one go
+            data = response.json()
+            meta['snapshot'] = data.get('osm3s', {}).get('timestamp_osm_base')
+            yield from data.get('elements', [])
+            meta['remark'] = data.get('remark')
+            return
+        
+        response.raw.decode_content = True
+        # The timestamp comes before the elements, in the first bytes of the body
+        head = response.raw.read(SNAPSHOT_HEAD_SIZE)
+        match = re.search(rb'"timestamp_osm_base"\s*:\s*"([^"]+)"', head)
+        meta['snapshot'] = match.group(1).decode('ascii') if match else None
+        stream = _PrefixedStream(head, response.raw, tail_size=REMARK_TAIL_SIZE)
+        yield from ijson.items(stream, 'elements.item', use_float=True)
+        # ijson has now parsed the whole document, so its end is valid JSON
+        match = REMARK_PATTERN.search(stream.tail)
+        meta['remark'] = json.loads(match.group(1)) if match else None
+    
+    def _tile_cache_key(self, tile, signature):
+        x, y = tile
+        return self.cache.make_tile_key(tile_to_quadkey(x, y, TILE_ZOOM), signature)
+    
+    def _split_by_tile(self, processed_data, tiles):
+        """
+        Distribute fetched elements to every requested tile their bounds touch
+        """
+        tile_set = set(tiles)
+        tile_data = {
+            tile: {layer: [] for layer in processed_data}
+            for tile in tiles
+        }
+        
+        for layer, elements in processed_data.items():
+            for element in elements:
+                if not element['coordinates']:
+                    continue
+                lats = [coord[0] for coord in element['coordinates']]
+                lons = [coord[1] for coord in element['coordinates']]
+                x0, y0 = lat_lon_to_tile(max(lats), min(lons), TILE_ZOOM)
+                x1, y1 = lat_lon_to_tile(min(lats), max(lons), TILE_ZOOM)
+                for y in range(y0, y1 + 1):
+                    for x in range(x0, x1 + 1):
+                        if (x, y) in tile_set:
+                            tile_data[(x, y)][layer].append(element)
+        
+        return tile_data
+    
+    def _restore_cached_data(self, cached):
+        """
+        Convert JSON-decoded cache data back to the processed_data shape
+        """
+        for elements in cached.values():
+            for element in elements:
+                element['coordinates'] = [tuple(coord) for coord in element['coordinates']]
+                if 'holes' in element:
+                    element['holes'] = [[tuple(coord) for coord in hole] for hole in element['holes']]
+        return cached
+    
+    def process_osm_result(self, elements):
+        """
+        Process streamed Overpass elements and organize by types
         """
         processed_data = {
             'highways': [],
@@ -83,64 +495,254 @@ class OSMDataFetcher:
             'railways': []
         }
         
-        # Process ways
-        for way in result.ways:
-            coords = [(float(node.lat), float(node.lon)) for node in way.nodes]
+        for element in elements:
+            element_type = element.get('type')
             
-            element_data = {
-                'coordinates': coords,
-                'tags': way.tags
-            }
+            # Ways and relation members carry their geometry inline with
+            # "out geom", so the query never recurses down to nodes
+            if element_type == 'way':
+                tags = element.get('tags', {})
+                classification = classify_tags(tags)
+                if classification is None:
+                    continue
+                
+                layer, subtype = classification
+                processed_data[layer].append({
+                    'id': element['id'],
+                    'osm_type': 'way',
+                    'coordinates': self._geometry_coords(element.get('geometry')),
+                    'tags': project_tags(tags),
+                    'subtype': subtype
+                })
             
-            if 'highway' in way.tags:
-                element_data['subtype'] = way.tags['highway']
-                processed_data['highways'].append(element_data)
-            elif 'landuse' in way.tags:
-                element_data['subtype'] = way.tags['landuse']
-                processed_data['landuse'].append(element_data)
-            elif 'natural' in way.tags:
-                element_data['subtype'] = way.tags['natural']
-                processed_data['natural'].append(element_data)
-            elif 'building' in way.tags:
-                element_data['subtype'] = way.tags.get('building', 'yes')
-                processed_data['buildings'].append(element_data)
-            elif 'railway' in way.tags:
-                element_data['subtype'] = way.tags['railway']
-                processed_data['railways'].append(element_data)
-        
-        # Process relations (for large areas)
-        for relation in result.relations:
-            if relation.members:
-                # Simplified: take only the first member that is a way
-                for member in relation.members:
-                    if member.role == "outer":
-                        try:
-                            # Try to get coordinates from the member way directly
-                            if hasattr(member, 'ref') and member.ref:
-                                # Find the corresponding way in the result
-                                way = None
-                                for w in result.ways:
-                                    if w.id == member.ref:
-                                        way = w
-                                        break
-                                
-                                if way and way.nodes:
-                                    coords = [(float(node.lat), float(node.lon)) for node in way.nodes]
-                                    
-                                    element_data = {
-                                        'coordinates': coords,
-                                        'tags': relation.tags
-                                    }
-                                    
-                                    if 'landuse' in relation.tags:
-                                        element_data['subtype'] = relation.tags['landuse']
-                                        processed_data['landuse'].append(element_data)
-                                    elif 'natural' in relation.tags:
-                                        element_data['subtype'] = relation.tags['natural']
-                                        processed_data['natural'].append(element_data)
-                                    break
-                        except Exception:
-                            # Skip problematic relations
-                            continue
-        
-        return processed_data
\ No newline at end of file
+            # Process relations (for large areas)
+            elif element_type == 'relation':
+                tags = element.get('tags', {})
+                classification = classify_tags(tags)
+                if classification is None or classification[0] not in ('landuse', 'natural'):
+                    continue
+                
+                outer_segments = []
+                inner_segments = []
+                for member in element.get('members', []):
+                    if member.get('type') != 'way':
+                        continue
+                    coords = self._geometry_coords(member.get('geometry'))
+                    if not coords:
+                        continue
+                    if member.get('role') == 'inner':
+                        inner_segments.append(coords)
+                    else:
+                        outer_segments.append(coords)
+                
+                layer, subtype = classification
+                for part, (outer, holes) in enumerate(assemble_multipolygon(outer_segments, inner_segments)):
+                    element_data = {
+                        'id': element['id'],
+                        'osm_type': 'relation',
+                        'part': part,
+                        'coordinates': outer,
+                        'tags': project_tags(tags),
+                        'subtype': subtype
+                    }
+                    if holes:
+                        element_data['holes'] = holes
+                    processed_data[layer].append(element_data)
+        
+        return processed_data
+    
+    def _geometry_coords(self, geometry):
+        """
+        Convert an Overpass geometry list to (lat, lon) float tuples
+        """
+        if not geometry:
+            return []
+        # Points outside a clipped response come back as null entries
+        return [(point['lat'], point['lon']) for point in geometry if point]
+
+def classify_tags(tags):
+    """
+    Return the (layer, subtype) an element belongs to, or None
+    """
+    if 'highway' in tags:
+        return 'highways', tags['highway']
+    elif 'landuse' in tags:
+        return 'landuse', tags['landuse']
+    elif 'natural' in tags:
+        return 'natural', tags['natural']
+    elif 'building' in tags:
+        return 'buildings', tags.get('building', 'yes')
+    elif 'railway' in tags:
+        return 'railways', tags['railway']
+    return None
+
+
+def overpass_regex_escape(value):
+    """
+    Escape a tag value for a "~" regex inside an Overpass QL string
+
+    Overpass matches POSIX extended regexes and rejects unknown escapes in
+    string literals, so only ERE metacharacters are escaped (never "-", "_"
+    or ":") and every backslash and quote is escaped again for the string.
+    """
+    regex = "".join("\\" + char if char in ERE_METACHARACTERS else char for char in value)
+    return regex.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def project_tags(tags):
+    """
+    Keep only the tags in RENDER_TAGS
+    """
+    return {key: value for key, value in tags.items() if key in RENDER_TAGS}
+
+
+def assemble_rings(segments):
+    """
+    Stitch way segments end to end into closed rings
+    """
+    rings = []
+    # Index segments by both endpoints to find continuations quickly
+    endpoints = {}
+    for index, segment in enumerate(segments):
+        if len(segment) < 2:
+            continue
+        endpoints.setdefault(segment[0], []).append(index)
+        endpoints.setdefault(segment[-1], []).append(index)
+    used = set()
+    
+    for index, segment in enumerate(segments):
+        if index in used or len(segment) < 2:
+            continue
+        used.add(index)
+        ring = list(segment)
+        
+        while ring[0] != ring[-1]:
+            candidates = [i for i in endpoints.get(ring[-1], []) if i not in used]
+            if not candidates:
+                break
+            next_index = candidates[0]
+            used.add(next_index)
+            next_segment = segments[next_index]
+            if next_segment[0] != ring[-1]:
+                next_segment = next_segment[::-1]
+            ring.extend(next_segment[1:])
+        
+        # Close rings left open by missing members rather than dropping them
+        if ring[0] != ring[-1]:
+            ring.append(ring[0])
+        if len(ring) >= 4:
+            rings.append(ring)
+    
+    return rings
+
+
+def point_in_ring(point, ring):
+    """
+    Ray casting test for a (lat, lon) point inside a closed ring
+    """
+    lat, lon = point
+    inside = False
+    for (lat1, lon1), (lat2, lon2) in zip(ring, ring[1:]):
+        if (lon1 > lon) != (lon2 > lon):
+            crossing = lat1 + (lon - lon1) * (lat2 - lat1) / (lon2 - lon1)
+            if lat < crossing:
+                inside = not inside
+    return inside
+
+
+def assemble_multipolygon(outer_segments, inner_segments):
+    """
+    Build (outer, holes) polygons from relation member segments
+    """
+    polygons = [(outer, []) for outer in assemble_rings(outer_segments)]
+    
+    for inner in assemble_rings(inner_segments):
+        for outer, holes in polygons:
+            if point_in_ring(inner[0], outer):
+                holes.append(inner)
+                break
+    
+    return polygons
+
+
+def query_signature(feature_class, subtypes):
+    """
+    Describe a feature class and subtype filter as a stable string
+    """
+    if subtypes is None:
+        return feature_class
+    return f"{feature_class}~{','.join(sorted(subtypes))}"
+
+
+def parse_signature(signature):
+    """
+    Inverse of query_signature: return (feature_class, subtypes or None)
+    """
+    feature_class, _, subtypes = signature.partition('~')
+    return feature_class, (set(subtypes.split(',')) if subtypes else None)
+
+
+def element_key(element):
+    """
+    Identify an element by OSM type, id and polygon part
+    """
+    return element.get('osm_type'), element.get('id'), element.get('part', 0)
+
+
+def merge_processed_data(parts):
+    """
+    Merge several processed_data dicts, dropping duplicate OSM elements
+    """
+    merged = {
+        'highways': [],
+        'landuse': [],
+        'natural': [],
+        'buildings': [],
+        'railways': []
+    }
+    seen = set()
+    
+    for part in parts:
+        for layer, elements in part.items():
+            for element in elements:
+                key = element_key(element)
+                if key[1] is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                merged.setdefault(layer, []).append(element)
+    
+    return merged
+
+
+def _record_ids(elements, ids):
+    """
+    Pass elements through while adding their (type, id) to ids
+    """
+    for element in elements:
+        ids.add((element.get('type'), element.get('id')))
+        yield element
+
+
+class _PrefixedStream:
+    """
+    File-like reader returning already consumed bytes before the rest of a
+    stream; the last tail_size bytes read are kept in tail
+    """
+
+    def __init__(self, prefix, stream, tail_size=0):
+        self.prefix = prefix
+        self.stream = stream
+        self.tail_size = tail_size
+        self.tail = b''
+
+    def read(self, size=-1):
+        if not self.prefix:
+            data = self.stream.read(size)
+        elif size is None or size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), b''
+        else:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+        if self.tail_size and data:
+            self.tail = (self.tail + data)[-self.tail_size:]
+        return data
@@ -0,0 +1,157 @@
+"""
+Shared scheduler for Overpass API requests
+
+Overpass servers give each client a few query slots and answer 429 (or 504
+when overloaded) once they are used up. The scheduler caps concurrent
+queries per endpoint, waits for free slots reported by /api/status and
+retries busy responses with jittered exponential backoff, so bursts of map
+requests queue up instead of failing.
+"""
+
+import random
+import re
+import threading
+import time
+import requests
+
+# Responses meaning "busy, try again later"
+RETRY_STATUSES = (429, 503, 504)
+
+
+class OverpassError(Exception):
+    """
+    Raised when an Overpass query cannot be completed
+    """
+
+
+class OverpassRuntimeError(OverpassError):
+    """
+    Raised while reading a 200 response whose remark reports a runtime
+    error (query timed out, out of memory): its elements are incomplete
+    """
+
+
+def status_url(url):
+    """
+    Return the /api/status URL of an /api/interpreter endpoint
+    """
+    return re.sub(r'/interpreter/?$', '/status', url)
+
+
+def parse_status(text):
+    """
+    Parse an /api/status page into (rate_limit, free_slots, wait_seconds)
+
+    rate_limit is 0 for servers without a limit and wait_seconds is how
+    long until the next slot frees up when none are available.
+    """
+    rate_limit = re.search(r'Rate limit:\s*(\d+)', text)
+    free_slots = re.search(r'(\d+) slots? available now', text)
+    waits = [int(seconds) for seconds in re.findall(r'in (-?\d+) seconds', text)]
+    return (
+        int(rate_limit.group(1)) if rate_limit else 0,
+        int(free_slots.group(1)) if free_slots else 0,
+        max(0, min(waits)) if waits else 0
+    )
+
+
+class OverpassScheduler:
+    def __init__(self, max_concurrent=2, max_retries=4, base_delay=1.0, max_delay=30.0, timeout=90):
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        # Per endpoint monotonic time before which no query should be sent
+        self._not_before = {}
+
+    def execute(self, url, query, handle_response):
+        """
+        Run a query on one endpoint and return handle_response(response)
+
+        The slot is held while handle_response reads the streamed body.
+        Busy responses, and runtime errors handle_response raises as
+        OverpassRuntimeError, are retried; anything else raises
+        OverpassError.
+        """
+        with self._semaphore(url):
+            for attempt in range(self.max_retries + 1):
+                self._wait_turn(url)
+                try:
+                    with requests.post(url, data={'data': query}, stream=True, timeout=self.timeout) as response:
+                        status_code = response.status_code
+                        if status_code == 200:
+                            return handle_response(response)
+                except OverpassRuntimeError as e:
+                    # Timeouts and memory exhaustion come from load as much as from the query
+                    failure = str(e)
+                except requests.RequestException as e:
+                    # Unreachable endpoints are left to the caller's failover
+                    raise OverpassError(str(e))
+                else:
+                    if status_code not in RETRY_STATUSES:
+                        raise OverpassError(f"HTTP {status_code}")
+                    failure = f"HTTP {status_code}"
+                if attempt == self.max_retries:
+                    break
+
+                delay = self._backoff(attempt)
+                if status_code == 429:
+                    # The status page says exactly when the next slot frees up
+                    status = self.status(url)
+                    if status is not None and status[1] == 0:
+                        delay = max(delay, status[2] + random.uniform(0, self.base_delay))
+                print(f"Overpass busy ({failure}), retrying in {delay:.1f}s...")
+                self._defer(url, delay)
+
+        raise OverpassError(f"{failure} after {self.max_retries + 1} attempts")
+
+    def status(self, url):
+        """
+        Return (rate_limit, free_slots, wait_seconds) for an endpoint, or None
+        """
+        try:
+            response = requests.get(status_url(url), timeout=10)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        return parse_status(response.text)
+
+    def _semaphore(self, url):
+        with self._lock:
+            semaphore = self._semaphores.get(url)
+            if semaphore is not None:
+                return semaphore
+
+        # Never run more queries at once than the server grants slots
+        limit = self.max_concurrent
+        status = self.status(url)
+        if status is not None:
+            rate_limit, free_slots, wait_seconds = status
+            if rate_limit:
+                limit = min(limit, rate_limit)
+            if free_slots == 0 and wait_seconds:
+                self._defer(url, wait_seconds)
+
+        with self._lock:
+            return self._semaphores.setdefault(url, threading.BoundedSemaphore(limit))
+
+    def _backoff(self, attempt):
+        """
+        Exponential backoff with jitter so waiting clients do not retry in lockstep
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _defer(self, url, seconds):
+        with self._lock:
+            self._not_before[url] = max(self._not_before.get(url, 0), time.monotonic() + seconds)
+
+    def _wait_turn(self, url):
+        with self._lock:
+            delay = self._not_before.get(url, 0) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,181 @@
+"""
+Browserless raster output of resolved map shapes
+
+Draws the shapes MapGenerator resolves for Leaflet straight into an image
+with Pillow: vertices are projected to Web Mercator pixels at the map zoom
+around the map center, exactly where Leaflet would place them in a
+viewport of the same size. Polygons are filled at a multiple of the final
+size and scaled down, which antialiases their edges. The circular frame is
+drawn the way its CSS renders it.
+
+A scene can be saved next to its HTML map (save_scene) and drawn later
+(render_scene_file), so an export shows exactly the shapes of the HTML
+even if the data or the random draws would differ on a second generation.
+"""
+
+import gzip
+import json
+import math
+import numpy as np
+from tiles import lat_lon_to_pixels
+
+try:
+    from PIL import Image, ImageColor, ImageDraw
+except ImportError:
+    Image = ImageColor = ImageDraw = None
+
+SUPERSAMPLE = 3  # Drawing scale used for antialiasing
+FALLBACK_COLOR = (136, 136, 136)
+
+
+class RasterRenderer:
+    def __init__(self, width, height, background="#ffffff", frame_width=0, frame_color="#333", supersample=SUPERSAMPLE):
+        if Image is None:
+            raise ImportError("Pillow is required to render images without a browser. Install it with 'pip install Pillow'")
+        self.width = width
+        self.height = height
+        self.background = background
+        self.frame_width = frame_width
+        self.frame_color = frame_color
+        self.supersample = max(1, int(supersample))
+        self._colors = {}
+
+    def render(self, scene, lat, lon, zoom):
+        """
+        Draw a scene (lists of shapes, drawn in order) centered on lat/lon
+        at a zoom and return the RGB image
+        """
+        scale = self.supersample
+        image = Image.new('RGB', (self.width * scale, self.height * scale), self._color(self.background))
+        draw = ImageDraw.Draw(image)
+
+        shapes = [shape for layer_shapes in scene for shape in layer_shapes]
+        rings = [ring for shape in shapes for ring in shape['rings']]
+        if rings:
+            # Project every vertex of the scene at once, then split per ring
+            lengths = [len(ring) for ring in rings]
+            coords = np.array([point for ring in rings for point in ring], dtype=np.float64).reshape(-1, 2)
+            center = lat_lon_to_pixels(np.array([[lat, lon]]), zoom)[0]
+            pixels = (lat_lon_to_pixels(coords, zoom) - center + [self.width / 2, self.height / 2]) * scale
+            projected = np.split(pixels, np.cumsum(lengths)[:-1])
+
+            ring_index = 0
+            for shape in shapes:
+                shape_rings = projected[ring_index:ring_index + len(shape['rings'])]
+                ring_index += len(shape['rings'])
+                self._fill(image, draw, shape_rings, self._color(shape['color']))
+
+        if self.frame_width > 0:
+            self._draw_frame(image, draw)
+
+        if scale > 1:
+            image = image.reduce(scale)
+        return image
+
+    def save(self, image, output_file, image_format=None, quality=0.9):
+        """
+        Save an image as PNG, JPEG or WEBP (from the extension unless given)
+        """
+        image_format = (image_format or output_file.rsplit('.', 1)[-1]).lower()
+        if image_format in ['jpg', 'jpeg']:
+            image.save(output_file, 'JPEG', quality=int(quality * 100))
+        elif image_format == 'webp':
+            image.save(output_file, 'WEBP', quality=int(quality * 100))
+        else:
+            image.save(output_file, 'PNG')
+
+    def _fill(self, image, draw, rings, color):
+        outline = rings[0]
+        if len(outline) < 3:
+            return
+        if len(rings) == 1:
+            draw.polygon(outline.ravel().tolist(), fill=color)
+            return
+
+        # Holes are cut out of a mask covering the shape's bounds within the image
+        left, top = np.maximum(np.floor(outline.min(axis=0)).astype(int), 0)
+        right, bottom = np.minimum(np.ceil(outline.max(axis=0)).astype(int) + 1, image.size)
+        if right <= left or bottom <= top:
+            return
+        mask = Image.new('L', (int(right - left), int(bottom - top)), 0)
+        mask_draw = ImageDraw.Draw(mask)
+        mask_draw.polygon((outline - [left, top]).ravel().tolist(), fill=255)
+        for hole in rings[1:]:
+            if len(hole) >= 3:
+                mask_draw.polygon((hole - [left, top]).ravel().tolist(), fill=0)
+        image.paste(color, (int(left), int(top), int(right), int(bottom)), mask)
+
+    def _draw_frame(self, image, draw):
+        """
+        The map container is clipped with clip-path: circle(50%) and shows
+        the white page outside it; the frame is a border of frame_width
+        pixels on a circle as wide as the smaller side
+        """
+        scale = self.supersample
+        width, height = image.size
+        center_x, center_y = width / 2, height / 2
+
+        # circle(50%) resolves against the reference box diagonal / sqrt(2)
+        clip_radius = 0.5 * math.sqrt((width ** 2 + height ** 2) / 2)
+        mask = Image.new('L', image.size, 255)
+        ImageDraw.Draw(mask).ellipse(
+            (center_x - clip_radius, center_y - clip_radius, center_x + clip_radius, center_y + clip_radius), fill=0
+        )
+        image.paste((255, 255, 255), (0, 0, width, height), mask)
+
+        frame_radius = min(width, height) / 2
+        draw.ellipse(
+            (center_x - frame_radius, center_y - frame_radius, center_x + frame_radius, center_y + frame_radius),
+            outline=self._color(self.frame_color),
+            width=self.frame_width * scale
+        )
+
+    def _color(self, value):
+        if value not in self._colors:
+            try:
+                self._colors[value] = ImageColor.getrgb(value)[:3]
+            except ValueError:
+                # CSS gradients and other values Pillow cannot parse
+                self._colors[value] = FALLBACK_COLOR
+        return self._colors[value]
+
+
+def save_scene(scene_file, scene, lat, lon, zoom, background="#ffffff", frame_width=0, frame_color="#333"):
+    """
+    Write a scene with its center, zoom and frame to a gzipped JSON file;
+    popups are not needed to draw and are left out
+    """
+    data = {
+        'lat': lat,
+        'lon': lon,
+        'zoom': zoom,
+        'background': background,
+        'frame_width': frame_width,
+        'frame_color': frame_color,
+        'scene': [[{'rings': shape['rings'], 'color': shape['color']} for shape in shapes] for shapes in scene]
+    }
+    with gzip.open(scene_file, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def load_scene(scene_file):
+    """
+    Read a file written by save_scene back into a dict
+    """
+    with gzip.open(scene_file, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def render_scene_file(scene_file, image_file, width, height, quality=0.9):
+    """
+    Draw a saved scene into a PNG, JPEG or WEBP image of width x height pixels
+    """
+    data = load_scene(scene_file)
+    renderer = RasterRenderer(
+        width,
+        height,
+        background=data['background'],
+        frame_width=data['frame_width'],
+        frame_color=data['frame_color']
+    )
+    renderer.save(renderer.render(data['scene'], data['lat'], data['lon'], data['zoom']), image_file, quality=quality)
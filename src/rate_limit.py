@@ -0,0 +1,38 @@
+"""
+Rate limiting helpers shared by the network clients
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        """
+        Allow `rate` operations per second with bursts of up to `capacity`
+
+        clock and sleep default to the real ones and can be replaced by a
+        fake clock in tests.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and consume it
+        """
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
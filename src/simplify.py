@@ -0,0 +1,142 @@
+"""
+Zoom-aware Douglas-Peucker simplification of feature collections
+
+Vertices are projected to Web Mercator pixels at the map zoom, so the
+tolerance is a screen distance: with the default half pixel, removed
+vertices are never visible at the rendered zoom.
+"""
+
+import numpy as np
+from geometry import FeatureCollection, GeometryLayer, concat_ranges
+
+DEFAULT_TOLERANCE_PX = 0.5
+
+
+def simplify_collection(features, zoom, tolerance_px=DEFAULT_TOLERANCE_PX):
+    """
+    Simplify every layer of a collection for display at a zoom
+    """
+    return FeatureCollection({
+        name: simplify_layer(layer, zoom, tolerance_px)
+        for name, layer in features.layers.items()
+    })
+
+
+def simplify_layer(layer, zoom, tolerance_px=DEFAULT_TOLERANCE_PX):
+    """
+    Return a copy of a layer with every ring simplified at once
+
+    Closed rings keep at least 4 vertices (a triangle); rings that would
+    collapse below that keep their original vertices.
+    """
+    if len(layer.coords) == 0 or tolerance_px <= 0:
+        return layer
+
+    keep = douglas_peucker_mask(layer.pixels(zoom), layer.ring_offsets, tolerance_px)
+
+    # Rings collapsing into a line or a point keep their original shape
+    starts = layer.ring_offsets[:-1]
+    ends = layer.ring_offsets[1:]
+    non_empty = ends > starts
+    kept_counts = np.zeros(len(starts), dtype=np.int64)
+    kept_counts[non_empty] = np.add.reduceat(keep, starts[non_empty])
+    closed = np.zeros(len(starts), dtype=bool)
+    closed[non_empty] = np.all(layer.coords[starts[non_empty]] == layer.coords[ends[non_empty] - 1], axis=1)
+    collapsed = closed & (kept_counts < 4)
+    keep[concat_ranges(starts[collapsed], ends[collapsed])] = True
+    kept_counts[collapsed] = (ends - starts)[collapsed]
+
+    simplified = GeometryLayer(
+        layer.coords[keep],
+        np.concatenate([[0], np.cumsum(kept_counts)]).astype(np.int64),
+        layer.feature_offsets,
+        layer.subtype_codes,
+        layer.subtypes,
+        layer.osm_ids,
+        layer.osm_types,
+        layer.parts
+    )
+    simplified._cache['mercator'] = layer.mercator()[keep]
+    return simplified
+
+
+def douglas_peucker_mask(points, ring_offsets, tolerance):
+    """
+    Douglas-Peucker over many rings at once; returns a boolean keep mask
+
+    Every ring is split into pending spans (first, last vertex). Each pass
+    measures the distance of all interior vertices of all spans together,
+    keeps the farthest vertex of every span beyond tolerance and splits the
+    span there, until no span has a vertex beyond tolerance.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    starts = ring_offsets[:-1]
+    ends = ring_offsets[1:] - 1
+    valid = ends >= starts
+    starts, ends = starts[valid], ends[valid]
+    keep[starts] = True
+    keep[ends] = True
+
+    # A closed ring's span has identical endpoints, so also split it at the
+    # vertex farthest from its start
+    closed = (ends - starts >= 2) & np.all(points[starts] == points[ends], axis=1)
+    if closed.any():
+        closed_starts, closed_ends = starts[closed], ends[closed]
+        indices = concat_ranges(closed_starts + 1, closed_ends)
+        span_ids = np.repeat(np.arange(len(closed_starts)), closed_ends - closed_starts - 1)
+        distances = np.hypot(*(points[indices] - points[closed_starts[span_ids]]).T)
+        farthest, _ = _span_argmax(distances, span_ids, indices, len(closed_starts))
+        keep[farthest] = True
+        span_starts = np.concatenate([starts[~closed], closed_starts, farthest])
+        span_ends = np.concatenate([ends[~closed], farthest, closed_ends])
+    else:
+        span_starts, span_ends = starts, ends
+
+    while True:
+        pending = span_ends - span_starts >= 2
+        span_starts, span_ends = span_starts[pending], span_ends[pending]
+        if len(span_starts) == 0:
+            break
+
+        indices = concat_ranges(span_starts + 1, span_ends)
+        span_ids = np.repeat(np.arange(len(span_starts)), span_ends - span_starts - 1)
+        distances = _segment_distances(points[indices], points[span_starts[span_ids]], points[span_ends[span_ids]])
+
+        farthest, max_distances = _span_argmax(distances, span_ids, indices, len(span_starts))
+        split = max_distances > tolerance
+        farthest = farthest[split]
+        keep[farthest] = True
+        span_starts, span_ends = (
+            np.concatenate([span_starts[split], farthest]),
+            np.concatenate([farthest, span_ends[split]])
+        )
+
+    return keep
+
+
+def _span_argmax(values, span_ids, indices, span_count):
+    """
+    Index (from indices) and value of the largest value of every span
+
+    span_ids must be sorted and cover every span.
+    """
+    span_first = np.searchsorted(span_ids, np.arange(span_count))
+    maxima = np.maximum.reduceat(values, span_first)
+    # First position of each span holding its maximum
+    candidates = np.flatnonzero(values == maxima[span_ids])
+    candidate_spans = span_ids[candidates]
+    first = candidates[np.concatenate([[True], candidate_spans[1:] != candidate_spans[:-1]])]
+    return indices[first], maxima
+
+
+def _segment_distances(points, starts, ends):
+    """
+    Distance from each point to the segment between its start and end
+    """
+    direction = ends - starts
+    length_squared = np.einsum('ij,ij->i', direction, direction)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.einsum('ij,ij->i', points - starts, direction) / length_squared
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    closest = starts + t[:, None] * direction
+    return np.hypot(*(points - closest).T)
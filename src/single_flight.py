@@ -0,0 +1,104 @@
+"""
+Coalescing of concurrent identical calls
+
+Calls are keyed either by their whole input (do) or by each piece of work
+they cover (do_batch), so calls that only partly overlap share the
+overlapping pieces.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time
+
+    Callers arriving while a call with the same key is in flight wait for it
+    and share its result (or exception) instead of running their own.
+    Results are shared objects, so callers must not modify them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, function):
+        """
+        Return function(), or the result of the in-flight call for key
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def do_batch(self, keys, function):
+        """
+        Run function(own_keys) for the keys no call is in flight for, then
+        wait for the in-flight calls covering the other keys
+
+        Returns (result, shared_keys): function's result (None when every
+        key was already in flight) and the keys completed by other calls,
+        whose results the caller reads from wherever those calls store them.
+        A failed call raises its exception in every caller sharing its keys.
+        """
+        own_keys = []
+        waiting = {}
+        call = _Call()
+        with self._lock:
+            for key in keys:
+                running = self._calls.get(key)
+                if running is None:
+                    self._calls[key] = call
+                    own_keys.append(key)
+                else:
+                    waiting[key] = running
+            self.shared += len(waiting)
+
+        result = None
+        if own_keys:
+            # Own keys are released before waiting on others, so two calls
+            # waiting on each other's keys cannot deadlock
+            try:
+                result = call.result = function(own_keys)
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in own_keys:
+                        del self._calls[key]
+                call.done.set()
+
+        for running in {id(running): running for running in waiting.values()}.values():
+            running.done.wait()
+            if running.error is not None:
+                raise running.error
+        return result, list(waiting)
@@ -0,0 +1,219 @@
+"""
+Uniform grid index over the bounding boxes of a layer's features
+
+Each feature is registered in every grid cell its bounding box covers, so
+features that may touch are found by looking at shared cells only. The
+index answers bounding box (viewport) queries and lists neighboring
+features for greedy graph coloring. Neighbors are found by bounding box;
+touching_pairs narrows them down to features whose outlines really touch.
+"""
+
+import numpy as np
+from geometry import concat_ranges
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+# Features covering more cells than this are kept apart and compared with
+# every other feature, so one large park does not flood the grid
+MAX_CELLS_PER_FEATURE = 64
+
+
+class GridIndex:
+    def __init__(self, min_lat, min_lon, max_lat, max_lon, cell_size=None):
+        self.min_lat = min_lat
+        self.min_lon = min_lon
+        self.max_lat = max_lat
+        self.max_lon = max_lon
+        count = len(min_lat)
+        if cell_size is None:
+            # Cells about twice the typical feature size keep few features per cell
+            sizes = np.maximum(max_lat - min_lat, max_lon - min_lon)
+            cell_size = 2 * float(np.median(sizes)) if count else 1.0
+        self.cell_size = max(cell_size, 1e-9)
+        self.cells, self.features, self.large = self._entries(0.0)
+
+    @classmethod
+    def for_layer(cls, layer):
+        """
+        Index of a layer's features, built once and kept with the layer
+        """
+        if 'grid_index' not in layer._cache:
+            bounds = [array.astype(np.float64) for array in layer.feature_bounds()]
+            layer._cache['grid_index'] = cls(*bounds)
+        return layer._cache['grid_index']
+
+    def __len__(self):
+        return len(self.min_lat)
+
+    def query(self, south, west, north, east):
+        """
+        Indices of the features whose bounding box intersects a bbox
+        """
+        first_row, first_col, last_row, last_col = self._cell_ranges(
+            np.array([south]), np.array([west]), np.array([north]), np.array([east])
+        )
+        rows = np.arange(first_row[0], last_row[0] + 1)
+        cols = np.arange(first_col[0], last_col[0] + 1)
+        if len(rows) * len(cols) > len(self.cells):
+            # A bbox larger than the data is cheaper to test directly
+            candidates = np.arange(len(self))
+        else:
+            wanted = self._cell_keys(np.repeat(rows, len(cols)), np.tile(cols, len(rows)))
+            hits = np.isin(self.cells, wanted)
+            candidates = np.union1d(self.features[hits], self.large)
+        intersects = (
+            (self.max_lat[candidates] >= south) & (self.min_lat[candidates] <= north) &
+            (self.max_lon[candidates] >= west) & (self.min_lon[candidates] <= east)
+        )
+        return candidates[intersects]
+
+    def neighbor_pairs(self, tolerance=0.0):
+        """
+        (a, b) arrays of every pair of features (a < b) whose bounding boxes
+        are at most tolerance apart
+
+        These are candidates only: the boxes of an L-shaped building and the
+        house in its corner overlap although the two never touch. Use
+        touching_pairs to keep the pairs in real contact.
+        """
+        # Boxes grown by half the tolerance overlap, and so share a cell,
+        # whenever the original boxes are within tolerance
+        if tolerance > 0:
+            cells, features, large = self._entries(tolerance / 2)
+        else:
+            cells, features, large = self.cells, self.features, self.large
+
+        # Pair every entry with the entries after it in the same cell
+        cell_starts = np.flatnonzero(np.concatenate([[True], cells[1:] != cells[:-1]]))
+        cell_ends = np.append(cell_starts[1:], len(cells))
+        group_ends = np.repeat(cell_ends, cell_ends - cell_starts)
+        entries = np.arange(len(cells))
+        partners = concat_ranges(entries + 1, group_ends)
+        a = features[np.repeat(entries, group_ends - entries - 1)]
+        b = features[partners]
+
+        # Large features are compared with everything
+        if len(large):
+            others = np.tile(np.arange(len(self)), len(large))
+            large = np.repeat(large, len(self))
+            a = np.concatenate([a, large])
+            b = np.concatenate([b, others])
+
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        pairs = np.unique(a * len(self) + b)
+        a, b = pairs // len(self), pairs % len(self)
+        close = (a != b) & (
+            (self.max_lat[a] + tolerance >= self.min_lat[b]) & (self.min_lat[a] - tolerance <= self.max_lat[b]) &
+            (self.max_lon[a] + tolerance >= self.min_lon[b]) & (self.min_lon[a] - tolerance <= self.max_lon[b])
+        )
+        return a[close], b[close]
+
+    def _entries(self, padding):
+        """
+        (cells, features, large): one (cell, feature) entry per grid cell
+        covered by each feature's bounds grown by padding, sorted by cell,
+        and the features covering too many cells to be gridded
+        """
+        first_row, first_col, last_row, last_col = self._cell_ranges(
+            self.min_lat - padding, self.min_lon - padding, self.max_lat + padding, self.max_lon + padding
+        )
+        cols = last_col - first_col + 1
+        cell_counts = (last_row - first_row + 1) * cols
+        large = np.flatnonzero(cell_counts > MAX_CELLS_PER_FEATURE)
+
+        gridded = np.flatnonzero(cell_counts <= MAX_CELLS_PER_FEATURE)
+        counts = cell_counts[gridded]
+        features = np.repeat(gridded, counts)
+        positions = concat_ranges(np.zeros(len(gridded), dtype=np.int64), counts)
+        cells = self._cell_keys(
+            first_row[features] + positions // cols[features],
+            first_col[features] + positions % cols[features]
+        )
+        order = np.argsort(cells, kind='stable')
+        return cells[order], features[order], large
+
+    def _cell_ranges(self, min_lat, min_lon, max_lat, max_lon):
+        return (
+            np.floor(min_lat / self.cell_size).astype(np.int64),
+            np.floor(min_lon / self.cell_size).astype(np.int64),
+            np.floor(max_lat / self.cell_size).astype(np.int64),
+            np.floor(max_lon / self.cell_size).astype(np.int64)
+        )
+
+    def _cell_keys(self, rows, cols):
+        # Cell rows/columns of lat/lon stay far below 2^31 for any useful cell size
+        return rows * (1 << 32) + cols
+
+
+def touching_pairs(layer, a, b, tolerance=0.0):
+    """
+    Subset of the candidate pairs (a, b) of a layer's features whose
+    polygons are at most tolerance apart
+
+    Needs shapely; without it the bounding box candidates are returned
+    unchanged.
+    """
+    if shapely is None or len(a) == 0:
+        return a, b
+    polygons = _feature_polygons(layer, np.union1d(a, b))
+    close = shapely.dwithin(polygons[a], polygons[b], tolerance)
+    return a[close], b[close]
+
+
+def _feature_polygons(layer, features):
+    """
+    Array of (lon, lat) polygons of the given features, indexed by feature;
+    features whose rings do not make a valid polygon get their bounding box
+    """
+    min_lat, min_lon, max_lat, max_lon = layer.feature_bounds()
+    polygons = np.empty(len(layer), dtype=object)
+    polygons[features] = shapely.box(min_lon[features], min_lat[features], max_lon[features], max_lat[features])
+
+    ring_lengths = np.diff(layer.ring_offsets)
+    ring_features = np.repeat(np.arange(len(layer)), np.diff(layer.feature_offsets))
+    buildable = np.zeros(len(layer), dtype=bool)
+    buildable[features] = True
+    # A linear ring needs at least 4 coordinates
+    buildable[ring_features[ring_lengths < 4]] = False
+    rings = np.flatnonzero(buildable[ring_features])
+    if len(rings) == 0:
+        return polygons
+
+    coords = layer.coords[concat_ranges(layer.ring_offsets[rings], layer.ring_offsets[rings + 1])]
+    ring_ids = np.repeat(np.arange(len(rings)), ring_lengths[rings])
+    built, polygon_ids = np.unique(ring_features[rings], return_inverse=True)
+    built_polygons = shapely.polygons(shapely.linearrings(coords[:, ::-1], indices=ring_ids), indices=polygon_ids)
+    valid = shapely.is_valid(built_polygons)
+    polygons[built[valid]] = built_polygons[valid]
+    return polygons
+
+
+def greedy_coloring(count, a, b):
+    """
+    Assign every node the smallest class not used by an already colored
+    neighbor, visiting nodes from the most to the least connected
+    (Welsh-Powell order); returns an int array of classes
+    """
+    classes = np.full(count, -1, dtype=np.int64)
+    if count == 0:
+        return classes
+
+    # Adjacency lists in CSR form
+    sources = np.concatenate([a, b])
+    targets = np.concatenate([b, a])
+    order = np.argsort(sources, kind='stable')
+    targets = targets[order].tolist()
+    degrees = np.bincount(sources, minlength=count)
+    offsets = np.concatenate([[0], np.cumsum(degrees)]).tolist()
+
+    class_list = classes.tolist()
+    for node in np.argsort(-degrees, kind='stable').tolist():
+        used = {class_list[neighbor] for neighbor in targets[offsets[node]:offsets[node + 1]]}
+        color = 0
+        while color in used:
+            color += 1
+        class_list[node] = color
+    return np.array(class_list, dtype=np.int64)
@@ -0,0 +1,163 @@
+"""
+Fixed web map tile grid used to split OSM fetches into reusable pieces
+"""
+
+import math
+import numpy as np
+
+# Zoom 16 tiles are ~610 m wide at the equator (~470 m at 40° latitude)
+TILE_ZOOM = 16
+# Web map tiles are 256 px wide at every zoom
+TILE_SIZE = 256
+# Web Mercator (EPSG:3857) sphere radius and half the width of the world in metres
+WEB_MERCATOR_RADIUS = 6378137.0
+WEB_MERCATOR_HALF_WIDTH = math.pi * WEB_MERCATOR_RADIUS
+
+
+def lat_lon_to_tile(lat, lon, zoom=TILE_ZOOM):
+    """
+    Return the (x, y) tile containing a coordinate
+    """
+    lat = max(-85.05112878, min(85.05112878, lat))
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bbox(x, y, zoom=TILE_ZOOM):
+    """
+    Return the (south, west, north, east) bounds of a tile
+    """
+    n = 2 ** zoom
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def tile_to_quadkey(x, y, zoom=TILE_ZOOM):
+    """
+    Encode a tile as a Bing-style quadkey string
+    """
+    digits = []
+    for level in range(zoom, 0, -1):
+        digit = 0
+        mask = 1 << (level - 1)
+        if x & mask:
+            digit += 1
+        if y & mask:
+            digit += 2
+        digits.append(str(digit))
+    return "".join(digits)
+
+
+def tiles_for_bbox(south, west, north, east, zoom=TILE_ZOOM):
+    """
+    Return every tile intersecting a bounding box, row by row
+    """
+    x0, y0 = lat_lon_to_tile(north, west, zoom)
+    x1, y1 = lat_lon_to_tile(south, east, zoom)
+    return [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def tile_runs_to_bboxes(tiles, zoom=TILE_ZOOM):
+    """
+    Merge horizontally adjacent tiles into runs and return one bbox per run
+    """
+    bboxes = []
+    rows = {}
+    for x, y in tiles:
+        rows.setdefault(y, []).append(x)
+
+    for y in sorted(rows):
+        xs = sorted(rows[y])
+        start = prev = xs[0]
+        for x in xs[1:] + [None]:
+            if x is not None and x == prev + 1:
+                prev = x
+                continue
+            south, west, _, _ = tile_bbox(start, y, zoom)
+            _, _, north, east = tile_bbox(prev, y, zoom)
+            bboxes.append((south, west, north, east))
+            if x is not None:
+                start = prev = x
+    return bboxes
+
+
+def tile_intersects_circle(x, y, lat, lon, radius_km, zoom=TILE_ZOOM):
+    """
+    Check whether a tile touches the disk of radius_km around (lat, lon)
+    """
+    south, west, north, east = tile_bbox(x, y, zoom)
+    # Distance from the center to the closest point of the tile
+    closest_lat = min(max(lat, south), north)
+    closest_lon = min(max(lon, west), east)
+    dy = (closest_lat - lat) * 111.0
+    dx = (closest_lon - lon) * 111.0 * math.cos(math.radians(lat))
+    return dx * dx + dy * dy <= radius_km * radius_km
+
+
+def quadkey_to_tile(quadkey):
+    """
+    Decode a quadkey string into (x, y, zoom)
+    """
+    x = y = 0
+    zoom = len(quadkey)
+    for level, digit in zip(range(zoom, 0, -1), quadkey):
+        mask = 1 << (level - 1)
+        if digit in '13':
+            x |= mask
+        if digit in '23':
+            y |= mask
+    return x, y, zoom
+
+
+def lat_lon_to_mercator(coords):
+    """
+    Project (N, 2) lat/lon to (N, 2) Web Mercator x/y metres
+    """
+    lat = np.radians(np.clip(coords[:, 0].astype(np.float64), -85.05112878, 85.05112878))
+    x = WEB_MERCATOR_RADIUS * np.radians(coords[:, 1].astype(np.float64))
+    y = WEB_MERCATOR_RADIUS * np.arcsinh(np.tan(lat))
+    return np.column_stack([x, y])
+
+
+def mercator_to_pixels(xy, zoom):
+    """
+    Scale (N, 2) Web Mercator metres to (N, 2) x/y pixels at a zoom, with
+    the origin at the world's north-west corner and y growing southwards
+    """
+    scale = TILE_SIZE * 2 ** zoom / (2 * WEB_MERCATOR_HALF_WIDTH)
+    return np.column_stack([(xy[:, 0] + WEB_MERCATOR_HALF_WIDTH) * scale, (WEB_MERCATOR_HALF_WIDTH - xy[:, 1]) * scale])
+
+
+def lat_lon_to_pixels(coords, zoom):
+    """
+    Project (N, 2) lat/lon to (N, 2) Web Mercator x/y pixels at a zoom
+    """
+    return mercator_to_pixels(lat_lon_to_mercator(coords), zoom)
+
+
+def pixels_to_lat_lon(xy, zoom):
+    """
+    Inverse of lat_lon_to_pixels: (N, 2) pixels to (N, 2) lat/lon
+    """
+    scale = TILE_SIZE * 2 ** zoom
+    lon = xy[:, 0] / scale * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * xy[:, 1] / scale))))
+    return np.column_stack([lat, lon])
+
+
+def coordinate_decimals(zoom, precision_px=0.125):
+    """
+    Decimals a lat/lon needs to stay within precision_px pixels at a zoom
+
+    Degrees of latitude span more pixels than degrees of longitude away
+    from the equator (by 1/cos(lat)), so the default eighth of a pixel
+    keeps latitudes within a pixel up to ~80°.
+    """
+    pixels_per_degree = TILE_SIZE * 2 ** zoom / 360.0
+    return max(0, math.ceil(math.log10(pixels_per_degree / precision_px)))
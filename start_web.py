@@ -75,7 +75,8 @@ def main():
     
     try:
         # Import and run the Flask app
-        from app import app
+        from app import app, start_cache_refresher
+        start_cache_refresher(use_reloader=True)
         app.run(debug=True, host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
@@ -0,0 +1,34 @@
+"""
+Shared pytest setup: modules are imported flat from src/ and scripts/
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from overpass_stub import OverpassStubServer
+
+
+@pytest.fixture
+def overpass_stub():
+    """
+    Start local Overpass stand-ins: start(**options) returns the server and
+    its /api/interpreter URL, every server is stopped after the test
+    """
+    servers = []
+
+    def start(**options):
+        server = OverpassStubServer(('127.0.0.1', 0), **options)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/api/interpreter"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,104 @@
+"""
+Tests for the generate and export endpoints of the web app
+"""
+
+import os
+import sys
+
+from PIL import Image
+
+import app as web_app
+import raster_renderer
+from osm_data import OSMDataFetcher
+from raster_renderer import render_scene_file
+from test_map_generator import GridBackend
+
+
+class EditableBackend(GridBackend):
+    def __init__(self):
+        self.demolished = False
+
+    def fetch(self, south, west, north, east, render_plan=None):
+        data = super().fetch(south, west, north, east, render_plan)
+        if self.demolished:
+            data['buildings'] = data['buildings'][::2]
+        return data
+
+
+def test_export_draws_the_generated_scene_after_the_data_changed(monkeypatch, tmp_path):
+    backend = EditableBackend()
+    monkeypatch.setattr(web_app, 'osm_fetcher', OSMDataFetcher(backend=backend, use_cache=False))
+    monkeypatch.setattr(web_app, 'OUTPUT_FOLDER', str(tmp_path))
+    client = web_app.app.test_client()
+
+    response = client.post('/api/generate', json={'lat': 40.0, 'lon': -3.0, 'radius': 0.5, 'palette': 'neon_city'})
+    assert response.status_code == 200
+    file_id = response.get_json()['file_id']
+    scene_file = os.path.join(tmp_path, f'map_{file_id}.scene.json.gz')
+    assert os.path.exists(scene_file)
+
+    # A cache refresh between approval and export must not change the image
+    backend.demolished = True
+    response = client.post('/api/export', json={'file_id': file_id, 'format': 'png', 'width': 400, 'height': 300})
+    assert response.status_code == 200
+
+    render_scene_file(scene_file, str(tmp_path / 'expected.png'), 400, 300)
+    exported = Image.open(tmp_path / f'map_{file_id}.png')
+    assert exported.size == (400, 300)
+    assert exported.tobytes() == Image.open(tmp_path / 'expected.png').tobytes()
+
+
+class RecordingGenerator(web_app.MapGenerator):
+    created = []
+
+    def __init__(self, **kwargs):
+        RecordingGenerator.created.append(kwargs)
+        super().__init__(**kwargs)
+
+
+def test_generate_reads_boolean_fields_sent_as_strings(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_app, 'osm_fetcher', OSMDataFetcher(backend=GridBackend(), use_cache=False))
+    monkeypatch.setattr(web_app, 'OUTPUT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(web_app, 'MapGenerator', RecordingGenerator)
+    client = web_app.app.test_client()
+
+    for value, expected in [('false', False), ('true', True), (False, False), (True, True)]:
+        response = client.post('/api/generate', json={'lat': 40.0, 'lon': -3.0, 'radius': 0.3, 'dissolve': value, 'gradients': value})
+        assert response.status_code == 200
+        assert RecordingGenerator.created[-1]['dissolve'] is expected
+        assert RecordingGenerator.created[-1]['use_gradients'] is expected
+
+
+def generated_map(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_app, 'osm_fetcher', OSMDataFetcher(backend=GridBackend(), use_cache=False))
+    monkeypatch.setattr(web_app, 'OUTPUT_FOLDER', str(tmp_path))
+    client = web_app.app.test_client()
+    response = client.post('/api/generate', json={'lat': 40.0, 'lon': -3.0, 'radius': 0.3})
+    return client, response.get_json()['file_id']
+
+
+def test_export_rejects_unknown_formats(monkeypatch, tmp_path):
+    client, file_id = generated_map(monkeypatch, tmp_path)
+
+    response = client.post('/api/export', json={'file_id': file_id, 'format': 'gif'})
+    assert response.status_code == 400
+    assert "Unknown format 'gif'" in response.get_json()['error']
+    assert not os.path.exists(tmp_path / f'map_{file_id}.gif')
+
+    for format_type in ['jpeg', 'webp']:
+        response = client.post('/api/export', json={'file_id': file_id, 'format': format_type, 'width': 200, 'height': 200})
+        assert response.status_code == 200
+        assert Image.open(tmp_path / f'map_{file_id}.{format_type}').format == format_type.upper()
+
+
+def test_export_falls_back_to_the_browser_without_pillow(monkeypatch, tmp_path, capsys):
+    client, file_id = generated_map(monkeypatch, tmp_path)
+    monkeypatch.setattr(raster_renderer, 'Image', None)
+    # No browser either: the error must come from the Playwright path
+    monkeypatch.setitem(sys.modules, 'playwright.sync_api', None)
+
+    response = client.post('/api/export', json={'file_id': file_id, 'format': 'png'})
+
+    assert response.status_code == 500
+    assert 'Playwright not installed' in response.get_json()['error']
+    assert "Pillow is required" in capsys.readouterr().out
@@ -0,0 +1,128 @@
+"""
+Tests for incremental cache refresh against the local Overpass stand-in
+"""
+
+import time
+
+import pytest
+import requests
+
+from cache_refresher import CacheRefresher
+from osm_cache import OSMCache
+from osm_data import OSMDataFetcher
+from overpass_scheduler import OverpassError, OverpassScheduler
+
+PLAN = {'building': None}
+
+
+def cached_fetcher(url, cache_dir):
+    cache = OSMCache(cache_dir=str(cache_dir))
+    return OSMDataFetcher(cache=cache, use_cache=False, overpass_urls=[url], scheduler=OverpassScheduler())
+
+
+def read_entries(cache):
+    return {key: cache.get(key) for key in cache.list_refreshable()}
+
+
+def building_ids(data):
+    return {element['id'] for element in data['buildings']}
+
+
+def read_rows(cache):
+    with cache._lock:
+        return cache._conn.execute("SELECT key, data, snapshot, expires_at FROM entries ORDER BY key").fetchall()
+
+
+def expire(cache, keys=None):
+    with cache._lock:
+        if keys is None:
+            cache._conn.execute("UPDATE entries SET expires_at = 0")
+        else:
+            cache._conn.executemany("UPDATE entries SET expires_at = 0 WHERE key = ?", [(key,) for key in keys])
+        cache._conn.commit()
+
+
+def test_refresh_patches_only_changed_tiles(overpass_stub, tmp_path):
+    _, url = overpass_stub()
+    fetcher = cached_fetcher(url, tmp_path)
+    fetcher.fetch_osm_data(40.0, -3.0, 0.3, render_plan=PLAN)
+    before = read_entries(fetcher.cache)
+    assert len(before) > 1
+
+    # Edit one building of the first tile and delete one of the last
+    keys = sorted(before)
+    modified = before[keys[0]]['buildings'][0]['id']
+    deleted = before[keys[-1]]['buildings'][-1]['id']
+    requests.post(
+        url.replace('/api/interpreter', '/stub/edit'),
+        json={'modify': {str(modified): {'building': 'school'}}, 'delete': [deleted]}
+    ).raise_for_status()
+    expire(fetcher.cache)
+    assert all(fetcher.cache.get(key) is None for key in before)
+
+    refreshed, changed = CacheRefresher(fetcher).run_once(refresh_all=True)
+
+    assert refreshed == len(before)
+    assert changed == 1
+    # Expired entries were rewritten and are served again
+    after = read_entries(fetcher.cache)
+    assert all(data is not None for data in after.values())
+    unchanged = 0
+    for key, data in before.items():
+        ids = building_ids(data)
+        if modified not in ids and deleted not in ids:
+            assert after[key] == data
+            unchanged += 1
+            continue
+        assert building_ids(after[key]) == ids - {deleted}
+        for element in after[key]['buildings']:
+            if element['id'] == modified:
+                assert element['subtype'] == 'school'
+    assert 0 < unchanged < len(before)
+
+
+def test_refresh_pass_skips_tiles_not_about_to_expire(overpass_stub, tmp_path):
+    server, url = overpass_stub()
+    fetcher = cached_fetcher(url, tmp_path)
+    fetcher.fetch_osm_data(40.0, -3.0, 0.3, render_plan=PLAN)
+    keys = sorted(fetcher.cache.list_refreshable())
+    queries = server.stats['queries']
+
+    # Nothing expires before the next pass yet
+    refresher = CacheRefresher(fetcher, interval=60)
+    assert refresher.run_once() == (0, 0)
+    assert server.stats['queries'] == queries
+
+    expire(fetcher.cache, keys[:1])
+    assert refresher.run_once() == (1, 0)
+    assert server.stats['queries'] == queries + 1
+    with fetcher.cache._lock:
+        expires_at = fetcher.cache._conn.execute("SELECT expires_at FROM entries WHERE key = ?", (keys[0],)).fetchone()[0]
+    assert expires_at > time.time()
+
+
+def test_truncated_diff_leaves_entries_unchanged(overpass_stub, tmp_path):
+    server, url = overpass_stub()
+    cache = OSMCache(cache_dir=str(tmp_path))
+    fetcher = OSMDataFetcher(cache=cache, use_cache=False, overpass_urls=[url],
+                             scheduler=OverpassScheduler(max_retries=0))
+    fetcher.fetch_osm_data(40.0, -3.0, 0.3, render_plan=PLAN)
+    keys = sorted(fetcher.cache.list_refreshable())
+    deleted = fetcher.cache.get(keys[0])['buildings'][0]['id']
+    requests.post(url.replace('/api/interpreter', '/stub/edit'), json={'delete': [deleted]}).raise_for_status()
+    expire(fetcher.cache)
+    before = read_rows(fetcher.cache)
+
+    # Diffs now time out after listing half of the ids
+    server.timeout_rate = 1.0
+    assert CacheRefresher(fetcher).run_once(refresh_all=True) == (0, 0)
+    with pytest.raises(OverpassError):
+        fetcher.fetch_osm_data(40.0, -3.0, 0.3, render_plan=PLAN)
+    assert server.stats['timed_out'] > 0
+    assert read_rows(fetcher.cache) == before
+
+    # A complete diff afterwards still sees the deletion
+    server.timeout_rate = 0.0
+    refreshed, _ = CacheRefresher(fetcher).run_once(refresh_all=True)
+    assert refreshed == len(keys)
+    assert deleted not in building_ids(fetcher.cache.get(keys[0]))
@@ -0,0 +1,112 @@
+"""
+Tests for clipping rings and lines to the area of interest
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from clipping import clip_line, clip_ring, clip_to_circle
+from geometry import FeatureCollection
+
+UNIT_SQUARE = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
+
+
+def ring_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def test_ring_inside_is_unchanged():
+    ring = np.array([[0.2, 0.2], [0.8, 0.2], [0.8, 0.8], [0.2, 0.8], [0.2, 0.2]])
+    clipped = clip_ring(ring, UNIT_SQUARE)
+    assert clipped.shape == ring.shape
+    assert {tuple(point) for point in clipped} == {tuple(point) for point in ring}
+    assert np.array_equal(clipped[0], clipped[-1])
+
+
+def test_ring_outside_is_empty():
+    ring = np.array([[2.0, 2.0], [3.0, 2.0], [3.0, 3.0], [2.0, 2.0]])
+    assert len(clip_ring(ring, UNIT_SQUARE)) == 0
+
+
+def test_ring_around_the_clip_becomes_the_clip():
+    ring = np.array([[-1.0, -1.0], [2.0, -1.0], [2.0, 2.0], [-1.0, 2.0], [-1.0, -1.0]])
+    assert ring_area(clip_ring(ring, UNIT_SQUARE)[:-1]) == pytest.approx(1.0)
+
+
+def test_ring_crossing_the_edge_keeps_the_overlap():
+    ring = np.array([[0.5, 0.5], [1.5, 0.5], [1.5, 1.5], [0.5, 1.5], [0.5, 0.5]])
+    clipped = clip_ring(ring, UNIT_SQUARE)
+    assert ring_area(clipped[:-1]) == pytest.approx(0.25)
+    assert clipped[:, 0].max() == pytest.approx(1.0)
+    assert clipped[:, 1].max() == pytest.approx(1.0)
+
+
+def test_concave_ring_area_matches_shapely():
+    shapely = pytest.importorskip("shapely")
+    rng = np.random.default_rng(7)
+    clip = np.column_stack([np.cos(np.linspace(0, 2 * math.pi, 64, endpoint=False)),
+                            np.sin(np.linspace(0, 2 * math.pi, 64, endpoint=False))])
+    for _ in range(20):
+        # Star-shaped (concave) rings around random centers
+        angles = np.sort(rng.uniform(0, 2 * math.pi, 12))
+        radii = rng.uniform(0.3, 1.2, 12)
+        center = rng.uniform(-0.8, 0.8, 2)
+        ring = center + np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+        ring = np.vstack([ring, ring[:1]])
+
+        expected = shapely.Polygon(ring).intersection(shapely.Polygon(clip)).area
+        clipped = clip_ring(ring, clip)
+        area = ring_area(clipped[:-1]) if len(clipped) else 0.0
+        assert area == pytest.approx(expected, abs=1e-9)
+
+
+def test_line_leaving_and_reentering_is_split():
+    line = np.array([[0.2, 0.5], [1.5, 0.5], [1.5, 0.8], [0.2, 0.8]])
+    pieces = clip_line(line, UNIT_SQUARE)
+    assert len(pieces) == 2
+    np.testing.assert_allclose(pieces[0], [[0.2, 0.5], [1.0, 0.5]])
+    np.testing.assert_allclose(pieces[1], [[1.0, 0.8], [0.2, 0.8]])
+
+
+def test_line_inside_is_one_piece_and_outside_is_dropped():
+    inside = np.array([[0.1, 0.1], [0.5, 0.9], [0.9, 0.1]])
+    pieces = clip_line(inside, UNIT_SQUARE)
+    assert len(pieces) == 1
+    np.testing.assert_allclose(pieces[0], inside)
+    assert clip_line(np.array([[2.0, 2.0], [3.0, 2.5]]), UNIT_SQUARE) == []
+
+
+def test_clip_to_circle_drops_outside_features_and_cuts_crossing_ones():
+    lat, lon = 40.0, -3.0
+    degree = 1 / 111.0  # ~1 km
+
+    def building(dlat, dlon, size):
+        south, west = lat + dlat, lon + dlon
+        return {
+            'coordinates': [
+                (south, west), (south, west + size), (south + size, west + size), (south + size, west), (south, west)
+            ],
+            'subtype': 'yes'
+        }
+
+    features = FeatureCollection.from_processed_data({
+        'buildings': [
+            building(0.0, 0.0, 0.1 * degree),
+            building(5 * degree, 5 * degree, 0.1 * degree),
+            # Crosses the northern edge
+            building(0.9 * degree, -0.05 * degree, 0.2 * degree)
+        ],
+        'highways': [{'coordinates': [(lat, lon - 2 * degree), (lat, lon + 2 * degree)], 'subtype': 'primary'}]
+    })
+
+    clipped = clip_to_circle(features, lat, lon, 1.0)
+
+    assert len(clipped['buildings']) == 2
+    assert clipped['buildings'].coords[:, 0].max() <= lat + degree * 1.0001
+    # The road is cut to the circle's diameter
+    road = clipped['highways'].coords
+    assert road[:, 1].min() == pytest.approx(lon - degree / math.cos(math.radians(lat)), rel=1e-6)
+    assert road[:, 1].max() == pytest.approx(lon + degree / math.cos(math.radians(lat)), rel=1e-6)
@@ -0,0 +1,84 @@
+"""
+Tests for sub-pixel feature culling and aggregation
+"""
+
+import numpy as np
+import pytest
+
+from culling import cull_layer
+from geometry import GeometryLayer
+from tiles import lat_lon_to_pixels, pixels_to_lat_lon
+
+ZOOM = 16
+CELL_PX = 4
+
+
+def pixel_square(x, y, side):
+    square = np.array([[x, y], [x + side, y], [x + side, y + side], [x, y + side], [x, y]])
+    return [tuple(coord) for coord in pixels_to_lat_lon(square, ZOOM).tolist()]
+
+
+def pixel_areas(layer):
+    areas = []
+    pixels = layer.pixels(ZOOM)
+    for start, end in zip(layer.ring_offsets[:-1], layer.ring_offsets[1:]):
+        x, y = pixels[start:end, 0], pixels[start:end, 1]
+        areas.append(abs(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2)
+    return np.array(areas)
+
+
+def test_small_polygons_become_one_square_per_cell():
+    origin = np.floor(lat_lon_to_pixels(np.array([[40.0, -3.0]]), ZOOM)[0] / CELL_PX) * CELL_PX
+    elements = []
+    # 5 x 5 cells with four 0.5 px buildings each, three houses and a shed
+    for row in range(5):
+        for col in range(5):
+            x0, y0 = origin + [col * CELL_PX, row * CELL_PX]
+            for index, (dx, dy) in enumerate([(0.5, 0.5), (2.5, 0.5), (0.5, 2.5), (2.5, 2.5)]):
+                subtype = 'shed' if index == 3 else 'house'
+                elements.append({'coordinates': pixel_square(x0 + dx, y0 + dy, 0.5), 'subtype': subtype})
+    elements.append({'coordinates': pixel_square(origin[0] + 40, origin[1] + 40, 20), 'subtype': 'school'})
+    layer = GeometryLayer.from_elements(elements)
+
+    culled, culled_count, aggregate_count = cull_layer(layer, ZOOM, min_feature_px=1.0, cell_px=CELL_PX)
+
+    assert culled_count == 100
+    assert aggregate_count == 25
+    assert len(culled) == 26
+    assert culled.subtype_names()[0] == 'school'
+    assert set(culled.subtype_names()[1:]) == {'house'}
+
+    # Aggregates carry the combined area of their cell, centred on it
+    areas = pixel_areas(culled)
+    assert areas[0] == pytest.approx(400, rel=1e-6)
+    assert areas[1:].sum() == pytest.approx(100 * 0.25, rel=0.01)
+    centers = culled.pixels(ZOOM)[culled.ring_offsets[1]:].reshape(25, 5, 2)[:, :4].mean(axis=1)
+    offsets = (centers - origin) % CELL_PX
+    np.testing.assert_allclose(offsets, 1.75, atol=1e-6)
+
+
+def test_large_features_are_kept_unchanged():
+    origin = lat_lon_to_pixels(np.array([[40.0, -3.0]]), ZOOM)[0]
+    layer = GeometryLayer.from_elements([
+        {'coordinates': pixel_square(origin[0], origin[1], 2), 'subtype': 'yes'},
+        {'coordinates': pixel_square(origin[0] + 10, origin[1], 30), 'subtype': 'yes'}
+    ])
+    culled, culled_count, aggregate_count = cull_layer(layer, ZOOM)
+    assert (culled_count, aggregate_count) == (0, 0)
+    assert culled is layer
+
+
+def test_small_lines_are_dropped_without_aggregates():
+    origin = lat_lon_to_pixels(np.array([[40.0, -3.0]]), ZOOM)[0]
+
+    def line(x, length):
+        points = np.array([[x, origin[1]], [x + length, origin[1]]])
+        return [tuple(coord) for coord in pixels_to_lat_lon(points, ZOOM).tolist()]
+
+    layer = GeometryLayer.from_elements([
+        {'coordinates': line(origin[0], 0.3), 'subtype': 'footway'},
+        {'coordinates': line(origin[0] + 5, 50), 'subtype': 'primary'}
+    ])
+    culled, culled_count, aggregate_count = cull_layer(layer, ZOOM, aggregate=False)
+    assert (culled_count, aggregate_count) == (1, 0)
+    assert culled.subtype_names() == ['primary']
@@ -0,0 +1,76 @@
+"""
+Tests for dissolving touching shapes of the same style
+"""
+
+import numpy as np
+import pytest
+
+shapely = pytest.importorskip("shapely")
+
+from dissolve import dissolve_shapes
+from tiles import lat_lon_to_pixels
+
+ZOOM = 17
+
+
+def box(south, west, north, east):
+    return [[south, west], [south, east], [north, east], [north, west], [south, west]]
+
+
+def shape(rings, color='#ff0000', popup='house'):
+    return {'rings': rings, 'color': color, 'popup': popup}
+
+
+def pixel_area(rings):
+    pixel_rings = [lat_lon_to_pixels(np.asarray(ring, dtype=np.float64), ZOOM) for ring in rings]
+    return shapely.Polygon(pixel_rings[0], pixel_rings[1:]).area
+
+
+def test_terraced_houses_become_one_shape():
+    step = 0.0001
+    houses = [shape([box(40.0, -3.0 + i * step, 40.0 + step, -3.0 + (i + 1) * step)]) for i in range(4)]
+
+    dissolved = dissolve_shapes(houses, ZOOM)
+
+    assert len(dissolved) == 1
+    merged = dissolved[0]
+    assert merged['popup'] is None
+    assert len(merged['rings']) == 1
+    assert pixel_area(merged['rings']) == pytest.approx(sum(pixel_area(house['rings']) for house in houses), rel=0.01)
+
+
+def test_disjoint_shapes_stay_separate_and_unchanged():
+    shapes = [shape([box(40.0, -3.0, 40.0001, -2.9999)]), shape([box(40.001, -3.0, 40.0011, -2.9999)])]
+    assert dissolve_shapes(shapes, ZOOM) == shapes
+
+
+def test_holes_are_kept():
+    park = box(40.0, -3.0, 40.001, -2.999)
+    pond = box(40.0004, -2.9994, 40.0006, -2.9992)
+    shapes = [shape([park, pond], '#00aa00'), shape([box(40.0, -2.999, 40.001, -2.998)], '#00aa00')]
+
+    dissolved = dissolve_shapes(shapes, ZOOM)
+
+    assert len(dissolved) == 1
+    assert len(dissolved[0]['rings']) == 2
+    assert pixel_area(dissolved[0]['rings'][1:2]) == pytest.approx(pixel_area([pond]), rel=0.05)
+
+
+def test_merged_shape_takes_its_first_members_place_and_color():
+    step = 0.0001
+    shapes = [
+        shape([box(40.01, -3.0, 40.01 + step, -3.0 + step)], '#0000ff', 'school'),
+        shape([box(40.0, -3.0, 40.0 + step, -3.0 + step)], '#ff0101'),
+        # Close enough in color to merge with the house before it
+        shape([box(40.0, -3.0 + step, 40.0 + step, -3.0 + 2 * step)], '#ff0000'),
+        # Touches the houses but is drawn in another color
+        shape([box(40.0, -3.0 + 2 * step, 40.0 + step, -3.0 + 3 * step)], '#00ff00', 'shop')
+    ]
+
+    dissolved = dissolve_shapes(shapes, ZOOM)
+
+    assert [(item['color'], item['popup']) for item in dissolved] == [
+        ('#0000ff', 'school'), ('#ff0101', None), ('#00ff00', 'shop')
+    ]
+    assert dissolved[0] is shapes[0]
+    assert dissolved[2] is shapes[3]
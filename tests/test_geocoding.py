@@ -0,0 +1,63 @@
+"""
+Tests for cached geocoding of addresses
+"""
+
+import types
+
+import pytest
+
+import geocoding
+from geocoding import GeocodeCache, Geocoder, normalize_address
+from rate_limit import TokenBucket
+
+
+class FakeNominatim:
+    """
+    Stand-in for the geopy geolocator that counts lookups instead of
+    calling the network
+    """
+
+    def __init__(self, places):
+        self.places = places
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if address not in self.places:
+            return None
+        lat, lon = self.places[address]
+        return types.SimpleNamespace(latitude=lat, longitude=lon)
+
+
+@pytest.fixture
+def geocoder(tmp_path, monkeypatch):
+    # Lookups that reach the fake geolocator must not wait for Nominatim's real pace
+    monkeypatch.setattr(geocoding, '_nominatim_bucket', TokenBucket(rate=1.0, capacity=100))
+    geocoder = Geocoder(cache=GeocodeCache(cache_dir=str(tmp_path)))
+    geocoder.geolocator = FakeNominatim({'Plaza Mayor, Madrid': (40.4155, -3.7074)})
+    return geocoder
+
+
+def test_cache_hit_skips_the_geolocator(geocoder):
+    assert geocoder.geocode('Plaza Mayor, Madrid') == (40.4155, -3.7074)
+    # Spelling differences share the normalized cache entry
+    assert geocoder.geocode('  plaza mayor ,madrid. ') == (40.4155, -3.7074)
+    assert geocoder.geolocator.calls == ['Plaza Mayor, Madrid']
+
+
+def test_failed_lookups_are_cached_too(geocoder):
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Could not find address"):
+            geocoder.geocode('Nowhere Street 0')
+    assert geocoder.geolocator.calls == ['Nowhere Street 0']
+
+
+def test_expired_entries_are_looked_up_again(geocoder):
+    geocoder.geocode('Plaza Mayor, Madrid')
+    geocoder.cache.ttl = -1
+    geocoder.geocode('Plaza Mayor, Madrid')
+    assert len(geocoder.geolocator.calls) == 2
+
+
+def test_normalize_address():
+    assert normalize_address('Calle  MAYOR ,  1 ; ') == 'calle mayor, 1'
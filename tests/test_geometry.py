@@ -0,0 +1,90 @@
+"""
+Tests for areas measured on columnar geometry layers and conversion back
+to element dicts
+"""
+
+import math
+
+import pytest
+
+from clipping import clip_to_bbox
+from geometry import EARTH_RADIUS, FeatureCollection, GeometryLayer
+from osm_data import merge_processed_data
+from simplify import simplify_collection
+
+
+def box(south, west, north, east):
+    return [(south, west), (south, east), (north, east), (north, west), (south, west)]
+
+
+@pytest.mark.parametrize("south", [0.0, 40.0, 60.0, -75.0])
+def test_outline_area_matches_spherical_cell_area(south):
+    north = south + 1.0
+    layer = GeometryLayer.from_elements([{'coordinates': box(south, 10.0, north, 11.0), 'subtype': 'yes'}])
+    # Exact area of a lat/lon cell on the sphere
+    expected = EARTH_RADIUS ** 2 * math.radians(1.0) * (math.sin(math.radians(north)) - math.sin(math.radians(south)))
+    assert layer.outline_areas_m2()[0] == pytest.approx(expected, rel=1e-9)
+
+
+def test_same_ground_area_measures_the_same_at_any_latitude():
+    side = 100.0  # metres
+    elements = []
+    for lat in [0.0, 40.0, 60.0]:
+        dlat = math.degrees(side / EARTH_RADIUS)
+        dlon = dlat / math.cos(math.radians(lat))
+        elements.append({'coordinates': box(lat, 0.0, lat + dlat, dlon), 'subtype': 'yes'})
+    areas = GeometryLayer.from_elements(elements).outline_areas_m2()
+    assert areas == pytest.approx([side * side] * 3, rel=1e-3)
+
+
+def test_holes_have_their_own_area():
+    layer = GeometryLayer.from_elements([{
+        'coordinates': box(40.0, -3.0, 40.01, -2.99),
+        'holes': [box(40.002, -2.998, 40.004, -2.996)],
+        'subtype': 'park'
+    }])
+    outline, hole = layer.ring_areas_m2()
+    assert outline == pytest.approx(25 * hole, rel=1e-3)
+    assert layer.outline_areas_m2()[0] == outline
+
+
+def two_part_lake():
+    """
+    A multipolygon relation with two lakes, the first with an island
+    """
+    return {
+        'highways': [],
+        'landuse': [],
+        'natural': [
+            {'id': 7, 'osm_type': 'relation', 'coordinates': box(40.0, -3.0, 40.01, -2.99),
+             'holes': [box(40.002, -2.998, 40.004, -2.996)], 'subtype': 'water'},
+            {'id': 7, 'osm_type': 'relation', 'part': 1, 'coordinates': box(40.02, -3.0, 40.03, -2.99), 'subtype': 'water'},
+            {'id': 7, 'osm_type': 'way', 'coordinates': box(40.04, -3.0, 40.05, -2.99), 'subtype': 'water'}
+        ],
+        'buildings': [],
+        'railways': []
+    }
+
+
+def test_elements_round_trip_through_a_collection():
+    processed_data = two_part_lake()
+    assert FeatureCollection.from_processed_data(processed_data).to_processed_data() == processed_data
+
+
+def test_relation_parts_survive_merging_converted_tiles():
+    tile = FeatureCollection.from_processed_data(two_part_lake()).to_processed_data()
+    merged = merge_processed_data([tile, tile])
+    assert merged['natural'] == two_part_lake()['natural']
+
+
+def test_clipping_and_simplifying_keep_relation_parts():
+    features = FeatureCollection.from_processed_data(two_part_lake())
+    # Cuts the first lake and keeps the second one whole
+    clipped = clip_to_bbox(features, (40.005, -3.1, 40.1, -2.9))
+    simplified = simplify_collection(clipped, 16)
+
+    for collection in [clipped, simplified]:
+        elements = collection.to_processed_data()['natural']
+        assert sorted((element['osm_type'], element['id'], element.get('part', 0)) for element in elements) == [
+            ('relation', 7, 0), ('relation', 7, 1), ('way', 7, 0)
+        ]
@@ -0,0 +1,70 @@
+"""
+Tests for the offline .osm.pbf store
+"""
+
+import pytest
+
+from local_store import LocalOSMStore
+from osm_data import OSMDataFetcher
+
+osmium = pytest.importorskip("osmium")
+
+
+def write_pbf(path):
+    """
+    Write a tiny extract: two buildings and a road near (40.0, -3.0)
+    """
+    nodes = {
+        1: (40.0000, -3.0000), 2: (40.0000, -2.9990), 3: (40.0010, -2.9990), 4: (40.0010, -3.0000),
+        5: (40.0020, -3.0000), 6: (40.0020, -2.9990), 7: (40.0030, -2.9990), 8: (40.0030, -3.0000),
+        9: (39.9990, -3.0010), 10: (39.9990, -2.9980)
+    }
+    with osmium.SimpleWriter(str(path)) as writer:
+        for node_id, (lat, lon) in nodes.items():
+            writer.add_node(osmium.osm.mutable.Node(id=node_id, location=(lon, lat), tags={}))
+        writer.add_way(osmium.osm.mutable.Way(id=100, nodes=[1, 2, 3, 4, 1], tags={'building': 'yes'}))
+        writer.add_way(osmium.osm.mutable.Way(id=101, nodes=[5, 6, 7, 8, 5], tags={'building': 'house'}))
+        writer.add_way(osmium.osm.mutable.Way(id=102, nodes=[9, 10], tags={'highway': 'residential'}))
+
+
+def test_reimport_does_not_duplicate_features(tmp_path):
+    pbf_path = tmp_path / "extract.osm.pbf"
+    write_pbf(pbf_path)
+    store = LocalOSMStore(str(tmp_path / "store.sqlite"))
+
+    store.import_pbf(str(pbf_path))
+    first_count = store.count()
+    store.import_pbf(str(pbf_path))
+
+    assert first_count == {'buildings': 2, 'highways': 1}
+    assert store.count() == first_count
+    index_rows = store._conn.execute("SELECT COUNT(*) FROM features_index").fetchone()[0]
+    assert index_rows == 3
+
+    data = store.fetch(39.99, -3.01, 40.01, -2.99)
+    assert sorted(element['id'] for element in data['buildings']) == [100, 101]
+    assert [element['id'] for element in data['highways']] == [102]
+
+
+def test_replaced_feature_keeps_index_in_sync(tmp_path):
+    store = LocalOSMStore(str(tmp_path / "store.sqlite"))
+    ring = [[40.0, -3.0], [40.0, -2.999], [40.001, -2.999], [40.0, -3.0]]
+    moved = [[41.0, -3.0], [41.0, -2.999], [41.001, -2.999], [41.0, -3.0]]
+
+    store.insert_features([('way', 100, 0, 'buildings', 'yes', {}, [ring])])
+    store.insert_features([('way', 100, 0, 'buildings', 'school', {}, [moved])])
+
+    assert store.count() == {'buildings': 1}
+    assert store.fetch(39.9, -3.1, 40.1, -2.9)['buildings'] == []
+    moved_data = store.fetch(40.9, -3.1, 41.1, -2.9)['buildings']
+    assert [(element['id'], element['subtype']) for element in moved_data] == [(100, 'school')]
+
+
+def test_fetcher_drops_duplicate_backend_elements():
+    class DuplicatingBackend:
+        def fetch(self, south, west, north, east, render_plan):
+            element = {'id': 1, 'osm_type': 'way', 'coordinates': [(40.0, -3.0)], 'tags': {}, 'subtype': 'yes'}
+            return {'highways': [], 'landuse': [], 'natural': [], 'buildings': [element, dict(element)], 'railways': []}
+
+    fetcher = OSMDataFetcher(backend=DuplicatingBackend(), use_cache=False)
+    assert len(fetcher.fetch_osm_data(40.0, -3.0, 0.5)['buildings']) == 1
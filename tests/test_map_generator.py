@@ -0,0 +1,178 @@
+"""
+Tests for the HTML maps written by MapGenerator
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+from geojson_layer import StyledGeoJson
+from geometry import GeometryLayer
+from map_generator import MapGenerator
+from osm_data import OSMDataFetcher
+from raster_renderer import load_scene, render_scene_file
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(TESTS_DIR, '..', 'src')
+
+
+def render_base_map(palette_name, renderer, glow=None):
+    generator = MapGenerator(palette_name=palette_name, seed=1, osm_fetcher=OSMDataFetcher(use_cache=False),
+                             renderer=renderer, glow=glow)
+    return generator.create_map(40.0, -3.0, 1.0).get_root().render()
+
+
+@pytest.mark.parametrize("palette_name", ['neon_city', 'cyberpunk'])
+def test_canvas_maps_glow_per_shape(palette_name):
+    html = render_base_map(palette_name, 'canvas')
+    # Shapes are shadowed in their own color before the map is created
+    assert 'ctx.shadowColor = layer.options.fillColor || layer.options.color' in html
+    assert html.index('L.Canvas.prototype._fillStroke') < html.index('L.map(')
+    assert 'leaflet-overlay-pane canvas' not in html
+
+
+def test_svg_maps_glow_with_css_only():
+    html = render_base_map('neon_city', 'svg')
+    assert 'drop-shadow(0 0 2px currentColor)' in html
+    assert '_fillStroke' not in html
+
+
+def test_other_palettes_do_not_glow():
+    for renderer in ['svg', 'canvas']:
+        html = render_base_map('classic', renderer)
+        assert 'drop-shadow' not in html
+        assert '_fillStroke' not in html
+
+
+@pytest.mark.parametrize("renderer", ['svg', 'canvas'])
+@pytest.mark.parametrize("palette_name", ['neon_city', 'classic'])
+@pytest.mark.parametrize("glow", [None, False])
+def test_canvas_glow_script_is_injected_only_when_needed(renderer, palette_name, glow):
+    html = render_base_map(palette_name, renderer, glow)
+    expected = renderer == 'canvas' and palette_name == 'neon_city' and glow is None
+    assert ('L.Canvas.prototype._fillStroke' in html) == expected
+    assert ('shadowBlur' in html) == expected
+
+
+def test_buildings_keep_their_courtyards():
+    generator = MapGenerator(seed=1, osm_fetcher=OSMDataFetcher(use_cache=False))
+    outline = [(40.0, -3.0), (40.0, -2.999), (40.001, -2.999), (40.001, -3.0), (40.0, -3.0)]
+    courtyard = [(40.0004, -2.9996), (40.0004, -2.9994), (40.0006, -2.9994), (40.0006, -2.9996), (40.0004, -2.9996)]
+    buildings = GeometryLayer.from_elements([{'coordinates': outline, 'holes': [courtyard], 'subtype': 'apartments'}])
+
+    shapes = generator._resolve_buildings(buildings)
+
+    assert [shape['rings'] for shape in shapes] == [[[list(coord) for coord in outline], [list(coord) for coord in courtyard]]]
+
+
+class GridBackend:
+    """
+    Local backend answering every bbox with the same blocks of terraced
+    houses around a park with a pond
+    """
+
+    def fetch(self, south, west, north, east, render_plan=None):
+        step = 0.0002
+        buildings = []
+        for row in range(12):
+            for col in range(12):
+                lat, lon = 40.0 + (row - 6) * 1.5 * step, -3.0 + (col - 6) * step
+                buildings.append({
+                    'id': row * 100 + col,
+                    'osm_type': 'way',
+                    'coordinates': [(lat, lon), (lat, lon + step), (lat + step, lon + step), (lat + step, lon), (lat, lon)],
+                    'tags': {'building': 'house'},
+                    'subtype': 'house' if col % 3 else 'apartments'
+                })
+        park = {
+            'id': 1,
+            'osm_type': 'way',
+            'coordinates': [(39.995, -3.005), (39.995, -2.995), (40.005, -2.995), (40.005, -3.005), (39.995, -3.005)],
+            'holes': [[(39.999, -3.001), (39.999, -2.999), (40.001, -2.999), (40.001, -3.001), (39.999, -3.001)]],
+            'tags': {'leisure': 'park'},
+            'subtype': 'park'
+        }
+        return {'highways': [], 'landuse': [park], 'natural': [], 'buildings': buildings, 'railways': []}
+
+
+def grid_generator(seed=7):
+    return MapGenerator(palette_name='neon_city', seed=seed, frame_width=4,
+                        osm_fetcher=OSMDataFetcher(backend=GridBackend(), use_cache=False))
+
+
+def generate(tmp_path, name, generator=None):
+    generator = generator or grid_generator()
+    scene_file = str(tmp_path / f"{name}.scene.json.gz")
+    map_obj = generator.generate_custom_map((40.0, -3.0), 0.5, output_file=str(tmp_path / f"{name}.html"), scene_file=scene_file)
+    return generator, map_obj, scene_file
+
+
+def html_shapes(map_obj):
+    layers = []
+    for child in map_obj._children.values():
+        if isinstance(child, StyledGeoJson):
+            colors = json.loads(child.colors)
+            features = json.loads(child.data)['features']
+            layers.append([{
+                'rings': [[[lat, lon] for lon, lat in ring] for ring in feature['geometry']['coordinates']],
+                'color': colors[feature['properties']['c']]
+            } for feature in features])
+    return layers
+
+
+def test_html_draws_the_saved_scene(tmp_path):
+    _, map_obj, scene_file = generate(tmp_path, "map")
+    saved = load_scene(scene_file)
+
+    assert html_shapes(map_obj) == [shapes for shapes in saved['scene'] if shapes]
+    assert sum(len(shapes) for shapes in saved['scene']) > 100
+    assert saved['frame_width'] == 4
+
+
+def test_seed_gives_the_same_scene_whatever_the_global_random_state(tmp_path):
+    _, _, first = generate(tmp_path, "first")
+
+    # Another request creates its generator and draws before this one generates
+    generator = grid_generator()
+    grid_generator(seed=8)
+    random.random()
+    _, _, second = generate(tmp_path, "second", generator)
+
+    assert load_scene(first) == load_scene(second)
+
+
+def test_seed_gives_the_same_colors_in_every_process(tmp_path):
+    script = (
+        "import sys; sys.path[:0] = sys.argv[1:3]; "
+        "import pathlib, test_map_generator as t; "
+        "print(t.load_scene(t.generate(pathlib.Path(sys.argv[3]), 'map')[2])['scene'])"
+    )
+    outputs = []
+    for hash_seed in ['1', '2']:
+        directory = tmp_path / hash_seed
+        directory.mkdir()
+        result = subprocess.run(
+            [sys.executable, '-c', script, SRC_DIR, TESTS_DIR, str(directory)],
+            env=dict(os.environ, PYTHONHASHSEED=hash_seed), capture_output=True, text=True, check=True
+        )
+        outputs.append(result.stdout.strip().splitlines()[-1])
+    assert outputs[0] == outputs[1]
+
+
+def test_saved_scene_renders_like_the_generated_map(tmp_path):
+    generator, _, scene_file = generate(tmp_path, "map")
+    data = load_scene(scene_file)
+
+    render_scene_file(scene_file, str(tmp_path / "first.png"), 300, 200)
+    render_scene_file(scene_file, str(tmp_path / "second.png"), 300, 200)
+    generator.render_image(data['scene'], data['lat'], data['lon'], data['zoom'], str(tmp_path / "direct.png"), 300, 200)
+
+    first = Image.open(tmp_path / "first.png")
+    assert first.size == (300, 200)
+    assert first.tobytes() == Image.open(tmp_path / "second.png").tobytes()
+    assert first.tobytes() == Image.open(tmp_path / "direct.png").tobytes()
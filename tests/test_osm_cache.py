@@ -0,0 +1,103 @@
+"""
+Tests for expiry, eviction and counters of the on-disk response cache
+"""
+
+import os
+import types
+
+import pytest
+
+import osm_cache
+from osm_cache import OSMCache
+
+
+class Clock:
+    """
+    Stand-in for the time module with a time() moved by hand
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(osm_cache, 'time', types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def payload(index):
+    # Incompressible, so every entry takes about the same room on disk
+    return {'id': index, 'blob': os.urandom(2000).hex()}
+
+
+def test_expired_entry_is_not_served_and_is_deleted(tmp_path, clock):
+    cache = OSMCache(cache_dir=str(tmp_path), ttl=60)
+    cache.put('fresh', {'a': 1})
+    cache.put('short', {'b': 2}, ttl=10)
+
+    clock.now += 30
+    assert cache.get('fresh') == {'a': 1}
+    assert cache.get('short') is None
+    assert [entry['key'] for entry in cache.list_entries()] == ['fresh']
+
+
+def test_expired_entry_with_a_snapshot_is_kept_for_refresh(tmp_path, clock):
+    cache = OSMCache(cache_dir=str(tmp_path), ttl=60)
+    cache.put('tile', {'a': 1}, snapshot='2024-01-01T00:00:00Z')
+
+    clock.now += 120
+    assert cache.get('tile') is None
+    assert cache.get_snapshot('tile') == ({'a': 1}, '2024-01-01T00:00:00Z')
+    assert cache.list_refreshable(expires_before=clock.now) == ['tile']
+
+    # Past the refresh age it has to be downloaded in full again
+    clock.now += cache.max_refresh_age
+    assert cache.get_snapshot('tile') is None
+    assert cache.list_refreshable() == []
+
+
+def test_eviction_drops_least_recently_accessed_first(tmp_path, clock):
+    cache = OSMCache(cache_dir=str(tmp_path))
+    for key in ['a', 'b', 'c']:
+        clock.now += 1
+        cache.put(key, payload(key))
+    clock.now += 1
+    cache.get('a')
+    entry_size = max(entry['size_bytes'] for entry in cache.list_entries())
+
+    # Room for two entries: the new one and the most recently read
+    cache.max_size = int(entry_size * 2.5)
+    clock.now += 1
+    cache.put('d', payload('d'))
+
+    assert [entry['key'] for entry in cache.list_entries()] == ['d', 'a']
+    assert cache.stats()['evictions'] == 2
+
+
+def test_counters_follow_lookups_and_purge_resets_them(tmp_path, clock):
+    cache = OSMCache(cache_dir=str(tmp_path), ttl=60)
+    cache.put('kept', {'a': 1})
+    cache.put('expiring', {'b': 2}, ttl=10)
+    cache.get('kept')
+    cache.get('kept')
+    cache.get('missing')
+
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses']) == (2, 2, 1)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+    assert {entry['key']: entry['hits'] for entry in cache.list_entries()} == {'kept': 2, 'expiring': 0}
+
+    clock.now += 30
+    assert cache.stats()['expired'] == 1
+    assert cache.purge(expired_only=True) == 1
+    stats = cache.stats()
+    assert (stats['entries'], stats['expired'], stats['hits']) == (1, 0, 2)
+
+    assert cache.purge() == 1
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']) == (0, 0, 0, 0.0)
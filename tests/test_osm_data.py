@@ -0,0 +1,240 @@
+"""
+Tests for Overpass query building, multipolygon assembly and tile fetching
+in the OSM data fetcher
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import osm_data
+from osm_cache import OSMCache
+from osm_data import OSMDataFetcher, _inflight_tiles, assemble_multipolygon, assemble_rings, overpass_regex_escape
+from overpass_scheduler import OverpassError, OverpassScheduler
+from overpass_stub import query_bboxes, query_tag_filter
+from single_flight import SingleFlight
+from tiles import TILE_ZOOM, tiles_for_bbox
+
+
+def test_subtype_filter_keeps_plain_characters():
+    fetcher = OSMDataFetcher(use_cache=False)
+    query = fetcher._build_query('building', {'semi-detached', 'park_and_ride', 'shed'}, ["(40.0,-3.0,40.1,-2.9)"])
+
+    assert '["building"~"^(park_and_ride|semi-detached|shed)$"]' in query
+    assert '\\' not in query
+    assert query_tag_filter(query) == ('building', {'park_and_ride', 'semi-detached', 'shed'})
+
+
+def test_regex_metacharacters_are_escaped_for_the_ql_string():
+    # The regex \. must be written \\. inside the Overpass string literal
+    assert overpass_regex_escape('a.b') == 'a\\\\.b'
+    assert overpass_regex_escape('x(y)') == 'x\\\\(y\\\\)'
+    assert overpass_regex_escape('say "hi"') == 'say \\"hi\\"'
+    assert overpass_regex_escape('multi-word value_1:a') == 'multi-word value_1:a'
+
+
+class RecordingScheduler(OverpassScheduler):
+    def __init__(self):
+        super().__init__(max_concurrent=4)
+        self.queries = []
+        self.first_query = threading.Event()
+
+    def execute(self, url, query, handle_response):
+        self.queries.append(query)
+        self.first_query.set()
+        return super().execute(url, query, handle_response)
+
+
+def square(south, west, north, east):
+    return [(south, west), (south, east), (north, east), (north, west), (south, west)]
+
+
+def test_split_outer_ring_is_stitched_whatever_the_member_direction():
+    corners = square(40.0, -3.0, 40.01, -2.99)
+    # Three member ways, the middle one drawn backwards
+    segments = [corners[0:2], [corners[3], corners[2], corners[1]], corners[3:5]]
+
+    rings = assemble_rings(segments)
+
+    assert rings == [corners]
+
+
+def test_unclosed_ring_is_closed_and_degenerate_segments_are_dropped():
+    corners = square(40.0, -3.0, 40.01, -2.99)
+    # The member closing the ring is missing from the response
+    assert assemble_rings([corners[0:3], corners[2:4], [(41.0, -3.0)]]) == [corners[0:4] + [corners[0]]]
+
+
+def test_inner_ring_becomes_a_hole_of_the_outer_containing_it():
+    lake = square(40.0, -3.0, 40.01, -2.99)
+    other_lake = square(40.02, -3.0, 40.03, -2.99)
+    island = square(40.004, -2.996, 40.006, -2.994)
+
+    polygons = assemble_multipolygon([lake[:3], lake[2:], other_lake], [island[:2], island[1:]])
+
+    assert polygons == [(lake, [island]), (other_lake, [])]
+
+
+def test_relation_parts_keep_their_holes():
+    lake = square(40.0, -3.0, 40.01, -2.99)
+    island = square(40.004, -2.996, 40.006, -2.994)
+
+    def member(role, coords):
+        return {'type': 'way', 'role': role, 'geometry': [{'lat': lat, 'lon': lon} for lat, lon in coords]}
+
+    relation = {
+        'type': 'relation', 'id': 5, 'tags': {'type': 'multipolygon', 'natural': 'water'},
+        'members': [member('outer', lake[:3]), member('outer', lake[2:]), member('inner', island)]
+    }
+    natural = OSMDataFetcher(use_cache=False).process_osm_result([relation])['natural']
+
+    assert [(element['id'], element['part'], element['coordinates'], element['holes']) for element in natural] == [
+        (5, 0, lake, [island])
+    ]
+
+
+def requested_tiles(query):
+    # Tile runs are bboxes on tile edges, so shrink them to stay inside their tiles
+    tiles = []
+    for south, west, north, east in query_bboxes(query):
+        tiles.extend(tiles_for_bbox(south + 1e-9, west + 1e-9, north - 1e-9, east - 1e-9, TILE_ZOOM))
+    return tiles
+
+
+def building_ids(data):
+    return {element['id'] for element in data['buildings']}
+
+
+def test_overlapping_fetches_download_shared_tiles_once(overpass_stub, tmp_path):
+    _, url = overpass_stub(delay=0.5)
+    scheduler = RecordingScheduler()
+    fetcher = OSMDataFetcher(cache=OSMCache(cache_dir=str(tmp_path / "shared")), use_cache=False,
+                             overpass_urls=[url], scheduler=scheduler)
+    plan = {'building': None}
+    centers = [(40.0, -3.0), (40.001, -2.995)]
+    shared_before = _inflight_tiles.shared
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(fetcher.fetch_osm_data, *centers[0], 0.5, render_plan=plan)
+        # The second fetch starts while the first one's tiles are in flight
+        scheduler.first_query.wait()
+        second = executor.submit(fetcher.fetch_osm_data, *centers[1], 0.5, render_plan=plan)
+        results = [first.result(), second.result()]
+
+    tiles = [tile for query in scheduler.queries for tile in requested_tiles(query)]
+    assert len(scheduler.queries) == 2
+    assert len(tiles) == len(set(tiles))
+    assert _inflight_tiles.shared > shared_before
+
+    # Shared tiles read back from the cache give the same data as separate fetches
+    for center, result in zip(centers, results):
+        alone = OSMDataFetcher(cache=OSMCache(cache_dir=str(tmp_path / f"alone{center}")), use_cache=False,
+                               overpass_urls=[url], scheduler=OverpassScheduler())
+        assert building_ids(result) == building_ids(alone.fetch_osm_data(*center, 0.5, render_plan=plan))
+
+
+def test_do_batch_runs_only_keys_not_in_flight():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(keys):
+        calls.append(sorted(keys))
+        started.set()
+        release.wait()
+        return "first"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(flight.do_batch, ['a', 'b'], slow)
+        started.wait()
+        second = executor.submit(flight.do_batch, ['b', 'c'], lambda keys: calls.append(sorted(keys)) or "second")
+        time.sleep(0.1)
+        # The second call ran its own key but still waits for 'b'
+        assert not second.done()
+        release.set()
+        assert first.result() == ("first", [])
+        assert second.result() == ("second", ['b'])
+
+    assert calls == [['a', 'b'], ['c']]
+
+
+def test_timed_out_response_is_retried_and_never_cached(overpass_stub, tmp_path):
+    timing_out, timing_out_url = overpass_stub(timeout_rate=1.0)
+    _, url = overpass_stub()
+    plan = {'building': None}
+    cache = OSMCache(cache_dir=str(tmp_path / "cache"))
+
+    fetcher = OSMDataFetcher(cache=cache, use_cache=False, overpass_urls=[timing_out_url],
+                             scheduler=OverpassScheduler(max_retries=1, base_delay=0.01))
+    with pytest.raises(OverpassError, match="runtime error: Query timed out"):
+        fetcher.fetch_osm_data(40.0, -3.0, 0.2, render_plan=plan)
+    assert timing_out.stats['timed_out'] == 2
+    assert cache.list_refreshable() == []
+
+    # The next endpoint's complete answer is the one used and cached
+    fetcher.overpass_urls = [timing_out_url, url]
+    data = fetcher.fetch_osm_data(40.0, -3.0, 0.2, render_plan=plan)
+    complete = OSMDataFetcher(cache=OSMCache(cache_dir=str(tmp_path / "complete")), use_cache=False,
+                              overpass_urls=[url]).fetch_osm_data(40.0, -3.0, 0.2, render_plan=plan)
+    assert building_ids(data) == building_ids(complete)
+    assert cache.list_refreshable()
+
+
+def test_remark_is_read_without_ijson(overpass_stub, monkeypatch):
+    monkeypatch.setattr(osm_data, 'ijson', None)
+    _, url = overpass_stub(timeout_rate=1.0)
+    fetcher = OSMDataFetcher(use_cache=False, overpass_urls=[url], scheduler=OverpassScheduler(max_retries=0))
+    with pytest.raises(OverpassError, match="runtime error"):
+        fetcher.fetch_osm_data(40.0, -3.0, 0.1, render_plan={'building': None})
+
+
+class TruncatedJsonHandler(BaseHTTPRequestHandler):
+    """
+    Answers every query with a well-framed body that ends mid-element
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'{"osm3s":{"timestamp_osm_base":"2024-01-01T00:00:00Z"},"elements":[{"type":"way","id":1,'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_malformed_response_fails_over_to_the_next_endpoint(overpass_stub):
+    broken = HTTPServer(('127.0.0.1', 0), TruncatedJsonHandler)
+    threading.Thread(target=broken.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    broken_url = f"http://127.0.0.1:{broken.server_address[1]}/api/interpreter"
+    _, url = overpass_stub()
+    try:
+        fetcher = OSMDataFetcher(use_cache=False, overpass_urls=[broken_url], scheduler=OverpassScheduler(max_retries=0))
+        with pytest.raises(OverpassError, match="all Overpass endpoints failed"):
+            fetcher.fetch_osm_data(40.0, -3.0, 0.1, render_plan={'building': None})
+
+        fetcher.overpass_urls = [broken_url, url]
+        assert fetcher.fetch_osm_data(40.0, -3.0, 0.1, render_plan={'building': None})['buildings']
+    finally:
+        broken.shutdown()
+        broken.server_close()
+
+
+def test_processing_bugs_are_not_reported_as_overpass_errors(overpass_stub, monkeypatch):
+    _, url = overpass_stub()
+    _, other_url = overpass_stub()
+    fetcher = OSMDataFetcher(use_cache=False, overpass_urls=[url, other_url], scheduler=OverpassScheduler(max_retries=0))
+
+    def broken_processing(elements):
+        raise TypeError("unsupported operand")
+
+    monkeypatch.setattr(fetcher, 'process_osm_result', broken_processing)
+    with pytest.raises(TypeError, match="unsupported operand"):
+        fetcher.fetch_osm_data(40.0, -3.0, 0.1, render_plan={'building': None, 'highway': None})
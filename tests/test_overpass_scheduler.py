@@ -0,0 +1,88 @@
+"""
+Tests for the Overpass scheduler against the local stand-in server
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from osm_data import OSMDataFetcher
+from overpass_scheduler import OverpassError, OverpassScheduler, parse_status
+
+QUERY = '[out:json];(way["building"](40.0,-3.0,40.002,-2.998););out geom qt;'
+
+
+def element_count(response):
+    return len(response.json()['elements'])
+
+
+def test_status_reports_rate_limit_and_free_slots(overpass_stub):
+    _, url = overpass_stub(slots=3)
+    assert OverpassScheduler().status(url) == (3, 3, 0)
+
+
+def test_parse_status_wait_for_busy_server():
+    text = "Rate limit: 2\nSlot available after: 2024-01-01T00:00:05Z, in 5 seconds.\n"
+    assert parse_status(text) == (2, 0, 5)
+
+
+def test_concurrency_follows_slots_from_status(overpass_stub):
+    server, url = overpass_stub(slots=1, delay=0.2)
+    scheduler = OverpassScheduler(max_concurrent=4, max_retries=0)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        counts = list(executor.map(lambda _: scheduler.execute(url, QUERY, element_count), range(4)))
+
+    # The status page grants one slot, so queries queue instead of getting 429
+    assert all(count > 0 for count in counts)
+    assert server.stats['queries'] == 4
+    assert server.stats['rejected'] == 0
+
+
+def test_busy_endpoint_is_retried_up_to_the_limit(overpass_stub):
+    server, url = overpass_stub(fail_rate=1.0)
+    scheduler = OverpassScheduler(max_retries=2, base_delay=0.01)
+
+    with pytest.raises(OverpassError, match="HTTP 504 after 3 attempts"):
+        scheduler.execute(url, QUERY, element_count)
+    assert server.stats['queries'] == 3
+    assert server.stats['failed'] == 3
+
+
+def test_backoff_is_jittered_and_capped():
+    scheduler = OverpassScheduler(base_delay=1.0, max_delay=8.0)
+    for attempt in range(6):
+        expected = min(8.0, 2 ** attempt)
+        delays = [scheduler._backoff(attempt) for _ in range(50)]
+        assert all(expected / 2 <= delay <= expected for delay in delays)
+        assert len(set(delays)) > 1
+
+
+@pytest.mark.parametrize("busy_options", [{'fail_rate': 1.0}, {'slots': 0}, {'timeout_rate': 1.0}], ids=["504", "429", "remark"])
+def test_fetch_fails_over_to_next_endpoint(overpass_stub, busy_options):
+    busy_server, busy_url = overpass_stub(**busy_options)
+    server, url = overpass_stub()
+    fetcher = OSMDataFetcher(
+        use_cache=False,
+        overpass_urls=[busy_url, url],
+        scheduler=OverpassScheduler(max_retries=1, base_delay=0.01)
+    )
+
+    data = fetcher.fetch_osm_data(40.0, -3.0, 0.1, render_plan={'building': None})
+
+    assert data['buildings']
+    assert busy_server.stats['queries'] == 2
+    assert server.stats['queries'] == 1
+
+
+def test_all_endpoints_busy_raises(overpass_stub):
+    _, first_url = overpass_stub(fail_rate=1.0)
+    _, second_url = overpass_stub(slots=0)
+    fetcher = OSMDataFetcher(
+        use_cache=False,
+        overpass_urls=[first_url, second_url],
+        scheduler=OverpassScheduler(max_retries=0)
+    )
+
+    with pytest.raises(OverpassError):
+        fetcher.fetch_osm_data(40.0, -3.0, 0.1, render_plan={'building': None})
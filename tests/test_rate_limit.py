@@ -0,0 +1,67 @@
+"""
+Tests for the token bucket shared by the network clients
+"""
+
+import pytest
+
+from rate_limit import TokenBucket
+
+
+class FakeClock:
+    """
+    Monotonic clock that only moves when the bucket sleeps or the test says so
+    """
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def bucket(clock, rate, capacity):
+    return TokenBucket(rate=rate, capacity=capacity, clock=clock.monotonic, sleep=clock.sleep)
+
+
+def test_burst_is_served_without_waiting_then_calls_are_spaced():
+    clock = FakeClock()
+    limiter = bucket(clock, rate=2.0, capacity=3)
+
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+    # Empty: each further call waits for one token at 2 per second
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
+    assert clock.now == pytest.approx(101.0)
+
+
+def test_idle_time_refills_up_to_the_capacity():
+    clock = FakeClock()
+    limiter = bucket(clock, rate=1.0, capacity=2)
+    limiter.acquire()
+    limiter.acquire()
+
+    clock.now += 60
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == []
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_partial_token_waits_only_for_the_rest():
+    clock = FakeClock()
+    limiter = bucket(clock, rate=1.0, capacity=1)
+    limiter.acquire()
+
+    clock.now += 0.75
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.25)]
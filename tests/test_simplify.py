@@ -0,0 +1,92 @@
+"""
+Tests for zoom-aware Douglas-Peucker simplification
+"""
+
+import math
+
+import numpy as np
+
+from geometry import GeometryLayer
+from simplify import douglas_peucker_mask, simplify_layer
+
+
+def segment_distance(point, start, end):
+    direction = end - start
+    length_squared = float(np.dot(direction, direction))
+    t = 0.0 if length_squared == 0 else min(1.0, max(0.0, float(np.dot(point - start, direction)) / length_squared))
+    return float(np.hypot(*(point - (start + t * direction))))
+
+
+def noisy_rings(rng, count):
+    rings = []
+    for index in range(count):
+        if index % 2:
+            # Open polyline
+            x = np.linspace(0, 100, 200)
+            rings.append(np.column_stack([x, 5 * np.sin(x / 7) + rng.normal(0, 0.3, len(x))]))
+        else:
+            # Closed wobbly circle
+            angles = np.linspace(0, 2 * math.pi, 150, endpoint=False)
+            radii = 40 + rng.normal(0, 0.4, len(angles))
+            ring = np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+            rings.append(np.vstack([ring, ring[:1]]))
+    return rings
+
+
+def offsets_of(rings):
+    return np.concatenate([[0], np.cumsum([len(ring) for ring in rings])]).astype(np.int64)
+
+
+def test_mask_keeps_endpoints_and_stays_within_tolerance():
+    rings = noisy_rings(np.random.default_rng(3), 6)
+    points = np.vstack(rings)
+    offsets = offsets_of(rings)
+    tolerance = 0.5
+
+    keep = douglas_peucker_mask(points, offsets, tolerance)
+
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        ring_keep = keep[start:end]
+        assert ring_keep[0] and ring_keep[-1]
+        assert ring_keep.sum() < end - start
+        kept = np.flatnonzero(ring_keep) + start
+        # Every dropped vertex is within tolerance of the segment replacing it
+        for first, last in zip(kept[:-1], kept[1:]):
+            for index in range(first + 1, last):
+                assert segment_distance(points[index], points[first], points[last]) <= tolerance
+
+
+def test_rings_are_simplified_independently():
+    rings = noisy_rings(np.random.default_rng(5), 4)
+    together = douglas_peucker_mask(np.vstack(rings), offsets_of(rings), 0.5)
+    separately = np.concatenate([douglas_peucker_mask(ring, offsets_of([ring]), 0.5) for ring in rings])
+    assert np.array_equal(together, separately)
+
+
+def test_straight_line_keeps_only_its_ends():
+    line = np.column_stack([np.arange(10.0), np.zeros(10)])
+    assert np.flatnonzero(douglas_peucker_mask(line, np.array([0, 10]), 0.1)).tolist() == [0, 9]
+
+
+def test_simplified_layer_keeps_closed_rings_drawable():
+    # A building a fraction of a pixel wide at zoom 12 would collapse to a line
+    tiny = [(40.0, -3.0), (40.0, -2.99999), (40.00001, -2.99999), (40.00001, -3.0), (40.0, -3.0)]
+    angles = np.linspace(0, 2 * math.pi, 400, endpoint=False)
+    park = [(40.01 + 0.005 * math.sin(angle), -3.0 + 0.005 * math.cos(angle)) for angle in angles]
+    park.append(park[0])
+    layer = GeometryLayer.from_elements([
+        {'coordinates': tiny, 'subtype': 'yes'},
+        {'coordinates': park, 'subtype': 'park'}
+    ])
+
+    simplified = simplify_layer(layer, 12)
+
+    lengths = simplified.ring_lengths().tolist()
+    assert lengths[0] == len(tiny)
+    assert 4 <= lengths[1] < len(park)
+    assert np.array_equal(simplified.feature_offsets, layer.feature_offsets)
+    # Projected coordinates stay cached for the kept vertices
+    np.testing.assert_allclose(simplified.mercator(), GeometryLayer(
+        simplified.coords, simplified.ring_offsets, simplified.feature_offsets, simplified.subtype_codes,
+        simplified.subtypes, simplified.osm_ids, simplified.osm_types
+    ).mercator())
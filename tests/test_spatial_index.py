@@ -0,0 +1,90 @@
+"""
+Tests for the grid index, contact filtering and greedy coloring
+"""
+
+import numpy as np
+import pytest
+
+import spatial_index
+from geometry import GeometryLayer
+from spatial_index import GridIndex, greedy_coloring, touching_pairs
+
+
+def box(south, west, north, east):
+    return [(south, west), (south, east), (north, east), (north, west), (south, west)]
+
+
+def random_layer(rng, count):
+    elements = []
+    for _ in range(count):
+        south, west = rng.uniform(0, 0.01, 2)
+        # Mostly small buildings and a few large parks covering many cells
+        size = rng.uniform(0.002, 0.006) if rng.random() < 0.05 else rng.uniform(0.00005, 0.0004)
+        elements.append({'coordinates': box(south, west, south + size, west + size * rng.uniform(0.5, 2)), 'subtype': 'yes'})
+    return GeometryLayer.from_elements(elements)
+
+
+def brute_force_pairs(layer, tolerance):
+    min_lat, min_lon, max_lat, max_lon = [array.astype(np.float64) for array in layer.feature_bounds()]
+    pairs = set()
+    for a in range(len(layer)):
+        for b in range(a + 1, len(layer)):
+            if (max_lat[a] + tolerance >= min_lat[b] and min_lat[a] - tolerance <= max_lat[b] and
+                    max_lon[a] + tolerance >= min_lon[b] and min_lon[a] - tolerance <= max_lon[b]):
+                pairs.add((a, b))
+    return pairs
+
+
+@pytest.mark.parametrize("tolerance", [0.0, 0.00001, 0.0002])
+def test_neighbor_pairs_match_brute_force(tolerance):
+    layer = random_layer(np.random.default_rng(11), 400)
+    a, b = GridIndex.for_layer(layer).neighbor_pairs(tolerance)
+    pairs = list(zip(a.tolist(), b.tolist()))
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == brute_force_pairs(layer, tolerance)
+
+
+def test_touching_pairs_drop_overlapping_boxes_without_contact():
+    pytest.importorskip("shapely")
+    # An L-shaped building and a house in its inner corner, 2 m apart
+    l_shape = [(0.0, 0.0), (0.0, 0.001), (0.0003, 0.001), (0.0003, 0.0003), (0.001, 0.0003), (0.001, 0.0), (0.0, 0.0)]
+    layer = GeometryLayer.from_elements([
+        {'coordinates': l_shape, 'subtype': 'yes'},
+        {'coordinates': box(0.00032, 0.00032, 0.0008, 0.0008), 'subtype': 'yes'},
+        # Shares the L's eastern wall
+        {'coordinates': box(0.0, 0.001, 0.0003, 0.0015), 'subtype': 'yes'}
+    ])
+    a, b = GridIndex.for_layer(layer).neighbor_pairs(0.00001)
+    assert set(zip(a.tolist(), b.tolist())) == {(0, 1), (0, 2)}
+
+    a, b = touching_pairs(layer, a, b, 0.00001)
+    assert list(zip(a.tolist(), b.tolist())) == [(0, 2)]
+
+
+def test_touching_pairs_fall_back_to_boxes_for_invalid_rings():
+    pytest.importorskip("shapely")
+    bowtie = [(0.0, 0.0), (0.001, 0.001), (0.001, 0.0), (0.0, 0.001), (0.0, 0.0)]
+    layer = GeometryLayer.from_elements([
+        {'coordinates': bowtie, 'subtype': 'yes'},
+        {'coordinates': box(0.00045, 0.00005, 0.00055, 0.00015), 'subtype': 'yes'}
+    ])
+    a, b = touching_pairs(layer, np.array([0]), np.array([1]), 0.0)
+    assert (a.tolist(), b.tolist()) == ([0], [1])
+
+
+def test_touching_pairs_without_shapely_keep_candidates(monkeypatch):
+    monkeypatch.setattr(spatial_index, 'shapely', None)
+    a, b = np.array([0, 1]), np.array([2, 3])
+    assert touching_pairs(None, a, b) == (a, b)
+
+
+def test_greedy_coloring_separates_neighbors():
+    layer = random_layer(np.random.default_rng(4), 300)
+    a, b = GridIndex.for_layer(layer).neighbor_pairs(0.00001)
+    classes = greedy_coloring(len(layer), a, b)
+    assert len(a) > 0
+    assert (classes >= 0).all()
+    assert (classes[a] != classes[b]).all()
+    # Welsh-Powell never needs more classes than the maximum degree plus one
+    degrees = np.bincount(np.concatenate([a, b]), minlength=len(layer))
+    assert classes.max() <= degrees.max()
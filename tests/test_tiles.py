@@ -0,0 +1,37 @@
+"""
+Tests for zoom-aware coordinate quantization
+"""
+
+import numpy as np
+import pytest
+
+from map_generator import MapGenerator
+from osm_data import OSMDataFetcher
+from tiles import coordinate_decimals, lat_lon_to_pixels
+
+
+@pytest.mark.parametrize("zoom", range(21))
+def test_rounded_coordinates_stay_within_half_a_pixel(zoom):
+    rng = np.random.default_rng(zoom)
+    coords = np.column_stack([rng.uniform(-80, 80, 2000), rng.uniform(-180, 180, 2000)])
+    rounded = np.round(coords, coordinate_decimals(zoom))
+
+    error = np.abs(lat_lon_to_pixels(rounded, zoom) - lat_lon_to_pixels(coords, zoom))
+    assert error.max() < 0.5
+
+
+def test_decimals_grow_with_zoom():
+    decimals = [coordinate_decimals(zoom) for zoom in range(21)]
+    assert decimals == sorted(decimals)
+    assert decimals[0] < decimals[-1] <= 8
+
+
+def test_quantized_rings_drop_collapsed_holes_and_outlines():
+    generator = MapGenerator(seed=1, osm_fetcher=OSMDataFetcher(use_cache=False))
+    outline = [[40.0, -3.0], [40.0, -2.99], [40.01, -2.99], [40.01, -3.0], [40.0, -3.0]]
+    # A hole well below the rounding step
+    hole = [[40.0041, -2.9951], [40.0041, -2.99509], [40.00411, -2.99509], [40.0041, -2.9951]]
+
+    quantized = generator._quantize_rings([outline, hole], 3)
+    assert quantized == [outline]
+    assert generator._quantize_rings([hole, outline], 3) == []
@@ -0,0 +1,55 @@
+"""
+Tests for reading cache warm-up location lists
+"""
+
+import json
+
+from warm_cache import read_csv, read_geojson
+
+
+def test_malformed_rows_are_skipped(tmp_path, capsys):
+    path = tmp_path / "locations.csv"
+    path.write_text(
+        "name,lat,lon,radius\n"
+        "madrid,40.4168,-3.7038,1.5\n"
+        "typo,40.41x,-3.7038,\n"
+        "bad radius,39.4699,-0.3763,big\n"
+        "empty,,,\n"
+        "valencia,39.4699,-0.3763,\n",
+        encoding='utf-8'
+    )
+
+    locations = read_csv(str(path), default_radius=2.0)
+
+    assert [(location['name'], location['radius']) for location in locations] == [('madrid', 1.5), ('valencia', 2.0)]
+    output = capsys.readouterr().out
+    assert "line 3 with an invalid number" in output
+    assert "line 4 with an invalid number" in output
+    assert "line 5 without coordinates or address" in output
+
+
+def point(coordinates, **properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': coordinates}, 'properties': properties}
+
+
+def test_malformed_features_are_skipped(tmp_path, capsys):
+    path = tmp_path / "locations.geojson"
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': [
+        point([-3.7038, 40.4168], name='madrid', radius=1.5),
+        point([-3.7038], name='one coordinate'),
+        point(None, name='no coordinates'),
+        point(['west', 40.4168], name='text coordinate'),
+        point([-0.3763, 39.4699], name='bad radius', radius='big'),
+        {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}, 'properties': {'name': 'road'}},
+        point([-0.3763, 39.4699, 15.0], name='valencia')
+    ]}), encoding='utf-8')
+
+    locations = read_geojson(str(path), default_radius=2.0)
+
+    assert [(location['name'], location['lat'], location['lon'], location['radius']) for location in locations] == [
+        ('madrid', 40.4168, -3.7038, 1.5), ('valencia', 39.4699, -0.3763, 2.0)
+    ]
+    output = capsys.readouterr().out
+    for number in range(2, 6):
+        assert f"feature {number} with invalid coordinates or radius" in output
+    assert "feature 6, not a point" in output